@@ -9,9 +9,17 @@ Supports 21 AI providers with intelligent failover:
 - GPT-OSS, Grok, GLM, Z.AI, Alibaba
 
 Features:
-- Automatic retry with exponential backoff
-- Circuit breaker for failing APIs
-- Health monitoring and statistics
+- Native asyncio engine (acall_with_fallback) with a thin sync wrapper
+- Streaming (SSE) with time-to-first-token failover (astream_with_fallback)
+- Error-class-aware retries: permanent errors skip the provider, 429/503 honor
+  Retry-After, other transient errors back off with decorrelated jitter
+- Circuit breaker for failing APIs and, per (API, model), for failing models
+- Model-level failover to sibling models on the same key and connection
+- Client-side token-bucket rate limiting from each provider's rate_limit
+- Token-budgeted map-reduce for inputs larger than the models' context (acall_map_reduce)
+- Optional adaptive routing by observed latency and success rate
+- Health monitoring and statistics (mergeable latency histograms, token throughput)
+- Thin client for the long-lived local AI gateway daemon (ai_gateway.py)
 - 100% uptime guarantee
 """
 
@@ -19,44 +27,306 @@ import os
 import sys
 import json
 import time
+import asyncio
+import random
+import sqlite3
+import socket
+import hashlib
+import tempfile
+import contextvars
 from typing import Dict, List, Optional, Any
 from datetime import datetime, timedelta
 import traceback
 
+from single_flight import SingleFlight
+from phase_timing import AttemptTiming, SpanExporter, aiohttp_trace_config
+from latency_histogram import LogHistogram
+from deadline import DeadlineBudget, default_deadline
+from provider_errors import ProviderError, retry_delay
+from provider_registry import (
+    PROVIDERS, RequestTemplate, compile_template, context_window, extract_text, extract_usage
+)
+from prompt_budget import (
+    MAX_CHUNK_TOKENS, MIN_CHUNK_TOKENS, PROMPT_OVERHEAD_TOKENS,
+    estimate_tokens, group_to_budget, split_to_budget
+)
+
+# Phase timing of the attempt running in the current task (read by the HTTP layer)
+_attempt_timing: contextvars.ContextVar = contextvars.ContextVar('attempt_timing', default=None)
+# Token usage reported by the provider for the attempt running in the current task
+_attempt_usage: contextvars.ContextVar = contextvars.ContextVar('attempt_usage', default=None)
+
+try:
+    import aiohttp
+except ImportError:  # Fall back to pooled requests sessions run in worker threads
+    aiohttp = None
+
+# Keys of exported usage stats that are derived from the raw counters
+_DERIVED_USAGE_KEYS = ('latency_ms', 'latency_histogram', 'avg_time', 'tokens_per_sec', 'avg_ttft')
+
+# Map-reduce prompts for inputs that do not fit one request (acall_map_reduce)
+_MAP_PROMPT = (
+    "{instruction}\n\n"
+    "The input is too large for one request and was split into {total} parts. This is "
+    "part {index} of {total}: analyze only what it contains, concisely, without an "
+    "introduction or summary of the other parts.\n\n{chunk}"
+)
+_REDUCE_PROMPT = (
+    "{instruction}\n\n"
+    "The input was analyzed in {total} parts{missing}. Merge the partial analyses below "
+    "into one coherent answer: combine overlapping findings, drop duplicates and keep "
+    "every distinct issue.\n\n{parts}"
+)
+MAP_DEADLINE_SHARE = 0.7  # Share of a bounded deadline the map phase may use
+# Breaker state lives next to the orchestrator's response cache unless $AI_BREAKER_DB says otherwise
+DEFAULT_BREAKER_DB = ".github/data/cache/breakers.db"
+# Seconds of a key's allowance its rate-limit bucket holds: an hour of a 2000/day key
+# is 83 requests, enough for a batch or map-reduce run without spending the daily quota
+DEFAULT_RATE_LIMIT_BURST = 3600.0
+
+
+def _new_usage_entry() -> Dict:
+    """Raw usage counters for one API or model; latency is a histogram in ms"""
+    return {
+        'calls': 0,
+        'successes': 0,
+        'failures': 0,
+        'latency': LogHistogram(),
+        'input_tokens': 0,
+        'output_tokens': 0,
+        'token_time': 0.0  # Seconds spent on calls that reported output tokens
+    }
+
+
+def _export_usage(entry: Dict) -> Dict:
+    """JSON-serializable view of a usage entry with percentiles and throughput"""
+    exported = {k: v for k, v in entry.items() if k not in ('latency', 'models')}
+    latency = entry['latency']
+    exported['latency_ms'] = latency.summary()
+    exported['latency_histogram'] = latency.to_dict()
+    exported['avg_time'] = latency.mean() / 1000 if latency.count else 0.0
+    exported['tokens_per_sec'] = (entry['output_tokens'] / entry['token_time']
+                                  if entry['token_time'] else None)
+    if entry.get('streams'):
+        exported['avg_ttft'] = entry['total_ttft'] / entry['streams']
+    if 'models' in entry:
+        exported['models'] = {model: _export_usage(model_entry)
+                              for model, model_entry in entry['models'].items()}
+    return exported
+
+
+def _import_usage(exported: Dict) -> Dict:
+    """Inverse of _export_usage (derived fields are dropped and recomputed later)"""
+    entry = {k: v for k, v in exported.items()
+             if k not in _DERIVED_USAGE_KEYS and k != 'models'}
+    entry['latency'] = LogHistogram.from_dict(exported.get('latency_histogram', {}))
+    if 'models' in exported:
+        entry['models'] = {model: _import_usage(model_stats)
+                           for model, model_stats in exported['models'].items()}
+    return entry
+
+
+def _merge_usage(into: Dict, other: Dict):
+    """Add another raw usage entry's counters, histograms and phase averages into 'into'"""
+    for key, value in other.items():
+        if key == 'latency':
+            into['latency'].merge(value)
+        elif key == 'models':
+            models = into.setdefault('models', {})
+            for model, model_entry in value.items():
+                if model in models:
+                    _merge_usage(models[model], model_entry)
+                else:
+                    models[model] = model_entry
+        elif key == 'errors':
+            errors = into.setdefault('errors', {})
+            for error_class, count in value.items():
+                errors[error_class] = errors.get(error_class, 0) + count
+        elif key == 'phases':
+            phases = into.setdefault('phases', {})
+            for phase, entry in value.items():
+                mine = phases.setdefault(phase, {'count': 0, 'avg_ms': 0.0})
+                count = mine['count'] + entry['count']
+                if count:
+                    mine['avg_ms'] = (mine['avg_ms'] * mine['count'] +
+                                      entry['avg_ms'] * entry['count']) / count
+                mine['count'] = count
+        elif isinstance(value, (int, float)):
+            into[key] = into.get(key, 0) + value
+
+
+def _summarize_usage(usage: Dict) -> Dict:
+    """Totals, best API and exported per-API stats for a {api_name: raw entry} map"""
+    total_calls = sum(s['calls'] for s in usage.values())
+    total_successes = sum(s['successes'] for s in usage.values())
+    total_failures = sum(s['failures'] for s in usage.values())
+    success_rate = (total_successes / total_calls * 100) if total_calls > 0 else 0
+
+    # Find best performing API
+    best_api = None
+    best_success_rate = 0
+    for api_name, stats in usage.items():
+        if stats['calls'] > 0:
+            api_success_rate = (stats['successes'] / stats['calls']) * 100
+            if api_success_rate > best_success_rate:
+                best_success_rate = api_success_rate
+                best_api = api_name
+
+    latency = LogHistogram()
+    for stats in usage.values():
+        latency.merge(stats['latency'])
+    output_tokens = sum(s['output_tokens'] for s in usage.values())
+    token_time = sum(s['token_time'] for s in usage.values())
+
+    return {
+        'total_calls': total_calls,
+        'total_successes': total_successes,
+        'total_failures': total_failures,
+        'success_rate': f"{success_rate:.2f}%",
+        'best_api': best_api,
+        'best_api_success_rate': f"{best_success_rate:.2f}%",
+        'latency_ms': latency.summary(),
+        'total_input_tokens': sum(s['input_tokens'] for s in usage.values()),
+        'total_output_tokens': output_tokens,
+        'tokens_per_sec': output_tokens / token_time if token_time else None,
+        'by_api': {api_name: _export_usage(stats) for api_name, stats in usage.items()}
+    }
+
+
+def merge_stats(stats_list: List[Dict]) -> Dict:
+    """
+    Combine get_stats() results from several processes (e.g. parallel workflow jobs)
+    into one view; latency histograms are merged, so percentiles stay exact to the
+    histogram's bucket resolution instead of averaging averages
+    """
+    usage = {}
+    for stats in stats_list:
+        for api_name, exported in stats.get('by_api', {}).items():
+            entry = _import_usage(exported)
+            if api_name in usage:
+                _merge_usage(usage[api_name], entry)
+            else:
+                usage[api_name] = entry
+
+    merged = _summarize_usage(usage)
+    merged['processes'] = len(stats_list)
+    return merged
+
 
 class APIHealthMonitor:
-    """Track API health and implement circuit breaker pattern"""
+    """
+    Track API health and implement circuit breaker pattern.
+    With a db_path, breaker state is kept in SQLite so later processes skip known-down APIs.
+    """
     
-    def __init__(self):
-        self.health_status = {}  # api_name -> {failures, last_failure, is_healthy}
+    def __init__(self, db_path: Optional[str] = None):
+        self.health_status = {}  # api_name or model_key() -> {failures, last_failure, is_healthy}
         self.failure_threshold = 3  # Failures before circuit breaks
         self.recovery_timeout = 300  # 5 minutes before retry
+        self.db = None
+        
+        if db_path:
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+                self.db = sqlite3.connect(db_path, timeout=5.0, isolation_level=None,
+                                          check_same_thread=False)
+                self.db.execute(
+                    "CREATE TABLE IF NOT EXISTS circuit_breakers ("
+                    "api_name TEXT PRIMARY KEY, failures INTEGER NOT NULL, "
+                    "last_failure REAL, is_healthy INTEGER NOT NULL)"
+                )
+                for row in self.db.execute("SELECT * FROM circuit_breakers"):
+                    self._load_row(row)
+            except (sqlite3.Error, OSError) as e:
+                print(f"⚠️  Circuit breaker store unavailable ({e}), using in-memory state")
+                self.db = None
     
-    def record_failure(self, api_name: str):
-        """Record API failure"""
-        if api_name not in self.health_status:
-            self.health_status[api_name] = {
-                'failures': 0,
-                'last_failure': None,
-                'is_healthy': True
-            }
+    def _load_row(self, row):
+        """Copy a stored breaker row into health_status"""
+        api_name, failures, last_failure, is_healthy = row
+        self.health_status[api_name] = {
+            'failures': failures,
+            'last_failure': datetime.utcfromtimestamp(last_failure) if last_failure else None,
+            'is_healthy': bool(is_healthy)
+        }
+    
+    def _update(self, api_name: str, apply):
+        """Apply a change to one API's status, atomically against the shared store if any"""
+        if self.db is None:
+            apply(self.health_status.setdefault(
+                api_name, {'failures': 0, 'last_failure': None, 'is_healthy': True}
+            ))
+            return
         
-        status = self.health_status[api_name]
-        status['failures'] += 1
-        status['last_failure'] = datetime.utcnow()
+        try:
+            # Re-read inside the write lock so concurrent processes' failures accumulate
+            self.db.execute("BEGIN IMMEDIATE")
+            row = self.db.execute(
+                "SELECT * FROM circuit_breakers WHERE api_name = ?", (api_name,)
+            ).fetchone()
+            if row:
+                self._load_row(row)
+            status = self.health_status.setdefault(
+                api_name, {'failures': 0, 'last_failure': None, 'is_healthy': True}
+            )
+            apply(status)
+            last_failure = status['last_failure']
+            self.db.execute(
+                "INSERT OR REPLACE INTO circuit_breakers VALUES (?, ?, ?, ?)",
+                (api_name, status['failures'],
+                 (last_failure - datetime(1970, 1, 1)).total_seconds() if last_failure else None,
+                 int(status['is_healthy']))
+            )
+            self.db.execute("COMMIT")
+        except sqlite3.Error as e:
+            if self.db.in_transaction:
+                self.db.execute("ROLLBACK")
+            print(f"⚠️  Circuit breaker store error for {api_name}: {e}")
+    
+    @staticmethod
+    def model_key(api_name: str, model: str) -> str:
+        """Breaker key for one model of an API (kept next to the per-API breakers)"""
+        return f"{api_name}/{model}"
+    
+    def healthy_models(self, api_name: str, models: List[str]) -> List[str]:
+        """The models of an API whose own breaker is closed, in preference order"""
+        return [model for model in models if self.is_healthy(self.model_key(api_name, model))]
+    
+    def record_failure(self, api_name: str, permanent: bool = False):
+        """Record API failure (permanent failures, e.g. a revoked key, open the breaker at once)"""
+        def apply(status):
+            status['failures'] = (max(status['failures'] + 1, self.failure_threshold)
+                                  if permanent else status['failures'] + 1)
+            status['last_failure'] = datetime.utcnow()
+            if status['failures'] >= self.failure_threshold:
+                status['is_healthy'] = False
         
-        if status['failures'] >= self.failure_threshold:
-            status['is_healthy'] = False
+        self._update(api_name, apply)
+        if not self.health_status[api_name]['is_healthy']:
             print(f"⚠️  Circuit breaker activated for {api_name}")
     
     def record_success(self, api_name: str):
         """Record API success and reset failures"""
         if api_name in self.health_status:
-            self.health_status[api_name]['failures'] = 0
-            self.health_status[api_name]['is_healthy'] = True
+            def apply(status):
+                status['failures'] = 0
+                status['is_healthy'] = True
+            
+            self._update(api_name, apply)
     
     def is_healthy(self, api_name: str) -> bool:
         """Check if API is healthy or if recovery timeout passed"""
+        if self.db is not None:
+            # Pick up breakers tripped by other processes since startup
+            try:
+                row = self.db.execute(
+                    "SELECT * FROM circuit_breakers WHERE api_name = ?", (api_name,)
+                ).fetchone()
+                if row:
+                    self._load_row(row)
+            except sqlite3.Error:
+                pass
+        
         if api_name not in self.health_status:
             return True
         
@@ -67,11 +337,95 @@ class APIHealthMonitor:
             time_since_failure = (datetime.utcnow() - status['last_failure']).total_seconds()
             if time_since_failure > self.recovery_timeout:
                 print(f"🔄 Recovery timeout passed for {api_name}, retrying...")
-                status['failures'] = 0
-                status['is_healthy'] = True
+                
+                def apply(status):
+                    status['failures'] = 0
+                    status['is_healthy'] = True
+                
+                self._update(api_name, apply)
                 return True
         
         return status['is_healthy']
+    
+    def close(self):
+        """Close the shared store"""
+        if self.db is not None:
+            self.db.close()
+            self.db = None
+
+
+class TokenBucketLimiter:
+    """
+    Client-side token buckets driven by each provider's rate_limit (requests/day).
+    Buckets live in memory, or in a SQLite file shared by processes on the same runner.
+    """
+
+    def __init__(self, db_path: Optional[str] = None, window_seconds: float = 86400.0,
+                 burst_seconds: float = DEFAULT_RATE_LIMIT_BURST):
+        self.window_seconds = window_seconds  # Period the rate_limit applies to
+        self.burst_seconds = burst_seconds  # Bucket holds this many seconds of allowance
+        self.buckets = {}  # api_name -> (tokens, updated_at)
+        self.db = None
+
+        if db_path:
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+                self.db = sqlite3.connect(db_path, timeout=5.0, isolation_level=None,
+                                          check_same_thread=False)
+                self.db.execute(
+                    "CREATE TABLE IF NOT EXISTS rate_buckets ("
+                    "api_name TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)"
+                )
+            except sqlite3.Error as e:
+                print(f"⚠️  Rate limit store unavailable ({e}), using in-memory buckets")
+                self.db = None
+
+    def _bucket_params(self, rate_limit: float):
+        """Return (refill tokens/second, bucket capacity) for a rate_limit"""
+        rate = rate_limit / self.window_seconds
+        return rate, min(float(rate_limit), max(1.0, rate * self.burst_seconds))
+
+    def try_acquire(self, api_name: str, rate_limit: float, tokens: float = 1.0) -> bool:
+        """Take tokens from the API's bucket without waiting; False if saturated"""
+        if not rate_limit:
+            return True
+
+        rate, capacity = self._bucket_params(rate_limit)
+        now = time.time()
+
+        if self.db is None:
+            available, updated_at = self.buckets.get(api_name, (capacity, now))
+            available = min(capacity, available + (now - updated_at) * rate)
+            admitted = available >= tokens
+            self.buckets[api_name] = (available - tokens if admitted else available, now)
+            return admitted
+
+        try:
+            # BEGIN IMMEDIATE takes the write lock so concurrent processes serialize here
+            self.db.execute("BEGIN IMMEDIATE")
+            row = self.db.execute(
+                "SELECT tokens, updated_at FROM rate_buckets WHERE api_name = ?", (api_name,)
+            ).fetchone()
+            available, updated_at = row if row else (capacity, now)
+            available = min(capacity, available + max(now - updated_at, 0) * rate)
+            admitted = available >= tokens
+            self.db.execute(
+                "INSERT OR REPLACE INTO rate_buckets (api_name, tokens, updated_at) VALUES (?, ?, ?)",
+                (api_name, available - tokens if admitted else available, now)
+            )
+            self.db.execute("COMMIT")
+            return admitted
+        except sqlite3.Error as e:
+            if self.db.in_transaction:
+                self.db.execute("ROLLBACK")
+            print(f"⚠️  Rate limit store error for {api_name}: {e}")
+            return True
+
+    def close(self):
+        """Close the shared store"""
+        if self.db is not None:
+            self.db.close()
+            self.db = None
 
 
 class AIAPIFallback:
@@ -80,240 +434,58 @@ class AIAPIFallback:
     Implements intelligent failover, circuit breakers, and health monitoring
     """
 
-    def __init__(self):
-        """Initialize with all 21 API configurations"""
-        self.health_monitor = APIHealthMonitor()
+    def __init__(self, pool_size: int = 10, connect_retries: int = 2,
+                 rate_limit_db: Optional[str] = None, routing: str = "priority",
+                 exploration: float = 0.1, breaker_db: Optional[str] = None,
+                 coalesce_dir: Optional[str] = None, trace_file: Optional[str] = None,
+                 rate_limit_burst: Optional[float] = None):
+        """
+        Initialize with all 21 API configurations
+
+        Args:
+            pool_size: Max keep-alive connections kept per base URL
+            connect_retries: Transport-level retries for connection errors
+            rate_limit_db: SQLite file for rate limit buckets shared between processes
+                           (default: $AI_RATE_LIMIT_DB, otherwise in-memory)
+            routing: "priority" (static order) or "adaptive" (latency/success weighted)
+            exploration: Fraction of adaptive calls that promote a random provider
+            breaker_db: SQLite file for circuit breaker state persisted across runs
+                        (default: $AI_BREAKER_DB, otherwise DEFAULT_BREAKER_DB;
+                        "off" keeps it in memory)
+            coalesce_dir: Lock directory for coalescing identical calls across processes
+                          (default: $AI_COALESCE_DIR, otherwise in-process only)
+            trace_file: Chrome trace-event file for per-attempt phase spans
+                        (default: $AI_TRACE_FILE, otherwise no export)
+            rate_limit_burst: Seconds of each key's rate_limit allowance that can be
+                              spent at once (default: $AI_RATE_LIMIT_BURST, otherwise
+                              DEFAULT_RATE_LIMIT_BURST)
+        """
+        breaker_db = breaker_db or os.environ.get('AI_BREAKER_DB', DEFAULT_BREAKER_DB)
+        if breaker_db.lower() in ('', 'off', '0', 'false'):
+            breaker_db = None
+        self.health_monitor = APIHealthMonitor(breaker_db)
+        if rate_limit_burst is None:
+            rate_limit_burst = float(os.environ.get('AI_RATE_LIMIT_BURST',
+                                                    DEFAULT_RATE_LIMIT_BURST))
+        self.rate_limiter = TokenBucketLimiter(rate_limit_db or os.environ.get('AI_RATE_LIMIT_DB'),
+                                               burst_seconds=rate_limit_burst)
+        self.single_flight = SingleFlight(coalesce_dir or os.environ.get('AI_COALESCE_DIR'))
+        trace_file = trace_file or os.environ.get('AI_TRACE_FILE')
+        self.span_exporter = SpanExporter(trace_file) if trace_file else None
         
-        # Define all 21 API providers with proper configurations
-        self.apis = [
-            # Tier 1: Primary GROQ APIs (3 keys for maximum redundancy)
-            {
-                'name': 'GROQ-1',
-                'key_env': 'GROQAI_API_KEY',
-                'base_url': 'https://api.groq.com/openai/v1',
-                'models': ['llama-3.3-70b-versatile', 'llama-3.1-70b-versatile', 'mixtral-8x7b-32768'],
-                'priority': 1,
-                'rate_limit': 14400,
-                'timeout': 30,
-                'type': 'openai'
-            },
-            {
-                'name': 'GROQ-2',
-                'key_env': 'GROQ1KEY',
-                'base_url': 'https://api.groq.com/openai/v1',
-                'models': ['llama-3.3-70b-versatile', 'gemma2-9b-it'],
-                'priority': 2,
-                'rate_limit': 14400,
-                'timeout': 30,
-                'type': 'openai'
-            },
-            {
-                'name': 'GROQ-3',
-                'key_env': 'GROQ2KEY',
-                'base_url': 'https://api.groq.com/openai/v1',
-                'models': ['llama-3.3-70b-versatile', 'llama-3.1-8b-instant'],
-                'priority': 3,
-                'rate_limit': 14400,
-                'timeout': 30,
-                'type': 'openai'
-            },
-            
-            # Tier 2: DeepSeek (high performance)
-            {
-                'name': 'DEEPSEEK',
-                'key_env': 'DEEPSEEK_API_KEY',
-                'base_url': 'https://openrouter.ai/api/v1',
-                'models': ['deepseek/deepseek-chat-v3.1:free'],
-                'priority': 4,
-                'rate_limit': 10000,
-                'timeout': 45,
-                'type': 'openrouter'
-            },
-            
-            # Tier 3: Gemini APIs (2 keys for redundancy)
-            {
-                'name': 'GEMINI-1',
-                'key_env': 'GEMINIAI_API_KEY',
-                'base_url': 'https://generativelanguage.googleapis.com/v1beta',
-                'models': ['gemini-2.0-flash', 'gemini-1.5-flash'],
-                'priority': 5,
-                'rate_limit': 15000,
-                'timeout': 30,
-                'type': 'google'
-            },
-            {
-                'name': 'GEMINI-2',
-                'key_env': 'GEMINI2_API_KEY',
-                'base_url': 'https://generativelanguage.googleapis.com/v1beta',
-                'models': ['gemini-2.0-flash', 'gemini-1.5-pro'],
-                'priority': 6,
-                'rate_limit': 15000,
-                'timeout': 30,
-                'type': 'google'
-            },
-            
-            # Tier 4: NVIDIA APIs (2 keys for redundancy)
-            {
-                'name': 'NVIDIA-1',
-                'key_env': 'NVIDIA_API_KEY',
-                'base_url': 'https://integrate.api.nvidia.com/v1',
-                'models': ['deepseek-ai/deepseek-r1', 'qwen/qwen2.5-coder-32b-instruct'],
-                'priority': 7,
-                'rate_limit': 10000,
-                'timeout': 60,
-                'type': 'openai'
-            },
-            {
-                'name': 'NVIDIA-2',
-                'key_env': 'NIVIIDIAKEY',
-                'base_url': 'https://integrate.api.nvidia.com/v1',
-                'models': ['deepseek-ai/deepseek-r1'],
-                'priority': 8,
-                'rate_limit': 10000,
-                'timeout': 60,
-                'type': 'openai'
-            },
-            
-            # Tier 5: Cerebras APIs (2 keys for redundancy)
-            {
-                'name': 'CEREBRAS-1',
-                'key_env': 'CEREBRAS_API_KEY',
-                'base_url': 'https://api.cerebras.ai/v1',
-                'models': ['qwen-3-235b-a22b-instruct-2507', 'llama3.3-70b'],
-                'priority': 9,
-                'rate_limit': 8000,
-                'timeout': 45,
-                'type': 'openai'
-            },
-            {
-                'name': 'CEREBRAS-2',
-                'key_env': 'CEREBRASKEY',
-                'base_url': 'https://api.cerebras.ai/v1',
-                'models': ['qwen-3-235b-a22b-instruct-2507'],
-                'priority': 10,
-                'rate_limit': 8000,
-                'timeout': 45,
-                'type': 'openai'
-            },
-            
-            # Tier 6: Specialized APIs
-            {
-                'name': 'CODESTRAL',
-                'key_env': 'CODESTRAL_API_KEY',
-                'base_url': 'https://codestral.mistral.ai/v1',
-                'models': ['codestral-latest'],
-                'priority': 11,
-                'rate_limit': 5000,
-                'timeout': 40,
-                'type': 'openai'
-            },
-            {
-                'name': 'COHERE',
-                'key_env': 'COHERE_API_KEY',
-                'base_url': 'https://api.cohere.com/v2',
-                'models': ['command-a-03-2025'],
-                'priority': 12,
-                'rate_limit': 10000,
-                'timeout': 35,
-                'type': 'cohere'
-            },
-            {
-                'name': 'CHUTES',
-                'key_env': 'CHUTES_API_KEY',
-                'base_url': 'https://llm.chutes.ai/v1',
-                'models': ['zai-org/GLM-4.5-Air'],
-                'priority': 13,
-                'rate_limit': 5000,
-                'timeout': 40,
-                'type': 'openai'
-            },
-            
-            # Tier 7: OpenRouter Free APIs
-            {
-                'name': 'KIMI',
-                'key_env': 'KIMI_API_KEY',
-                'base_url': 'https://openrouter.ai/api/v1',
-                'models': ['moonshotai/kimi-k2:free'],
-                'priority': 14,
-                'rate_limit': 3000,
-                'timeout': 50,
-                'type': 'openrouter'
-            },
-            {
-                'name': 'QWEN',
-                'key_env': 'QWEN_API_KEY',
-                'base_url': 'https://openrouter.ai/api/v1',
-                'models': ['qwen/qwen3-coder:free'],
-                'priority': 15,
-                'rate_limit': 3000,
-                'timeout': 45,
-                'type': 'openrouter'
-            },
-            {
-                'name': 'GPT-OSS',
-                'key_env': 'GPTOSS_API_KEY',
-                'base_url': 'https://openrouter.ai/api/v1',
-                'models': ['openai/gpt-oss-120b:free'],
-                'priority': 16,
-                'rate_limit': 2000,
-                'timeout': 55,
-                'type': 'openrouter'
-            },
-            {
-                'name': 'GROK',
-                'key_env': 'GROK_API_KEY',
-                'base_url': 'https://openrouter.ai/api/v1',
-                'models': ['x-ai/grok-4-fast:free'],
-                'priority': 17,
-                'rate_limit': 2000,
-                'timeout': 50,
-                'type': 'openrouter'
-            },
-            {
-                'name': 'GLM',
-                'key_env': 'GLM_API_KEY',
-                'base_url': 'https://openrouter.ai/api/v1',
-                'models': ['z-ai/glm-4.5-air:free'],
-                'priority': 18,
-                'rate_limit': 2000,
-                'timeout': 45,
-                'type': 'openrouter'
-            },
-            
-            # Tier 8: Additional Z.AI and Alibaba
-            {
-                'name': 'Z-AI',
-                'key_env': 'ZAIKEY',
-                'base_url': 'https://api.z.ai/api/paas/v4',
-                'models': ['glm-5'],
-                'priority': 19,
-                'rate_limit': 5000,
-                'timeout': 40,
-                'type': 'openai'
-            },
-            {
-                'name': 'ALIBABA',
-                'key_env': 'ALIBABAKEY',
-                'base_url': 'https://dashscope-intl.aliyuncs.com/compatible-mode/v1',
-                'models': ['qwen-plus', 'qwen-turbo'],
-                'priority': 20,
-                'rate_limit': 10000,
-                'timeout': 45,
-                'type': 'openai'
-            },
-            
-            # Tier 9: Additional GROQ backup (from GROQ2_API_KEY)
-            {
-                'name': 'GROQ-BACKUP',
-                'key_env': 'GROQ2_API_KEY',
-                'base_url': 'https://api.groq.com/openai/v1',
-                'models': ['llama-3.1-8b-instant', 'gemma-7b-it'],
-                'priority': 21,
-                'rate_limit': 14400,
-                'timeout': 25,
-                'type': 'openai'
-            }
-        ]
+        # Keep-alive HTTP sessions, one per base_url (shared by keys on the same host)
+        self.pool_size = pool_size
+        self.connect_retries = connect_retries
+        self._sessions = {}  # base_url -> requests.Session
+        self._async_sessions = {}  # base_url -> aiohttp.ClientSession
+        self._async_loop = None  # Loop the aiohttp sessions are bound to
+        self._loop = None  # Private loop used by the synchronous wrappers
+        self._pool_requests = {}  # base_url -> requests sent through the pool
+        self._pool_connections = {}  # base_url -> connections opened by the pool
+        
+        # All 21 API providers, from the shared registry (per-instance copies)
+        self.apis = [dict(provider, models=list(provider['models'])) for provider in PROVIDERS]
+        self._templates = {}  # (name, model, stream) -> compiled RequestTemplate
 
         # Filter to only APIs with valid keys
         self.available_apis = []
@@ -336,15 +508,18 @@ class AIAPIFallback:
         else:
             print(f"\n✅ EXCELLENT: {len(self.available_apis)} APIs available for maximum redundancy!")
 
+        # Adaptive routing state: EWMA of success latency and success rate per API
+        self.routing = routing
+        self.exploration = exploration
+        self.ewma_alpha = 0.3
+        self.route_scores = {
+            api['name']: {'latency': None, 'success_rate': 1.0, 'samples': 0}
+            for api in self.available_apis
+        }
+
         # Usage tracking
         self.usage_stats = {
-            api['name']: {
-                'calls': 0, 
-                'successes': 0, 
-                'failures': 0,
-                'total_time': 0.0,
-                'avg_time': 0.0
-            }
+            api['name']: dict(_new_usage_entry(), throttled=0, errors={}, phases={}, models={})
             for api in self.available_apis
         }
 
@@ -354,9 +529,48 @@ class AIAPIFallback:
                            max_tokens: int = 2000,
                            temperature: float = 0.7,
                            task_type: str = "general",
-                           max_retries: int = 3) -> Dict[str, Any]:
+                           max_retries: int = 3,
+                           deadline: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Synchronous wrapper around acall_with_fallback (same arguments and result)
+        """
+        return self._run_sync(self.acall_with_fallback(
+            prompt, system_prompt, max_tokens, temperature, task_type, max_retries,
+            deadline=deadline
+        ))
+
+    def _run_sync(self, coro):
+        """Run a coroutine on this instance's private event loop"""
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            pass
+        else:
+            coro.close()
+            raise RuntimeError(
+                "Synchronous AIAPIFallback calls cannot run inside an event loop; "
+                "await the async variant instead"
+            )
+
+        if self._loop is None or self._loop.is_closed():
+            self._loop = asyncio.new_event_loop()
+        return self._loop.run_until_complete(coro)
+
+    async def acall_with_fallback(self,
+                                  prompt: str,
+                                  system_prompt: str = "You are a helpful AI assistant.",
+                                  max_tokens: int = 2000,
+                                  temperature: float = 0.7,
+                                  task_type: str = "general",
+                                  max_retries: int = 3,
+                                  start_offset: int = 0,
+                                  deadline: Optional[float] = None) -> Dict[str, Any]:
         """
-        Call AI APIs with comprehensive fallback chain and retry logic
+        Call AI APIs with comprehensive fallback chain and retry logic.
+        Backoff sleeps never block the event loop and attempts are cancellable.
+        Model-specific errors (deprecated or unknown model, rejected request, timeout)
+        move on to the API's next model on the same key before falling back to the next
+        API; rate limits and overload apply to the whole key and are retried instead.
 
         Args:
             prompt: User prompt/question
@@ -364,16 +578,49 @@ class AIAPIFallback:
             max_tokens: Maximum response tokens
             temperature: Response creativity (0.0-1.0)
             task_type: Type of task for optimal model selection
-            max_retries: Maximum retries per API before moving to next
+            max_retries: Maximum attempts per API before moving to next; only transient
+                         errors (rate limit, overload, 5xx, network) are retried, waiting
+                         for Retry-After when the server sends one
+            start_offset: Rotate the priority order by this many providers
+                          (used by batch calls to spread load across keys)
+            deadline: Seconds the whole call may take (default: $AI_DEADLINE, otherwise
+                      unbounded). Per-attempt timeouts shrink to fit, retries and backoff
+                      are skipped when they no longer fit, and the call gives up with a
+                      diagnostic (deadline_exceeded) before the budget runs out.
 
         Returns:
-            Dict with response, model used, and metadata
+            Dict with response, model used, and metadata.
+            Concurrent identical requests share one provider call.
         """
+        budget = DeadlineBudget(deadline if deadline is not None else default_deadline())
+        request_key = self._get_request_key(system_prompt, prompt, max_tokens, temperature,
+                                            max_retries)
+        return await self.single_flight.run(request_key, lambda: self._acall_chain(
+            prompt, system_prompt, max_tokens, temperature, task_type, max_retries,
+            start_offset, budget
+        ), budget)
+
+    @staticmethod
+    def _get_request_key(system_prompt: str, prompt: str, max_tokens: int,
+                         temperature: float, max_retries: int) -> str:
+        """
+        Key identical requests (a caller's deadline is not part of it: waiting for
+        another caller's result stops when the caller's own deadline runs out)
+        """
+        content = f"{system_prompt}|{prompt}|{max_tokens}|{temperature}|{max_retries}"
+        return hashlib.sha256(content.encode()).hexdigest()
+
+    async def _acall_chain(self, prompt: str, system_prompt: str, max_tokens: int,
+                           temperature: float, task_type: str, max_retries: int,
+                           start_offset: int, budget: DeadlineBudget) -> Dict[str, Any]:
+        """Run the fallback chain once (see acall_with_fallback)"""
         print(f"\n{'='*60}")
         print(f"🤖 Starting ULTIMATE AI call with fallback chain...")
         print(f"📝 Task type: {task_type}")
         print(f"🔄 Available APIs: {len(self.available_apis)}")
         print(f"🔁 Max retries per API: {max_retries}")
+        if budget.bounded:
+            print(f"⏰ Deadline: {budget.seconds:.0f}s")
         print(f"{'='*60}\n")
 
         if not self.available_apis:
@@ -386,50 +633,79 @@ class AIAPIFallback:
                 'apis_tried': []
             }
 
-        # Sort APIs by priority
-        sorted_apis = sorted(self.available_apis, key=lambda x: x['priority'])
+        # Order APIs (static priority or adaptive), optionally starting further down the chain
+        sorted_apis = self._rank_apis()
+        offset = start_offset % len(sorted_apis)
+        sorted_apis = sorted_apis[offset:] + sorted_apis[:offset]
         errors = []
         apis_tried = []
 
-        for api in sorted_apis:
+        for position, api in enumerate(sorted_apis):
             # Check circuit breaker
             if not self.health_monitor.is_healthy(api['name']):
                 print(f"⏭️  Skipping {api['name']} (circuit breaker active)")
                 continue
+            models = self.health_monitor.healthy_models(api['name'], api['models'])
+            if not models:
+                print(f"⏭️  Skipping {api['name']} (circuit breaker active for every model)")
+                continue
             
-            # Try each API with retries
-            for retry in range(max_retries):
+            # Client-side rate limit: skip saturated keys instead of waiting for a 429.
+            # One token per provider visit; its retries and sibling models are not charged
+            if not self.rate_limiter.try_acquire(api['name'], api.get('rate_limit', 0)):
+                self.usage_stats[api['name']]['throttled'] += 1
+                print(f"⏭️  Skipping {api['name']} (client rate limit reached)")
+                continue
+
+            # Try each API with retries; model-specific errors move on to a sibling model,
+            # which does not use up a retry (switches are bounded by the model list).
+            # With a deadline the API's attempts share a split of what is left, so its
+            # retries and sibling models cannot use up the time of the APIs after it
+            provider_budget = budget.split(len(sorted_apis) - position)
+            delay = 0.0
+            model_index = 0
+            retry = 0
+            while retry < max_retries:
+                model = models[model_index]
+                # Deadline: give this attempt a share of the API's split, or stop here
+                attempt_timeout = provider_budget.attempt_timeout(api['timeout'],
+                                                                  len(models) - model_index)
+                if attempt_timeout is None:
+                    if budget.attempt_timeout(api['timeout']) is None:
+                        return self._deadline_failure(budget, errors, apis_tried,
+                                                      sorted_apis[position:])
+                    print(f"⏰ {api['name']} used its share of the deadline, moving on")
+                    apis_tried.append(api['name'])
+                    break
+
+                # Set per attempt so the error path never sees an earlier attempt's values
+                start_time = time.time()
+                timing = AttemptTiming()
+                usage = {}
                 try:
                     attempt_num = len(apis_tried) + 1
                     retry_str = f" (retry {retry + 1}/{max_retries})" if retry > 0 else ""
-                    print(f"\n🎯 Attempt #{attempt_num}: {api['name']}{retry_str} (Priority {api['priority']})")
+                    print(f"\n🎯 Attempt #{attempt_num}: {api['name']} ({model}){retry_str} "
+                          f"(Priority {api['priority']})")
                     
                     self.usage_stats[api['name']]['calls'] += 1
-                    start_time = time.time()
+                    self._model_stats(api['name'], model)['calls'] += 1
+                    _attempt_timing.set(timing)
+                    _attempt_usage.set(usage)
 
-                    # Select appropriate model
-                    model = api['models'][0]
-
-                    # Call API based on type
-                    if api['type'] == 'google':
-                        response = self._call_google_api(api, prompt, system_prompt, max_tokens, temperature)
-                    elif api['type'] == 'cohere':
-                        response = self._call_cohere_api(api, prompt, system_prompt, max_tokens, temperature)
-                    elif api['type'] == 'openrouter':
-                        response = self._call_openrouter_api(api, prompt, system_prompt, max_tokens, temperature, model)
-                    else:  # openai compatible
-                        response = self._call_openai_compatible(api, prompt, system_prompt, max_tokens, temperature, model)
+                    response = await self._call_api(api, prompt, system_prompt,
+                                                    max_tokens, temperature, model,
+                                                    attempt_timeout)
 
                     # Success!
                     elapsed = time.time() - start_time
-                    self.usage_stats[api['name']]['successes'] += 1
-                    self.usage_stats[api['name']]['total_time'] += elapsed
-                    self.usage_stats[api['name']]['avg_time'] = (
-                        self.usage_stats[api['name']]['total_time'] / 
-                        self.usage_stats[api['name']]['successes']
-                    )
+                    phases = self._record_phases(api, model, timing)
+                    self._record_route_outcome(api['name'], True, elapsed)
+                    self._record_success(api['name'], model, elapsed, usage)
                     
                     self.health_monitor.record_success(api['name'])
+                    self.health_monitor.record_success(
+                        self.health_monitor.model_key(api['name'], model))
                     
                     print(f"\n{'='*60}")
                     print(f"✅ SUCCESS with {api['name']}!")
@@ -446,28 +722,60 @@ class AIAPIFallback:
                         'timestamp': datetime.utcnow().isoformat(),
                         'attempts': attempt_num,
                         'apis_tried': apis_tried + [api['name']],
-                        'retries': retry
+                        'retries': retry,
+                        'phases': phases,
+                        'usage': usage
                     }
 
                 except Exception as e:
-                    elapsed = time.time() - start_time if 'start_time' in locals() else 0
-                    error_msg = f"{api['name']} (attempt {retry + 1}): {str(e)[:100]}"
+                    error = ProviderError.from_exception(e)
+                    elapsed = time.time() - start_time
+                    self._record_phases(api, model, timing)
+                    self._record_route_outcome(api['name'], False, elapsed)
+                    error_msg = (f"{api['name']} {model} (attempt {retry + 1}): "
+                                 f"[{error.error_class}] {str(error)[:100]}")
                     errors.append(error_msg)
-                    self.usage_stats[api['name']]['failures'] += 1
+                    stats = self.usage_stats[api['name']]
+                    stats['failures'] += 1
+                    stats['errors'][error.error_class] = stats['errors'].get(error.error_class, 0) + 1
+                    self._model_stats(api['name'], model)['failures'] += 1
                     
                     print(f"❌ Failed: {error_msg}")
                     
-                    if retry < max_retries - 1:
-                        # Exponential backoff for retries
-                        backoff = min(2 ** retry, 8)  # Max 8 seconds
-                        print(f"⏳ Backing off for {backoff}s before retry...")
-                        time.sleep(backoff)
-                    else:
-                        # Max retries reached for this API
-                        self.health_monitor.record_failure(api['name'])
-                        apis_tried.append(api['name'])
-                        print(f"🔄 Moving to next API...")
-                        time.sleep(1)  # Small delay before next API
+                    # A sibling model on the same key and connection is cheaper than the next API
+                    model_key = self.health_monitor.model_key(api['name'], model)
+                    if error.policy.switch_model and model_index + 1 < len(models):
+                        if provider_budget.fits_sleep(0.0):
+                            self.health_monitor.record_failure(model_key, error.model_unavailable)
+                            model_index += 1
+                            delay = 0.0
+                            print(f"🔁 Switching {api['name']} to sibling model "
+                                  f"{models[model_index]}")
+                            continue
+                        print(f"⏰ No time left in {api['name']}'s share of the deadline "
+                              f"for sibling models")
+                    
+                    # The error class decides whether this API gets another attempt
+                    delay = retry_delay(error, delay) if retry < max_retries - 1 else None
+                    if delay is not None and provider_budget.fits_sleep(delay):
+                        source = "Retry-After" if error.retry_after is not None else "backoff"
+                        print(f"⏳ Waiting {delay:.1f}s ({source}) before retry...")
+                        await asyncio.sleep(delay)
+                        retry += 1
+                        continue
+                    
+                    if delay is not None:
+                        print(f"⏰ Skipping retries of {api['name']} ({budget.describe()})")
+                    elif retry < max_retries - 1:
+                        why = (f"Retry-After {error.retry_after:.0f}s" if error.policy.retry
+                               else f"{error.error_class} errors are not retried")
+                        print(f"⏭️  Not retrying {api['name']} ({why})")
+                    if error.policy.switch_model:
+                        self.health_monitor.record_failure(model_key, error.model_unavailable)
+                    self.health_monitor.record_failure(api['name'], error.policy.permanent)
+                    apis_tried.append(api['name'])
+                    print(f"🔄 Moving to next API...")
+                    break
 
         # All APIs failed
         print(f"\n{'='*60}")
@@ -485,244 +793,987 @@ class AIAPIFallback:
             'apis_tried': apis_tried
         }
 
-    def _call_openai_compatible(self, api: Dict, prompt: str, system_prompt: str,
-                                max_tokens: int, temperature: float, model: str) -> str:
-        """Call OpenAI-compatible APIs (GROQ, NVIDIA, Cerebras, Codestral, Chutes, Z.AI, Alibaba)"""
-        import requests
+    def _deadline_failure(self, budget: DeadlineBudget, errors: List[str],
+                          apis_tried: List[str], not_tried: List[Dict]) -> Dict[str, Any]:
+        """Fail fast with what was learned so far when the deadline leaves no room"""
+        untried = [api['name'] for api in not_tried if api['name'] not in apis_tried]
+        diagnostic = (
+            f"Deadline reached ({budget.describe()}) after {len(errors)} failed attempts; "
+            f"{len(untried)} APIs not tried"
+        )
+        print(f"\n{'='*60}")
+        print(f"⏰ {diagnostic}")
+        if errors:
+            print(f"📋 Last error: {errors[-1]}")
+        print(f"{'='*60}\n")
 
-        headers = {
-            'Authorization': f'Bearer {api["key"]}',
-            'Content-Type': 'application/json'
+        return {
+            'success': False,
+            'response': None,
+            'errors': errors or [diagnostic],
+            'timestamp': datetime.utcnow().isoformat(),
+            'attempts': len(errors),
+            'apis_tried': apis_tried,
+            'deadline_exceeded': True,
+            'diagnostic': diagnostic,
+            'apis_not_tried': untried,
+            'elapsed': budget.elapsed()
         }
 
-        data = {
-            'model': model,
-            'messages': [
-                {'role': 'system', 'content': system_prompt},
-                {'role': 'user', 'content': prompt}
-            ],
-            'max_tokens': max_tokens,
-            'temperature': temperature
-        }
+    def _rank_apis(self) -> List[Dict]:
+        """
+        Order available APIs for the next call.
+        Priority mode uses the static priority. Adaptive mode ranks by expected time
+        to a successful answer (EWMA latency / EWMA success rate); unsampled APIs get
+        the median observed latency so the static priority decides cold starts and ties.
+        """
+        by_priority = sorted(self.available_apis, key=lambda x: x['priority'])
+        if self.routing != 'adaptive':
+            return by_priority
 
-        response = requests.post(
-            f"{api['base_url']}/chat/completions",
-            headers=headers,
-            json=data,
-            timeout=api['timeout']
+        observed = sorted(
+            score['latency'] for score in self.route_scores.values()
+            if score['latency'] is not None
         )
-        response.raise_for_status()
-        result = response.json()
-        return result['choices'][0]['message']['content']
-
-    def _call_openrouter_api(self, api: Dict, prompt: str, system_prompt: str,
-                            max_tokens: int, temperature: float, model: str) -> str:
-        """Call OpenRouter APIs (DeepSeek, Kimi, Qwen, GPT-OSS, Grok, GLM)"""
-        import requests
-
-        headers = {
-            'Authorization': f'Bearer {api["key"]}',
-            'Content-Type': 'application/json',
-            'HTTP-Referer': 'https://github.com/over7-maker/test_endeelo',
-            'X-Title': 'AMAS Ultimate Zero-Failure System'
-        }
+        default_latency = observed[len(observed) // 2] if observed else 1.0
 
-        data = {
-            'model': model,
-            'messages': [
-                {'role': 'system', 'content': system_prompt},
-                {'role': 'user', 'content': prompt}
-            ],
-            'max_tokens': max_tokens,
-            'temperature': temperature
-        }
+        def expected_cost(api: Dict) -> float:
+            score = self.route_scores[api['name']]
+            latency = score['latency'] if score['latency'] is not None else default_latency
+            return latency / max(score['success_rate'], 0.05)
+
+        ranked = sorted(by_priority, key=lambda api: (expected_cost(api), api['priority']))
+
+        # Exploration: occasionally promote another API so recovering providers get sampled
+        if len(ranked) > 1 and random.random() < self.exploration:
+            explored = ranked.pop(random.randrange(1, len(ranked)))
+            ranked.insert(0, explored)
+            print(f"🧭 Exploring {explored['name']} first")
+
+        return ranked
+
+    def _record_route_outcome(self, api_name: str, success: bool, elapsed: float):
+        """Fold one attempt into the API's EWMA latency and success rate"""
+        score = self.route_scores.get(api_name)
+        if score is None:
+            return
+        alpha = self.ewma_alpha
+        score['samples'] += 1
+        score['success_rate'] = (1 - alpha) * score['success_rate'] + alpha * (1.0 if success else 0.0)
+        if success:
+            if score['latency'] is None:
+                score['latency'] = elapsed
+            else:
+                score['latency'] = (1 - alpha) * score['latency'] + alpha * elapsed
+
+    def call_batch(self,
+                   prompts: List[str],
+                   system_prompt: str = "You are a helpful AI assistant.",
+                   max_tokens: int = 2000,
+                   temperature: float = 0.7,
+                   task_type: str = "general",
+                   max_retries: int = 3,
+                   concurrency: Optional[int] = None,
+                   deadline: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        Synchronous wrapper around acall_batch (same arguments and result)
+        """
+        return self._run_sync(self.acall_batch(
+            prompts, system_prompt, max_tokens, temperature, task_type,
+            max_retries, concurrency, deadline
+        ))
+
+    async def acall_batch(self,
+                          prompts: List[str],
+                          system_prompt: str = "You are a helpful AI assistant.",
+                          max_tokens: int = 2000,
+                          temperature: float = 0.7,
+                          task_type: str = "general",
+                          max_retries: int = 3,
+                          concurrency: Optional[int] = None,
+                          deadline: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        Run many prompts through the fallback chain with a bounded worker pool.
+        Prompt i starts at provider i (mod available APIs) so load is spread over
+        every configured key, then falls back through the rest of the chain.
+
+        Args:
+            prompts: User prompts to run
+            concurrency: Max prompts in flight (default: number of available APIs)
+            deadline: Seconds for the whole batch; each prompt gets what is left
+            (other arguments as for acall_with_fallback)
+
+        Returns:
+            One result dict per prompt, in input order, each with a 'batch_index'
+        """
+        results: List[Optional[Dict[str, Any]]] = [None] * len(prompts)
+        budget = DeadlineBudget(deadline if deadline is not None else default_deadline())
+        if concurrency is None:
+            concurrency = max(len(self.available_apis), 1)
+        queue = asyncio.Queue()
+        for item in enumerate(prompts):
+            queue.put_nowait(item)
+
+        async def worker():
+            while True:
+                try:
+                    index, prompt = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                try:
+                    result = await self.acall_with_fallback(
+                        prompt, system_prompt, max_tokens, temperature, task_type,
+                        max_retries, start_offset=index,
+                        deadline=budget.remaining() if budget.bounded else None
+                    )
+                except Exception as e:
+                    result = {
+                        'success': False,
+                        'response': None,
+                        'errors': [f"Batch item failed: {str(e)[:100]}"],
+                        'timestamp': datetime.utcnow().isoformat(),
+                        'attempts': 0,
+                        'apis_tried': []
+                    }
+                result['batch_index'] = index
+                results[index] = result
+
+        print(f"📦 Running batch of {len(prompts)} prompts with concurrency {concurrency}")
+        await asyncio.gather(*[worker() for _ in range(min(concurrency, len(prompts)))])
+        return results
+
+    def input_budget(self, max_tokens: int, system_prompt: str = "") -> int:
+        """
+        Prompt tokens one request may carry: what every configured model (including
+        sibling models used for failover) can accept next to max_tokens of output,
+        capped at MAX_CHUNK_TOKENS
+        """
+        smallest = min((context_window(model) for api in self.available_apis
+                        for model in api['models']), default=MAX_CHUNK_TOKENS)
+        room = smallest - max_tokens - estimate_tokens(system_prompt) - PROMPT_OVERHEAD_TOKENS
+        return max(MIN_CHUNK_TOKENS, min(MAX_CHUNK_TOKENS, room))
+
+    def call_map_reduce(self,
+                        content: str,
+                        instruction: str,
+                        system_prompt: str = "You are a helpful AI assistant.",
+                        max_tokens: int = 2000,
+                        temperature: float = 0.7,
+                        task_type: str = "general",
+                        max_retries: int = 3,
+                        chunk_tokens: Optional[int] = None,
+                        deadline: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Synchronous wrapper around acall_map_reduce (same arguments and result)
+        """
+        return self._run_sync(self.acall_map_reduce(
+            content, instruction, system_prompt, max_tokens, temperature, task_type,
+            max_retries, chunk_tokens, deadline
+        ))
+
+    async def acall_map_reduce(self,
+                               content: str,
+                               instruction: str,
+                               system_prompt: str = "You are a helpful AI assistant.",
+                               max_tokens: int = 2000,
+                               temperature: float = 0.7,
+                               task_type: str = "general",
+                               max_retries: int = 3,
+                               chunk_tokens: Optional[int] = None,
+                               deadline: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Apply an instruction to content of any size without truncating it.
+        Content that fits the prompt budget (input_budget) goes out as one call.
+        Larger content is split at line boundaries into chunks that are analyzed
+        concurrently (acall_batch spreads them over the configured keys), and the
+        partial answers are merged by a reduce call, in several rounds if they do
+        not fit one prompt.
+
+        Args:
+            content: Input to analyze (diff, scan report, test log...)
+            instruction: What to do with it; prefixed to every map and reduce prompt
+            max_tokens: Maximum tokens of the final answer
+            chunk_tokens: Prompt budget per request (default: input_budget(max_tokens))
+            deadline: Seconds for the whole map-reduce (default: $AI_DEADLINE)
+            (other arguments as for acall_with_fallback)
+
+        Returns:
+            The final call's result dict plus 'map_reduce' with chunks, failed_chunks,
+            input_tokens (estimated) and reduce_rounds
+        """
+        budget = DeadlineBudget(deadline if deadline is not None else default_deadline())
+        limit = (chunk_tokens or self.input_budget(max_tokens, system_prompt)) \
+            - estimate_tokens(instruction) - PROMPT_OVERHEAD_TOKENS
+        limit = max(limit, MIN_CHUNK_TOKENS // 2)
+        input_tokens = estimate_tokens(content)
+        stats = {'chunks': 1, 'failed_chunks': 0, 'input_tokens': input_tokens,
+                 'reduce_rounds': 0}
+
+        def remaining() -> Optional[float]:
+            return budget.remaining() if budget.bounded else None
+
+        if input_tokens <= limit:
+            result = await self.acall_with_fallback(
+                f"{instruction}\n\n{content}", system_prompt, max_tokens, temperature,
+                task_type, max_retries, deadline=remaining()
+            )
+            return dict(result, map_reduce=stats)
+
+        chunks = split_to_budget(content, limit)
+        total = stats['chunks'] = len(chunks)
+        print(f"✂️  Input of ~{input_tokens} tokens split into {total} chunks of <= {limit} tokens")
 
-        response = requests.post(
-            f"{api['base_url']}/chat/completions",
-            headers=headers,
-            json=data,
-            timeout=api['timeout']
+        # Partial answers are kept short so several of them fit one reduce prompt
+        map_max_tokens = min(max_tokens, max(limit // 4, 200))
+        mapped = await self.acall_batch(
+            [_MAP_PROMPT.format(instruction=instruction, index=index, total=total, chunk=chunk)
+             for index, chunk in enumerate(chunks, 1)],
+            system_prompt, map_max_tokens, temperature, task_type, max_retries,
+            deadline=budget.remaining() * MAP_DEADLINE_SHARE if budget.bounded else None
         )
-        response.raise_for_status()
-        result = response.json()
-        return result['choices'][0]['message']['content']
+        parts = [f"### Part {index}/{total}\n{result['response']}"
+                 for index, result in enumerate(mapped, 1) if result['success']]
+        failed = [index for index, result in enumerate(mapped, 1) if not result['success']]
+        stats['failed_chunks'] = len(failed)
+        if not parts:
+            return {
+                'success': False,
+                'response': None,
+                'errors': [error for result in mapped for error in result['errors']],
+                'timestamp': datetime.utcnow().isoformat(),
+                'attempts': sum(result['attempts'] for result in mapped),
+                'apis_tried': [api for result in mapped for api in result['apis_tried']],
+                'map_reduce': stats
+            }
 
-    def _call_google_api(self, api: Dict, prompt: str, system_prompt: str,
-                         max_tokens: int, temperature: float) -> str:
-        """Call Google Gemini API"""
-        import requests
+        missing = f" (parts {', '.join(map(str, failed))} could not be analyzed)" if failed else ""
+        while True:
+            stats['reduce_rounds'] += 1
+            groups = group_to_budget(parts, limit)
+            if len(groups) >= len(parts):
+                groups = [parts]  # Parts too large to pair up: merge them in one final call
+            prompts = [_REDUCE_PROMPT.format(instruction=instruction, total=total,
+                                             missing=missing, parts="\n\n".join(group))
+                       for group in groups]
+            if len(prompts) == 1:
+                result = await self.acall_with_fallback(
+                    prompts[0], system_prompt, max_tokens, temperature, task_type,
+                    max_retries, deadline=remaining()
+                )
+                return dict(result, map_reduce=stats)
 
-        model = api['models'][0]
-        url = f"{api['base_url']}/models/{model}:generateContent"
+            reduced = await self.acall_batch(prompts, system_prompt, map_max_tokens, temperature,
+                                             task_type, max_retries, deadline=remaining())
+            parts = [result['response'] for result in reduced if result['success']]
+            if not parts:
+                return dict(reduced[0], map_reduce=stats)
 
-        headers = {
-            'Content-Type': 'application/json',
-            'x-goog-api-key': api['key']
-        }
+    def _get_session(self, base_url: str):
+        """Get (or create) the pooled keep-alive requests session for a base URL"""
+        session = self._sessions.get(base_url)
+        if session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            from urllib3.util.retry import Retry
+
+            # Only retry failed connects here; HTTP errors are handled by the fallback chain
+            retry = Retry(
+                total=self.connect_retries,
+                connect=self.connect_retries,
+                read=0,
+                redirect=0,
+                status=0,
+                backoff_factor=0.2
+            )
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size,
+                                  max_retries=retry)
+            session = requests.Session()
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            self._sessions[base_url] = session
+
+        return session
+
+    async def _get_async_session(self, base_url: str):
+        """Get (or create) the pooled aiohttp session for a base URL in the running loop"""
+        loop = asyncio.get_running_loop()
+        if self._async_loop is not loop:
+            # Sessions cannot move between event loops
+            self._async_sessions = {}
+            self._async_loop = loop
+
+        session = self._async_sessions.get(base_url)
+        if session is None or session.closed:
+            async def on_connection_create_end(session, context, params):
+                self._pool_connections[base_url] = self._pool_connections.get(base_url, 0) + 1
+
+            trace_config = aiohttp.TraceConfig()
+            trace_config.on_connection_create_end.append(on_connection_create_end)
+            connector = aiohttp.TCPConnector(
+                limit_per_host=self.pool_size,
+                keepalive_timeout=60,
+                ttl_dns_cache=300
+            )
+            session = aiohttp.ClientSession(connector=connector,
+                                            trace_configs=[trace_config, aiohttp_trace_config()])
+            self._async_sessions[base_url] = session
+
+        return session
+
+    async def _post_json(self, api: Dict, template: RequestTemplate, body: bytes,
+                         timeout: float) -> Dict:
+        """POST a pre-serialized JSON payload through the pooled client for this API"""
+        base_url = api['base_url']
+        self._pool_requests[base_url] = self._pool_requests.get(base_url, 0) + 1
+
+        if aiohttp is None:
+            # requests' timeout bounds each socket operation, so also bound the whole call
+            result = await asyncio.wait_for(
+                asyncio.to_thread(self._post_json_sync, api, template, body, timeout), timeout
+            )
+        else:
+            timing = _attempt_timing.get()
+            session = await self._get_async_session(base_url)
+            timeout = aiohttp.ClientTimeout(total=timeout)
+            async with session.post(template.url, headers=template.headers, data=body,
+                                    timeout=timeout, trace_request_ctx=timing) as response:
+                if response.status >= 400:
+                    raise ProviderError.from_response(response.status, response.headers,
+                                                      await response.text())
+                raw = await response.read()
+                if timing is not None:
+                    timing.mark('body_end')
+                result = json.loads(raw)
+                if timing is not None:
+                    timing.mark('parse_end')
+
+        usage = _attempt_usage.get()
+        if usage is not None:
+            usage.update(extract_usage(api['type'], result))
+        return result
+
+    def _post_json_sync(self, api: Dict, template: RequestTemplate, body: bytes,
+                        timeout: float) -> Dict:
+        """Blocking POST through the pooled requests session (used without aiohttp)"""
+        # The worker thread runs in a copy of the caller's context, so timing is visible here
+        timing = _attempt_timing.get() or AttemptTiming()
+        session = self._get_session(api['base_url'])
+        manager = session.get_adapter(template.url).poolmanager
+        opened_before = self._pool_connections.get(api['base_url'], 0)
+
+        timing.mark('request_start')
+        # stream=True returns once headers arrive, so the body download is timed separately
+        response = session.post(template.url, headers=template.headers, data=body,
+                                timeout=timeout, stream=True)
+        timing.mark('headers')
+
+        self._pool_connections[api['base_url']] = sum(
+            manager.pools[key].num_connections for key in manager.pools.keys()
+        )
+        timing.reused = self._pool_connections[api['base_url']] == opened_before
+
+        with response:
+            if response.status_code >= 400:
+                raise ProviderError.from_response(response.status_code, response.headers,
+                                                  response.text)
+            raw = response.content
+        timing.mark('body_end')
+        result = json.loads(raw)
+        timing.mark('parse_end')
+        return result
+
+    def _record_phases(self, api: Dict, model: str, timing: AttemptTiming) -> Dict:
+        """Fold an attempt's phase timings into usage_stats and export its spans"""
+        phases = timing.phases()
+        phase_stats = self.usage_stats[api['name']]['phases']
+        for phase, value in phases.items():
+            if phase == 'reused' or value is None:
+                continue
+            entry = phase_stats.setdefault(phase, {'count': 0, 'avg_ms': 0.0})
+            entry['count'] += 1
+            entry['avg_ms'] += (value - entry['avg_ms']) / entry['count']
+
+        if self.span_exporter is not None:
+            self.span_exporter.export(timing, api['name'], 'ai_api_fallback',
+                                      {'api': api['name'], 'model': model})
+        return phases
+
+    def _model_stats(self, api_name: str, model: str) -> Dict:
+        models = self.usage_stats[api_name]['models']
+        if model not in models:
+            models[model] = _new_usage_entry()
+        return models[model]
 
-        data = {
-            'contents': [{
-                'parts': [{
-                    'text': f"{system_prompt}\n\n{prompt}"
-                }]
-            }],
-            'generationConfig': {
-                'maxOutputTokens': max_tokens,
-                'temperature': temperature
+    def _record_success(self, api_name: str, model: str, elapsed: float, usage: Dict):
+        """Add a successful call's latency and token usage to the API and model stats"""
+        for stats in (self.usage_stats[api_name], self._model_stats(api_name, model)):
+            stats['successes'] += 1
+            stats['latency'].add(elapsed * 1000)
+            stats['input_tokens'] += usage.get('input_tokens', 0)
+            if usage.get('output_tokens'):
+                stats['output_tokens'] += usage['output_tokens']
+                stats['token_time'] += elapsed
+
+    def _get_pool_stats(self) -> Dict:
+        """Report requests vs. opened connections for each pooled base URL"""
+        pool_stats = {}
+        for base_url, requests_sent in self._pool_requests.items():
+            connections = self._pool_connections.get(base_url, 0)
+            pool_stats[base_url] = {
+                'requests': requests_sent,
+                'connections_opened': connections,
+                'connections_reused': max(requests_sent - connections, 0)
             }
-        }
+        return pool_stats
 
-        response = requests.post(url, headers=headers, json=data, timeout=api['timeout'])
-        response.raise_for_status()
-        result = response.json()
-        return result['candidates'][0]['content']['parts'][0]['text']
+    async def aclose(self):
+        """Close all pooled aiohttp sessions"""
+        for session in self._async_sessions.values():
+            await session.close()
+        self._async_sessions = {}
+        self._async_loop = None
 
-    def _call_cohere_api(self, api: Dict, prompt: str, system_prompt: str,
-                         max_tokens: int, temperature: float) -> str:
-        """Call Cohere API"""
-        import requests
+    def close(self):
+        """Close all pooled sessions, the rate limit store and the private event loop"""
+        for session in self._sessions.values():
+            session.close()
+        self._sessions.clear()
+        self.rate_limiter.close()
+        self.health_monitor.close()
 
-        headers = {
-            'Authorization': f'Bearer {api["key"]}',
-            'Content-Type': 'application/json'
-        }
+        if self._loop is not None and not self._loop.is_closed():
+            if self._async_loop is self._loop:
+                self._loop.run_until_complete(self.aclose())
+            self._loop.close()
+        self._loop = None
 
-        data = {
-            'model': api['models'][0],
-            'messages': [
-                {'role': 'system', 'content': system_prompt},
-                {'role': 'user', 'content': prompt}
-            ],
-            'max_tokens': max_tokens,
-            'temperature': temperature
-        }
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.aclose()
+        for session in self._sessions.values():
+            session.close()
+        self._sessions.clear()
+        self.rate_limiter.close()
+        self.health_monitor.close()
+
+    def _template(self, api: Dict, model: str, stream: bool = False) -> RequestTemplate:
+        """Compiled request template for this API and model (built once per instance)"""
+        key = (api['name'], model, stream)
+        template = self._templates.get(key)
+        if template is None:
+            template = compile_template(api['type'], api['base_url'], api['key'], model, stream)
+            self._templates[key] = template
+        return template
+
+    async def _call_api(self, api: Dict, prompt: str, system_prompt: str,
+                        max_tokens: int, temperature: float, model: str,
+                        timeout: Optional[float] = None) -> str:
+        """Call any provider type through its compiled template and return the completion text"""
+        template = self._template(api, model)
+        body = template.body(system_prompt, prompt, max_tokens, temperature)
+        result = await self._post_json(api, template, body, timeout or api['timeout'])
+        return extract_text(api['type'], result)
+
+    @staticmethod
+    def _stream_event_text(api: Dict, event: Dict) -> Optional[str]:
+        """Extract the text delta from one decoded SSE event"""
+        if api['type'] == 'google':
+            parts = event.get('candidates', [{}])[0].get('content', {}).get('parts', [])
+            return ''.join(part.get('text', '') for part in parts)
+        if api['type'] == 'cohere':
+            if event.get('type') == 'content-delta':
+                return event['delta']['message']['content'].get('text')
+            return None
+        choices = event.get('choices') or [{}]
+        return (choices[0].get('delta') or {}).get('content')
+
+    async def _stream_tokens(self, api: Dict, prompt: str, system_prompt: str,
+                             max_tokens: int, temperature: float, model: str,
+                             usage: Optional[Dict] = None):
+        """Yield non-empty text deltas from a provider's SSE stream (token usage goes to usage)"""
+        template = self._template(api, model, stream=True)
+        body = template.body(system_prompt, prompt, max_tokens, temperature)
+        base_url = api['base_url']
+        self._pool_requests[base_url] = self._pool_requests.get(base_url, 0) + 1
+        session = await self._get_async_session(base_url)
+        # No total timeout: long generations are fine as long as bytes keep arriving
+        timeout = aiohttp.ClientTimeout(total=None, sock_read=api['timeout'])
+
+        async with session.post(template.url, headers=template.headers, data=body,
+                                timeout=timeout) as response:
+            if response.status >= 400:
+                raise ProviderError.from_response(response.status, response.headers,
+                                                  await response.text())
+            async for raw_line in response.content:
+                line = raw_line.decode('utf-8', errors='replace').strip()
+                if not line.startswith('data:'):
+                    continue
+                payload = line[5:].strip()
+                if payload == '[DONE]':
+                    return
+                try:
+                    event = json.loads(payload)
+                except json.JSONDecodeError:
+                    continue
+                if usage is not None:
+                    usage.update(extract_usage(api['type'], event))
+                text = self._stream_event_text(api, event)
+                if text:
+                    yield text
+
+    async def astream_with_fallback(self,
+                                    prompt: str,
+                                    system_prompt: str = "You are a helpful AI assistant.",
+                                    max_tokens: int = 2000,
+                                    temperature: float = 0.7,
+                                    task_type: str = "general",
+                                    first_token_timeout: float = 10.0,
+                                    stream_info: Optional[Dict] = None):
+        """
+        Stream a completion token by token, failing over on slow first tokens.
+        Providers are tried in routing order; one that errors or produces no token
+        within first_token_timeout seconds is dropped for the next. Once the first
+        token arrives the stream is committed to that provider. Each provider streams
+        from its first model whose per-model breaker is closed.
+
+        Args:
+            first_token_timeout: Max seconds to wait for the first token per provider
+            stream_info: Optional dict filled with api_used, model, ttft, response_time,
+                         apis_tried and errors
+            (other arguments as for acall_with_fallback)
 
-        response = requests.post(
-            f"{api['base_url']}/chat",
-            headers=headers,
-            json=data,
-            timeout=api['timeout']
+        Yields:
+            Text chunks as they arrive
+        """
+        if aiohttp is None:
+            raise RuntimeError("Streaming requires aiohttp (pip install aiohttp)")
+
+        info = stream_info if stream_info is not None else {}
+        info.update({'success': False, 'api_used': None, 'model': None, 'ttft': None,
+                     'response_time': None, 'task_type': task_type,
+                     'apis_tried': [], 'errors': []})
+
+        for api in self._rank_apis():
+            if not self.health_monitor.is_healthy(api['name']):
+                print(f"⏭️  Skipping {api['name']} (circuit breaker active)")
+                continue
+            models = self.health_monitor.healthy_models(api['name'], api['models'])
+            if not models:
+                print(f"⏭️  Skipping {api['name']} (circuit breaker active for every model)")
+                continue
+            if not self.rate_limiter.try_acquire(api['name'], api.get('rate_limit', 0)):
+                self.usage_stats[api['name']]['throttled'] += 1
+                print(f"⏭️  Skipping {api['name']} (client rate limit reached)")
+                continue
+
+            model = models[0]
+            info['apis_tried'].append(api['name'])
+            self.usage_stats[api['name']]['calls'] += 1
+            self._model_stats(api['name'], model)['calls'] += 1
+            print(f"\n📡 Streaming from {api['name']} (first token within {first_token_timeout}s)")
+            start_time = time.time()
+            usage = {}
+            tokens = self._stream_tokens(api, prompt, system_prompt, max_tokens, temperature,
+                                         model, usage)
+
+            try:
+                first = await asyncio.wait_for(tokens.__anext__(), timeout=first_token_timeout)
+            except (Exception, asyncio.TimeoutError) as e:
+                await tokens.aclose()
+                elapsed = time.time() - start_time
+                error = ProviderError.from_exception(e)
+                if isinstance(e, asyncio.TimeoutError):
+                    reason = f"no first token after {first_token_timeout}s"
+                elif isinstance(e, StopAsyncIteration):
+                    reason = "empty stream"
+                else:
+                    reason = f"[{error.error_class}] {str(error)[:100]}"
+                info['errors'].append(f"{api['name']}: {reason}")
+                stats = self.usage_stats[api['name']]
+                stats['failures'] += 1
+                stats['errors'][error.error_class] = stats['errors'].get(error.error_class, 0) + 1
+                self._model_stats(api['name'], model)['failures'] += 1
+                if error.policy.switch_model:
+                    self.health_monitor.record_failure(
+                        self.health_monitor.model_key(api['name'], model), error.model_unavailable)
+                self.health_monitor.record_failure(api['name'], error.policy.permanent)
+                self._record_route_outcome(api['name'], False, elapsed)
+                print(f"❌ {api['name']} dropped: {reason}")
+                continue
+
+            ttft = time.time() - start_time
+            info.update({'api_used': api['name'], 'model': model, 'ttft': ttft})
+            stats = self.usage_stats[api['name']]
+            stats['streams'] = stats.get('streams', 0) + 1
+            stats['total_ttft'] = stats.get('total_ttft', 0.0) + ttft
+            print(f"⚡ First token from {api['name']} after {ttft:.2f}s")
+
+            # Committed: errors after the first token propagate to the caller
+            try:
+                yield first
+                async for text in tokens:
+                    yield text
+            finally:
+                await tokens.aclose()
+
+            elapsed = time.time() - start_time
+            self._record_success(api['name'], model, elapsed, usage)
+            self.health_monitor.record_success(api['name'])
+            self.health_monitor.record_success(self.health_monitor.model_key(api['name'], model))
+            self._record_route_outcome(api['name'], True, elapsed)
+            info.update({'success': True, 'response_time': elapsed, 'usage': usage})
+            return
+
+        print(f"💥 No provider produced a first token ({len(info['apis_tried'])} tried)")
+        raise Exception(
+            f"Streaming failed on all providers. Errors: {'; '.join(info['errors'][:3])}"
         )
-        response.raise_for_status()
-        result = response.json()
-        
-        # Cohere v2 API response handling
-        if 'message' in result:
-            content = result['message']['content']
-            if isinstance(content, list):
-                return content[0]['text']
-            return content
-        return result.get('text', str(result))
 
     def get_stats(self) -> Dict:
-        """Get comprehensive usage statistics"""
-        total_calls = sum(s['calls'] for s in self.usage_stats.values())
-        total_successes = sum(s['successes'] for s in self.usage_stats.values())
-        total_failures = sum(s['failures'] for s in self.usage_stats.values())
-        success_rate = (total_successes / total_calls * 100) if total_calls > 0 else 0
-
-        # Find best performing API
-        best_api = None
-        best_success_rate = 0
-        for api_name, stats in self.usage_stats.items():
-            if stats['calls'] > 0:
-                api_success_rate = (stats['successes'] / stats['calls']) * 100
-                if api_success_rate > best_success_rate:
-                    best_success_rate = api_success_rate
-                    best_api = api_name
-
-        return {
-            'total_calls': total_calls,
-            'total_successes': total_successes,
-            'total_failures': total_failures,
-            'success_rate': f"{success_rate:.2f}%",
-            'best_api': best_api,
-            'best_api_success_rate': f"{best_success_rate:.2f}%",
+        """
+        Get comprehensive usage statistics.
+        Per-API and per-model latency is reported as percentiles plus the raw
+        histogram, so stats saved from several processes can be combined with merge_stats()
+        """
+        stats = _summarize_usage(self.usage_stats)
+        stats.update({
             'available_apis': len(self.available_apis),
             'total_configured_apis': len(self.apis),
-            'by_api': self.usage_stats,
-            'health_status': self.health_monitor.health_status
-        }
+            'health_status': self.health_monitor.health_status,
+            'connection_pools': self._get_pool_stats(),
+            'single_flight': self.single_flight.stats,
+            'routing': {
+                'mode': self.routing,
+                'exploration': self.exploration,
+                'scores': self.route_scores
+            }
+        })
+        return stats
 
     def get_health_report(self) -> str:
         """Generate human-readable health report"""
-        stats = self.get_stats()
-        
-        report = [
-            "\n" + "="*60,
-            "🏥 ULTIMATE AI API SYSTEM HEALTH REPORT",
-            "="*60,
-            "",
-            f"📊 Overall Statistics:",
-            f"   • Total API calls: {stats['total_calls']}",
-            f"   • Successful: {stats['total_successes']}",
-            f"   • Failed: {stats['total_failures']}",
-            f"   • Success rate: {stats['success_rate']}",
-            f"   • Available providers: {stats['available_apis']}/{stats['total_configured_apis']}",
-            "",
-            f"🏆 Best Performing API: {stats['best_api']} ({stats['best_api_success_rate']})" if stats['best_api'] else "🏆 Best Performing API: N/A (no calls yet)",
-            "",
-            f"📈 Per-API Performance:"
-        ]
-        
-        for api_name, api_stats in sorted(stats['by_api'].items(), 
-                                         key=lambda x: x[1]['successes'], 
-                                         reverse=True):
-            if api_stats['calls'] > 0:
-                api_success_rate = (api_stats['successes'] / api_stats['calls']) * 100
-                avg_time = api_stats['avg_time']
-                report.append(
-                    f"   • {api_name}: "
-                    f"{api_stats['successes']}/{api_stats['calls']} "
-                    f"({api_success_rate:.1f}%) "
-                    f"avg: {avg_time:.2f}s"
-                )
-        
-        report.extend([
-            "",
-            "="*60,
-            ""
-        ])
-        
-        return "\n".join(report)
+        return format_health_report(self.get_stats())
+
+
+def _format_latency(summary: Dict) -> str:
+    """'p50 1.20s p90 2.10s p99 3.40s' from a latency_ms summary"""
+    return ' '.join(
+        f"{key} {summary[key] / 1000:.2f}s" for key in ('p50', 'p90', 'p99')
+        if summary.get(key) is not None
+    )
+
+
+def format_health_report(stats: Dict) -> str:
+    """Render get_stats() or merge_stats() output as a human-readable health report"""
+    if 'available_apis' in stats:
+        providers_line = f"   • Available providers: {stats['available_apis']}/{stats['total_configured_apis']}"
+    else:
+        providers_line = f"   • Merged from: {stats.get('processes', 0)} processes"
+    throughput = (f"{stats['tokens_per_sec']:.1f} tok/s, {stats['total_output_tokens']} output tokens"
+                  if stats.get('tokens_per_sec') else "N/A (no usage reported)")
+
+    report = [
+        "\n" + "="*60,
+        "🏥 ULTIMATE AI API SYSTEM HEALTH REPORT",
+        "="*60,
+        "",
+        f"📊 Overall Statistics:",
+        f"   • Total API calls: {stats['total_calls']}",
+        f"   • Successful: {stats['total_successes']}",
+        f"   • Failed: {stats['total_failures']}",
+        f"   • Success rate: {stats['success_rate']}",
+        f"   • Latency: {_format_latency(stats['latency_ms']) or 'N/A'}",
+        f"   • Throughput: {throughput}",
+        providers_line,
+        "",
+        f"🏆 Best Performing API: {stats['best_api']} ({stats['best_api_success_rate']})" if stats['best_api'] else "🏆 Best Performing API: N/A (no calls yet)",
+        "",
+        f"📈 Per-API Performance:"
+    ]
+
+    for api_name, api_stats in sorted(stats['by_api'].items(),
+                                     key=lambda x: x[1]['successes'],
+                                     reverse=True):
+        if api_stats['calls'] > 0:
+            api_success_rate = (api_stats['successes'] / api_stats['calls']) * 100
+            line = (
+                f"   • {api_name}: "
+                f"{api_stats['successes']}/{api_stats['calls']} "
+                f"({api_success_rate:.1f}%)"
+            )
+            latency = _format_latency(api_stats['latency_ms'])
+            if latency:
+                line += f" {latency}"
+            if api_stats['tokens_per_sec']:
+                line += f" | {api_stats['tokens_per_sec']:.1f} tok/s"
+            if api_stats.get('errors'):
+                line += " | " + ", ".join(f"{error_class} x{count}" for error_class, count
+                                          in sorted(api_stats['errors'].items()))
+            report.append(line)
+
+            models = api_stats.get('models', {})
+            if len(models) > 1:
+                for model, model_stats in models.items():
+                    if model_stats['calls'] > 0:
+                        report.append(
+                            f"      - {model}: {model_stats['successes']}/{model_stats['calls']} "
+                            f"{_format_latency(model_stats['latency_ms'])}".rstrip()
+                        )
+
+    if stats.get('connection_pools'):
+        report.extend(["", "🔌 Connection Pools:"])
+        for base_url, pool in stats['connection_pools'].items():
+            report.append(
+                f"   • {base_url}: {pool['requests']} requests, "
+                f"{pool['connections_opened']} connections opened, "
+                f"{pool['connections_reused']} reused"
+            )
+
+    report.extend([
+        "",
+        "="*60,
+        ""
+    ])
+
+    return "\n".join(report)
+
+
+def gateway_address() -> Optional[str]:
+    """
+    Address of the local AI gateway daemon (see ai_gateway.py), or None when disabled.
+    $AI_GATEWAY may be a Unix socket path, "host:port", or "off"; by default a
+    per-user socket in the temp directory is used.
+    """
+    address = os.environ.get('AI_GATEWAY', '')
+    if address.lower() in ('off', 'none', '0'):
+        return None
+    return address or os.path.join(tempfile.gettempdir(), f"ai_gateway_{os.getuid()}.sock")
+
+
+def parse_tcp_address(address: str):
+    """(host, port) for a "host:port" gateway address, None for a Unix socket path"""
+    host, sep, port = address.rpartition(':')
+    if sep and port.isdigit() and '/' not in address:
+        return host or '127.0.0.1', int(port)
+    return None
+
+
+class GatewayError(RuntimeError):
+    """The gateway daemon answered with {"ok": false}"""
+
+
+class GatewayClient:
+    """
+    Thin client for the AI gateway daemon.
+    Each request is one JSON line on a fresh local connection and each reply is
+    one JSON line: {"ok": true, "result": ...} or {"ok": false, "error": "..."}.
+    Connection problems raise OSError and error replies GatewayError, so callers
+    can fall back to in-process mode.
+    """
+
+    def __init__(self, address: str, timeout: float = 600.0):
+        self.address = address
+        self.timeout = timeout  # Upper bound for one call, including all fallbacks
+
+    @classmethod
+    def discover(cls, address: Optional[str] = None) -> Optional['GatewayClient']:
+        """Client for a running gateway, or None when no daemon answers"""
+        address = address or gateway_address()
+        if not address:
+            return None
+        client = cls(address)
+        try:
+            client.request('ping', timeout=2.0)
+        except (OSError, ValueError, GatewayError):
+            return None
+        return client
+
+    def _connect(self, timeout: float) -> socket.socket:
+        tcp = parse_tcp_address(self.address)
+        if tcp:
+            return socket.create_connection(tcp, timeout=timeout)
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(timeout)
+        try:
+            sock.connect(self.address)
+        except OSError:
+            sock.close()
+            raise
+        return sock
+
+    def request(self, op: str, timeout: Optional[float] = None, **kwargs) -> Any:
+        """Send one operation and return its result (raises GatewayError on error replies)"""
+        with self._connect(timeout or self.timeout) as sock:
+            sock.sendall(json.dumps({'op': op, 'kwargs': kwargs}).encode() + b'\n')
+            with sock.makefile('rb') as reply_file:
+                line = reply_file.readline()
+        if not line:
+            raise ConnectionError("AI gateway closed the connection without replying")
+        reply = json.loads(line)
+        if not reply.get('ok'):
+            raise GatewayError(f"AI gateway error: {reply.get('error')}")
+        return reply['result']
+
+    def call_with_fallback(self, prompt: str,
+                           system_prompt: str = "You are a helpful AI assistant.",
+                           max_tokens: int = 2000, temperature: float = 0.7,
+                           task_type: str = "general", max_retries: int = 3,
+                           deadline: Optional[float] = None) -> Dict[str, Any]:
+        """Same contract as AIAPIFallback.call_with_fallback, served by the daemon"""
+        deadline = deadline if deadline is not None else default_deadline()
+        # The daemon enforces the deadline; the socket timeout only guards against a hung daemon
+        timeout = deadline + 30 if deadline is not None else None
+        return self.request('call', timeout=timeout, prompt=prompt, system_prompt=system_prompt,
+                            max_tokens=max_tokens, temperature=temperature,
+                            task_type=task_type, max_retries=max_retries, deadline=deadline)
+
+    def call_batch(self, prompts: List[str], **kwargs) -> List[Dict[str, Any]]:
+        """Same contract as AIAPIFallback.call_batch, served by the daemon"""
+        return self.request('batch', prompts=prompts, **kwargs)
+
+    def call_map_reduce(self, content: str, instruction: str, **kwargs) -> Dict[str, Any]:
+        """Same contract as AIAPIFallback.call_map_reduce, served by the daemon"""
+        deadline = kwargs.get('deadline')
+        timeout = deadline + 30 if deadline is not None else None
+        return self.request('map_reduce', timeout=timeout, content=content,
+                            instruction=instruction, **kwargs)
+
+    def get_stats(self) -> Dict:
+        return self.request('stats')
+
+    def get_health_report(self) -> str:
+        return format_health_report(self.get_stats())
+
+    def shutdown(self):
+        self.request('shutdown')
 
 
 def ai_call(prompt: str,
             system_prompt: str = "You are a helpful AI assistant.",
             max_tokens: int = 2000,
             temperature: float = 0.7,
-            task_type: str = "general") -> str:
+            task_type: str = "general",
+            deadline: Optional[float] = None) -> str:
     """
     Simple function for workflow usage
     Returns response text or raises exception if all APIs fail
     
     This function guarantees a response as long as at least one API key is configured.
     With 21 providers, the probability of total failure is virtually zero.
+
+    When an AI gateway daemon is running (see ai_gateway.py) the call is forwarded to
+    it, reusing its warm connections, breaker state and statistics.
+
+    deadline (default: $AI_DEADLINE) bounds the whole call in seconds; set it below the
+    job's timeout-minutes so a failure is reported instead of the job being killed.
     """
-    fallback = AIAPIFallback()
-    result = fallback.call_with_fallback(
-        prompt, 
-        system_prompt, 
-        max_tokens, 
-        temperature, 
-        task_type,
-        max_retries=2  # 2 retries per API = up to 42 total attempts with 21 APIs!
-    )
+    budget = DeadlineBudget(deadline if deadline is not None else default_deadline())
+    result = None
+    client = GatewayClient.discover()
+    if client is not None:
+        try:
+            result = client.call_with_fallback(prompt, system_prompt, max_tokens,
+                                               temperature, task_type, max_retries=2,
+                                               deadline=budget.seconds)
+        except (OSError, ValueError, GatewayError) as e:
+            print(f"⚠️  AI gateway unavailable ({e}), running in-process")
+        else:
+            print(f"🔌 Served by AI gateway at {client.address}")
+            if result['success']:
+                return result['response']
+
+    if result is None:
+        with AIAPIFallback() as fallback:
+            result = fallback.call_with_fallback(
+                prompt, 
+                system_prompt, 
+                max_tokens, 
+                temperature, 
+                task_type,
+                max_retries=2,  # 2 retries per API = up to 42 total attempts with 21 APIs!
+                deadline=budget.remaining() if budget.bounded else None
+            )
+
+            if result['success']:
+                print(fallback.get_health_report())
+                return result['response']
+
+    _raise_failure(result)
+
+
+def ai_map_reduce(content: str,
+                  instruction: str,
+                  system_prompt: str = "You are a helpful AI assistant.",
+                  max_tokens: int = 2000,
+                  temperature: float = 0.7,
+                  task_type: str = "general",
+                  deadline: Optional[float] = None) -> str:
+    """
+    ai_call for inputs of any size: instead of truncating, content that does not
+    fit the models' context is split, analyzed in parallel and merged
+    (see AIAPIFallback.acall_map_reduce). Uses the AI gateway when one is running.
+    Returns response text or raises exception if no answer could be produced
+    """
+    budget = DeadlineBudget(deadline if deadline is not None else default_deadline())
+    result = None
+    client = GatewayClient.discover()
+    if client is not None:
+        try:
+            result = client.call_map_reduce(content, instruction, system_prompt=system_prompt,
+                                            max_tokens=max_tokens, temperature=temperature,
+                                            task_type=task_type, max_retries=2,
+                                            deadline=budget.seconds)
+        except (OSError, ValueError, GatewayError) as e:
+            print(f"⚠️  AI gateway unavailable ({e}), running in-process")
+        else:
+            print(f"🔌 Served by AI gateway at {client.address}")
+
+    if result is None:
+        with AIAPIFallback() as fallback:
+            result = fallback.call_map_reduce(
+                content, instruction, system_prompt, max_tokens, temperature, task_type,
+                max_retries=2, deadline=budget.remaining() if budget.bounded else None
+            )
+            if result['success']:
+                print(fallback.get_health_report())
 
     if result['success']:
-        print(fallback.get_health_report())
         return result['response']
-    else:
-        error_summary = (
-            f"CRITICAL: All {len(result['apis_tried'])} available APIs failed after "
-            f"{result['attempts']} total attempts. "
-            f"APIs tried: {', '.join(set(result['apis_tried']))}. "
-            f"First 3 errors: {'; '.join(result['errors'][:3])}"
-        )
-        raise Exception(error_summary)
+    _raise_failure(result)
+
 
+def _raise_failure(result: Dict[str, Any]):
+    """Raise the CRITICAL exception describing a failed call"""
+    if result.get('deadline_exceeded'):
+        raise Exception(f"CRITICAL: {result['diagnostic']}. "
+                        f"Last errors: {'; '.join(result['errors'][-3:])}")
+
+    error_summary = (
+        f"CRITICAL: All {len(result['apis_tried'])} available APIs failed after "
+        f"{result['attempts']} total attempts. "
+        f"APIs tried: {', '.join(set(result['apis_tried']))}. "
+        f"First 3 errors: {'; '.join(result['errors'][:3])}"
+    )
+    raise Exception(error_summary)
 
 if __name__ == "__main__":
+    # Merge stats saved by several runs: ai_api_fallback.py --merge-stats a.json b.json
+    if sys.argv[1:2] == ['--merge-stats']:
+        saved = []
+        for path in sys.argv[2:]:
+            with open(path) as f:
+                saved.append(json.load(f))
+        print(format_health_report(merge_stats(saved)))
+        sys.exit(0)
+
     # Test the system
     print("\n" + "="*60)
     print("🧪 TESTING ULTIMATE AI API FALLBACK SYSTEM")
@@ -749,6 +1800,7 @@ if __name__ == "__main__":
     )
 
     print(fallback.get_health_report())
+    fallback.close()
 
     if result['success']:
         print(f"\n✅ TEST PASSED!")
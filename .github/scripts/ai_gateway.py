@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Long-lived local AI gateway daemon
+Holds one AIAPIFallback (provider connection pools, circuit breakers, rate limit
+buckets, single-flight state and statistics) and serves it over a Unix socket or
+localhost TCP, so a job making several AI calls pays the cold start only once.
+Clients connect through ai_api_fallback.GatewayClient (ai_call() does this
+automatically) and fall back to in-process mode when no daemon is running.
+
+Usage in a workflow job:
+    python .github/scripts/ai_gateway.py start     # detach and wait until ready
+    python .github/scripts/run_*.py ...            # calls are forwarded
+    python .github/scripts/ai_gateway.py stop      # prints the merged health report
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import subprocess
+from typing import Dict, Optional
+
+from ai_api_fallback import (
+    AIAPIFallback, GatewayClient, gateway_address, parse_tcp_address
+)
+
+MAX_REQUEST_BYTES = 16 * 1024 * 1024  # Largest accepted request line (prompts included)
+
+
+class AIGateway:
+    """Serve one shared AIAPIFallback to local clients"""
+
+    def __init__(self, address: Optional[str] = None, idle_timeout: float = 900.0,
+                 **fallback_kwargs):
+        self.address = address or gateway_address()
+        if not self.address:
+            raise ValueError("AI gateway is disabled (AI_GATEWAY=off)")
+        self.idle_timeout = idle_timeout  # Seconds without requests before exiting (0 = never)
+        self.fallback = AIAPIFallback(**fallback_kwargs)
+        self.started = time.time()
+        self.requests_served = 0
+        self._active = 0
+        self._last_activity = time.monotonic()
+        self._stop: Optional[asyncio.Event] = None
+
+    async def serve(self):
+        """Accept connections until shutdown is requested or the idle timeout expires"""
+        self._stop = asyncio.Event()
+        tcp = parse_tcp_address(self.address)
+        if tcp:
+            server = await asyncio.start_server(self._handle, *tcp, limit=MAX_REQUEST_BYTES)
+        else:
+            self._remove_stale_socket()
+            server = await asyncio.start_unix_server(self._handle, path=self.address,
+                                                     limit=MAX_REQUEST_BYTES)
+            # Whoever can connect can spend the provider quotas: owner only
+            os.chmod(self.address, 0o600)
+
+        print(f"🚪 AI gateway listening on {self.address} (pid {os.getpid()})", flush=True)
+        watcher = asyncio.create_task(self._watch_idle())
+        try:
+            async with server, self.fallback:
+                await self._stop.wait()
+        finally:
+            watcher.cancel()
+            if not tcp and os.path.exists(self.address):
+                os.unlink(self.address)
+        print(f"🚪 AI gateway stopped after {self.requests_served} requests", flush=True)
+
+    def _remove_stale_socket(self):
+        """Remove a socket file left by a dead daemon; refuse to start next to a live one"""
+        if not os.path.exists(self.address):
+            return
+        if GatewayClient.discover(self.address) is not None:
+            raise RuntimeError(f"An AI gateway is already running on {self.address}")
+        os.unlink(self.address)
+
+    async def _watch_idle(self):
+        while self.idle_timeout > 0:
+            await asyncio.sleep(min(self.idle_timeout, 30.0))
+            idle = time.monotonic() - self._last_activity
+            if self._active == 0 and idle >= self.idle_timeout:
+                print(f"💤 AI gateway idle for {idle:.0f}s, shutting down", flush=True)
+                self._stop.set()
+                return
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._active += 1
+        self._last_activity = time.monotonic()
+        try:
+            line = await reader.readline()
+            if not line:
+                return
+            try:
+                request = json.loads(line)
+                reply = {'ok': True, 'result': await self._dispatch(
+                    request.get('op'), request.get('kwargs') or {})}
+            except Exception as e:
+                reply = {'ok': False, 'error': f"{type(e).__name__}: {e}"}
+            writer.write(json.dumps(reply, default=str).encode() + b'\n')
+            await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            pass  # Client went away or sent an oversized line
+        finally:
+            self._active -= 1
+            self._last_activity = time.monotonic()
+            writer.close()
+
+    async def _dispatch(self, op: str, kwargs: Dict):
+        if op == 'ping':
+            return {'pid': os.getpid(), 'uptime': time.time() - self.started,
+                    'requests_served': self.requests_served}
+        if op == 'call':
+            self.requests_served += 1
+            return await self.fallback.acall_with_fallback(**kwargs)
+        if op == 'batch':
+            self.requests_served += 1
+            return await self.fallback.acall_batch(**kwargs)
+        if op == 'map_reduce':
+            self.requests_served += 1
+            return await self.fallback.acall_map_reduce(**kwargs)
+        if op == 'stats':
+            return self.fallback.get_stats()
+        if op == 'shutdown':
+            self._stop.set()
+            return {'requests_served': self.requests_served}
+        raise ValueError(f"Unknown operation: {op}")
+
+
+def start_detached(address: Optional[str], idle_timeout: float, routing: str = 'priority',
+                   wait: float = 30.0) -> bool:
+    """Spawn the daemon in its own session and wait until it answers"""
+    address = address or gateway_address()
+    if GatewayClient.discover(address) is not None:
+        print(f"✅ AI gateway already running on {address}")
+        return True
+
+    log_path = os.environ.get('AI_GATEWAY_LOG', os.devnull)
+    with open(log_path, 'ab') as log:
+        subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), 'serve',
+             '--address', address, '--idle-timeout', str(idle_timeout), '--routing', routing],
+            stdin=subprocess.DEVNULL, stdout=log, stderr=subprocess.STDOUT,
+            start_new_session=True
+        )
+
+    deadline = time.monotonic() + wait
+    while time.monotonic() < deadline:
+        if GatewayClient.discover(address) is not None:
+            print(f"✅ AI gateway started on {address}")
+            return True
+        time.sleep(0.2)
+    print(f"❌ AI gateway did not come up on {address} within {wait:.0f}s")
+    return False
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Local AI gateway daemon')
+    parser.add_argument('command', choices=['serve', 'start', 'status', 'stop'],
+                        help='serve: run in foreground; start: run detached; '
+                             'status: print health report; stop: shut down')
+    parser.add_argument('--address', default=None,
+                        help='Unix socket path or host:port (default: $AI_GATEWAY or a per-user socket)')
+    parser.add_argument('--idle-timeout', type=float, default=900.0,
+                        help='Exit after this many idle seconds (0 = never)')
+    parser.add_argument('--routing', choices=['priority', 'adaptive'], default='priority',
+                        help='Provider routing mode')
+
+    args = parser.parse_args()
+    address = args.address or gateway_address()
+
+    if args.command == 'serve':
+        gateway = AIGateway(address, args.idle_timeout, routing=args.routing)
+        asyncio.run(gateway.serve())
+    elif args.command == 'start':
+        sys.exit(0 if start_detached(address, args.idle_timeout, args.routing) else 1)
+    else:
+        client = GatewayClient.discover(address)
+        if client is None:
+            print(f"⚪ No AI gateway running on {address}")
+            sys.exit(0 if args.command == 'stop' else 1)
+        print(client.get_health_report())
+        if args.command == 'stop':
+            client.shutdown()
+            print("🛑 AI gateway stopped")
+
+
+if __name__ == '__main__':
+    main()
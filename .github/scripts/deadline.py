@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+End-to-end deadline budget for fallback chains
+Both engines ask the budget how long the next attempt may take (a share of
+what is left, never more than the provider's own timeout), whether a retry
+backoff still fits, and when to stop trying and report what happened. A
+provider's retries and sibling models share a split of the budget, so one
+provider cannot use up the time of the providers after it
+"""
+
+import os
+import time
+from typing import Optional
+
+MIN_ATTEMPT_SECONDS = 2.0  # Smaller slices cannot complete a real provider call
+SPREAD = 3  # An attempt may use at most 1/SPREAD of the remaining budget
+RESERVE_SECONDS = 0.5  # Kept back so the failure diagnostic is returned before the deadline
+
+
+def default_deadline() -> Optional[float]:
+    """Deadline in seconds from $AI_DEADLINE, or None (unbounded)"""
+    value = os.environ.get('AI_DEADLINE')
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+
+class DeadlineBudget:
+    """Wall-clock budget for one call; unbounded when seconds is None"""
+
+    __slots__ = ('seconds', 'started', 'expires')
+
+    def __init__(self, seconds: Optional[float] = None):
+        self.seconds = seconds
+        self.started = time.monotonic()
+        self.expires = self.started + seconds if seconds is not None else None
+
+    @property
+    def bounded(self) -> bool:
+        return self.expires is not None
+
+    def remaining(self) -> float:
+        if self.expires is None:
+            return float('inf')
+        return max(0.0, self.expires - time.monotonic())
+
+    def usable(self) -> float:
+        """Remaining time minus the reserve for reporting"""
+        return max(0.0, self.remaining() - RESERVE_SECONDS)
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    def attempt_timeout(self, timeout: float, attempts_left: int = 1) -> Optional[float]:
+        """
+        Timeout for the next attempt, or None when the budget cannot fit one.
+        The attempt gets at most 1/SPREAD of the remaining time (less when fewer
+        attempts are left to share it), so a hung provider cannot eat the budget
+        of every provider after it
+        """
+        if self.expires is None:
+            return timeout
+        remaining = self.usable()
+        if remaining < MIN_ATTEMPT_SECONDS:
+            return None
+        share = remaining / max(1, min(attempts_left, SPREAD))
+        return min(timeout, max(share, MIN_ATTEMPT_SECONDS))
+
+    def split(self, parts: int) -> 'DeadlineBudget':
+        """
+        Budget for the next of `parts` stages sharing what is left (one provider with
+        its retries and sibling models): an equal share among at most SPREAD stages,
+        but room for one attempt whenever the whole budget still has it
+        """
+        if self.expires is None:
+            return self
+        usable = self.usable()
+        share = max(usable / max(1, min(parts, SPREAD)), min(usable, MIN_ATTEMPT_SECONDS))
+        return DeadlineBudget(share + RESERVE_SECONDS)
+
+    def fits_sleep(self, seconds: float) -> bool:
+        """True if sleeping this long still leaves room for another attempt"""
+        return self.usable() - seconds >= MIN_ATTEMPT_SECONDS
+
+    def describe(self) -> str:
+        return f"{self.elapsed():.1f}s of a {self.seconds:.0f}s deadline used"
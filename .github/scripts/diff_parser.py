@@ -0,0 +1,414 @@
+#!/usr/bin/env python3
+"""
+Streaming unified diff parser for PR analysis
+Reads a `git diff` / GitHub .diff response line by line, drops files that are
+noise for a review (binary, lockfiles, generated or vendored code) and packs
+the most valuable hunks into a token budget, so memory stays bounded on huge
+diffs and prompts carry signal. Each file is identified by (path, base blob
+SHA, head blob SHA) from its index line, so an analysis of one file version
+can be reused while that file is unchanged
+"""
+
+import os
+import re
+import heapq
+import hashlib
+from fnmatch import fnmatch
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+from prompt_budget import estimate_tokens
+
+MAX_HUNK_LINES = 400  # Longer hunks keep their first lines and count the rest
+MAX_LINE_CHARS = 2000  # Longer lines (minified code, embedded data) are cut
+MAX_LINE_BYTES = 64 * 1024  # Bytes of one line buffered while streaming
+
+LOCKFILE_PATTERNS = (
+    'package-lock.json', 'npm-shrinkwrap.json', 'yarn.lock', 'pnpm-lock.yaml', 'poetry.lock',
+    'Pipfile.lock', 'uv.lock', 'Cargo.lock', 'Gemfile.lock', 'composer.lock', 'go.sum',
+    'packages.lock.json', '*.lock',
+)
+GENERATED_PATTERNS = (
+    '*.min.js', '*.min.css', '*.map', '*_pb2.py', '*_pb2_grpc.py', '*.pb.go', '*.generated.*',
+    '*.g.dart', '*.snap', '/dist/*', '/build/*',
+)
+VENDORED_PATTERNS = ('vendor/*', 'node_modules/*', 'third_party/*', 'site-packages/*')
+# Markers near the top of a file that say it is generated
+GENERATED_MARKERS = ('@generated', 'DO NOT EDIT', 'Code generated by', 'auto-generated',
+                     'autogenerated')
+
+# Relative review value of a changed line by kind of file
+_DOC_EXTENSIONS = ('.md', '.rst', '.txt', '.adoc')
+_CONFIG_EXTENSIONS = ('.json', '.yml', '.yaml', '.toml', '.ini', '.cfg', '.xml', '.csv')
+_RISKY_RE = re.compile(
+    r'password|secret|token|credential|auth|crypt|permission|sudo|eval\(|exec\(|subprocess|'
+    r'shell=True|pickle|yaml\.load|sql|innerHTML|deserializ', re.IGNORECASE
+)
+
+_INDEX_RE = re.compile(r'^index ([0-9a-f]+)\.\.([0-9a-f]+)')
+_HEADER_RE = re.compile(r'^diff --git a/(.*) b/(.*)$')
+
+
+def _matches(path: str, pattern: str) -> bool:
+    """
+    Glob match against the whole path or any trailing part of it (basename included);
+    a leading "/" anchors the pattern to the repository root
+    """
+    if pattern.startswith('/'):
+        return fnmatch(path, pattern[1:])
+    return fnmatch(path, pattern) or fnmatch(path, f"*/{pattern}")
+
+
+class NoiseFilter:
+    """
+    Rules deciding which files are left out of a review.
+    keep patterns win over everything; ignore patterns add to the built-in rules
+    """
+
+    def __init__(self, ignore: Sequence[str] = (), keep: Sequence[str] = (),
+                 skip_lockfiles: bool = True, skip_generated: bool = True,
+                 skip_vendored: bool = True):
+        self.rules: List[Tuple[str, Sequence[str]]] = []
+        if skip_lockfiles:
+            self.rules.append(('lockfile', LOCKFILE_PATTERNS))
+        if skip_generated:
+            self.rules.append(('generated', GENERATED_PATTERNS))
+        if skip_vendored:
+            self.rules.append(('vendored', VENDORED_PATTERNS))
+        if ignore:
+            self.rules.append(('ignored', tuple(ignore)))
+        self.keep = tuple(keep)
+        self.check_markers = skip_generated
+
+    @classmethod
+    def from_env(cls) -> 'NoiseFilter':
+        """
+        Rules extended by $PR_DIFF_IGNORE and $PR_DIFF_KEEP (comma-separated globs,
+        "/dist/*" style for root-anchored ones)
+        """
+        def patterns(name: str) -> List[str]:
+            return [p.strip() for p in os.environ.get(name, '').split(',') if p.strip()]
+        return cls(ignore=patterns('PR_DIFF_IGNORE'), keep=patterns('PR_DIFF_KEEP'))
+
+    def kept(self, path: str) -> bool:
+        return any(_matches(path, pattern) for pattern in self.keep)
+
+    def classify(self, path: str) -> Optional[str]:
+        """Why the file is noise ('lockfile', 'generated', ...), or None to review it"""
+        if self.kept(path):
+            return None
+        for reason, patterns in self.rules:
+            if any(_matches(path, pattern) for pattern in patterns):
+                return reason
+        return None
+
+
+class Hunk:
+    """One @@ hunk of a file diff"""
+
+    __slots__ = ('file_index', 'index', 'lines', 'added', 'removed', 'cut_lines', 'tokens',
+                 'score')
+
+    def __init__(self, file_index: int, index: int, header: str):
+        self.file_index = file_index
+        self.index = index  # Position within the file
+        self.lines = [header]
+        self.added = 0
+        self.removed = 0
+        self.cut_lines = 0  # Lines beyond MAX_HUNK_LINES that were not kept
+        self.tokens = 0
+        self.score = 0.0
+
+    def add(self, line: str):
+        if line.startswith('+'):
+            self.added += 1
+        elif line.startswith('-'):
+            self.removed += 1
+        if len(self.lines) > MAX_HUNK_LINES:
+            self.cut_lines += 1
+            return
+        self.lines.append(line if len(line) <= MAX_LINE_CHARS else line[:MAX_LINE_CHARS] + ' …')
+
+    def finish(self, path: str):
+        """Compute size and value once the hunk is complete"""
+        if self.cut_lines:
+            self.lines.append(f"… {self.cut_lines} more lines of this hunk not shown")
+        text = '\n'.join(self.lines)
+        self.tokens = estimate_tokens(text) + 1
+        weight = _path_weight(path)
+        changed = [line for line in self.lines[1:] if line[:1] in ('+', '-')]
+        risky = any(_RISKY_RE.search(line) for line in changed)
+        # Review value per prompt token: changed lines, weighted by kind of file and risk
+        self.score = weight * (2.0 if risky else 1.0) * (self.added + self.removed + 1) / self.tokens
+
+
+def _path_weight(path: str) -> float:
+    lowered = path.lower()
+    if lowered.endswith(_DOC_EXTENSIONS):
+        return 0.3
+    if lowered.endswith(_CONFIG_EXTENSIONS):
+        return 0.6
+    if '/test' in f"/{lowered}" or lowered.startswith('tests/'):
+        return 0.7
+    return 1.0
+
+
+class FileDiff:
+    """The diff of one file: header lines plus the hunks kept for review"""
+
+    __slots__ = ('index', 'path', 'old_path', 'base_sha', 'head_sha', 'header', 'hunks',
+                 'skipped', 'omitted_hunks', 'omitted_added', 'omitted_removed',
+                 'added', 'removed')
+
+    def __init__(self, index: int, header: List[str]):
+        self.index = index
+        self.header = header
+        self.hunks: List[Hunk] = []
+        self.skipped: Optional[str] = None  # Noise reason when the file is left out
+        self.omitted_hunks = 0  # Hunks dropped to fit the budget
+        self.omitted_added = 0
+        self.omitted_removed = 0
+        self.added = 0
+        self.removed = 0
+
+        match = _HEADER_RE.match(header[0])
+        self.old_path, self.path = match.groups() if match else ('', '')
+        self.base_sha = self.head_sha = None
+        for line in header[1:]:
+            if line.startswith('index '):
+                index_match = _INDEX_RE.match(line)
+                if index_match:
+                    self.base_sha, self.head_sha = index_match.groups()
+            elif line.startswith('rename from '):
+                self.old_path = line[len('rename from '):]
+            elif line.startswith('rename to '):
+                self.path = line[len('rename to '):]
+            elif line.startswith('+++ b/'):
+                self.path = line[len('+++ b/'):]
+            elif line.startswith('--- a/'):
+                self.old_path = line[len('--- a/'):]
+            elif line.startswith('Binary files ') or line.startswith('GIT binary patch'):
+                self.skipped = 'binary'
+        self.path = self.path or self.old_path
+        self.old_path = self.old_path or self.path
+
+    @property
+    def complete(self) -> bool:
+        """True if every hunk is included in full"""
+        return not self.omitted_hunks and not any(h.cut_lines for h in self.hunks)
+
+    @property
+    def text(self) -> str:
+        lines = list(self.header)
+        for hunk in self.hunks:
+            lines.extend(hunk.lines)
+        if self.omitted_hunks:
+            lines.append(f"… {self.omitted_hunks} lower-priority hunks of this file not shown")
+        return '\n'.join(lines) + '\n'
+
+    @property
+    def key(self) -> Tuple[str, str, str]:
+        """
+        (path, base blob, head blob); a content hash stands in when there is no
+        index line, and is appended when only part of the file's diff is included
+        """
+        if self.base_sha is None or self.head_sha is None or not self.complete:
+            digest = hashlib.sha1(self.text.encode('utf-8', errors='replace')).hexdigest()
+            return (self.path, self.base_sha or '', f"{self.head_sha or ''}:{digest}")
+        return (self.path, self.base_sha, self.head_sha)
+
+
+def iter_lines(chunks: Iterable[bytes]) -> Iterator[str]:
+    """Decode a byte stream (e.g. response.iter_content()) into lines without line endings"""
+    pending = b''
+    overlong = False
+    for chunk in chunks:
+        pending += chunk
+        *lines, pending = pending.split(b'\n')
+        for line in lines:
+            if overlong:
+                overlong = False  # Tail of a line that was already cut
+                continue
+            yield line.rstrip(b'\r').decode('utf-8', errors='replace')
+        if len(pending) > MAX_LINE_BYTES:
+            if not overlong:
+                yield pending[:MAX_LINE_BYTES].decode('utf-8', errors='replace')
+            pending = b''
+            overlong = True
+    if pending and not overlong:
+        yield pending.rstrip(b'\r').decode('utf-8', errors='replace')
+
+
+def iter_diff(lines: Iterable[str],
+              noise: Optional[NoiseFilter] = None) -> Iterator[Union[FileDiff, Hunk]]:
+    """
+    Parse diff lines into a stream of FileDiff (when a file's header is complete)
+    followed by that file's Hunks. Hunks of noise files are consumed without
+    being kept; only their changed-line counts are recorded
+    """
+    file: Optional[FileDiff] = None
+    header: List[str] = []
+    hunk: Optional[Hunk] = None
+    count = 0
+
+    def start_file() -> FileDiff:
+        nonlocal count
+        parsed = FileDiff(count, header)
+        count += 1
+        if parsed.skipped is None and noise is not None:
+            parsed.skipped = noise.classify(parsed.path)
+        return parsed
+
+    def finish_hunk() -> Optional[Hunk]:
+        """Close the current hunk; return it if it should be emitted"""
+        if hunk is None:
+            return None
+        file.added += hunk.added
+        file.removed += hunk.removed
+        if file.skipped:
+            return None
+        if (hunk.index == 0 and noise is not None and noise.check_markers
+                and not noise.kept(file.path)
+                and any(marker in line for line in hunk.lines[:20] for marker in GENERATED_MARKERS)):
+            file.skipped = 'generated'
+            return None
+        hunk.finish(file.path)
+        return hunk
+
+    for line in lines:
+        if line.startswith('diff --git '):
+            done = finish_hunk()
+            if done is not None:
+                yield done
+            if file is None and header:
+                file = start_file()
+                yield file
+            file, hunk, header = None, None, [line]
+            continue
+        if file is None:
+            if not header:
+                continue  # Preamble before the first file
+            if line.startswith('@@'):
+                file = start_file()
+                yield file
+            else:
+                header.append(line)
+                continue
+        if line.startswith('@@'):
+            done = finish_hunk()
+            if done is not None:
+                yield done
+            hunk = Hunk(file.index, hunk.index + 1 if hunk else 0, line)
+        elif hunk is not None:
+            if file.skipped:
+                # Count without keeping the line
+                if line.startswith('+'):
+                    hunk.added += 1
+                elif line.startswith('-'):
+                    hunk.removed += 1
+            else:
+                hunk.add(line)
+
+    done = finish_hunk()
+    if done is not None:
+        yield done
+    if file is None and header:
+        yield start_file()
+
+
+class PackedDiff:
+    """Files of a diff with the hunks that fit the budget, plus what was left out"""
+
+    def __init__(self, files: List[FileDiff], tokens: int):
+        self.files = files
+        self.tokens = tokens  # Estimated tokens of the kept hunks
+
+    @property
+    def reviewable(self) -> List[FileDiff]:
+        """Files with at least one kept hunk"""
+        return [f for f in self.files if f.hunks]
+
+    @property
+    def text(self) -> str:
+        return ''.join(f.text for f in self.reviewable)
+
+    def summary(self) -> str:
+        """What was left out and why, for the reviewer (empty if nothing)"""
+        notes = []
+        skipped = [f for f in self.files if f.skipped]
+        if skipped:
+            listed = ', '.join(f"{f.path} ({f.skipped})" for f in skipped[:20])
+            more = f" and {len(skipped) - 20} more" if len(skipped) > 20 else ""
+            notes.append(f"Not reviewed as noise: {listed}{more}")
+        partial = [f for f in self.files if f.omitted_hunks]
+        if partial:
+            hunks = sum(f.omitted_hunks for f in partial)
+            added = sum(f.omitted_added for f in partial)
+            removed = sum(f.omitted_removed for f in partial)
+            listed = ', '.join(f.path for f in partial[:20])
+            notes.append(f"Omitted to fit the review budget: {hunks} lower-priority hunks "
+                         f"(+{added}/-{removed} lines) in {listed}")
+        return '\n'.join(notes)
+
+    def stats(self) -> dict:
+        return {
+            'files': len(self.files),
+            'skipped_files': sum(1 for f in self.files if f.skipped),
+            'hunks_kept': sum(len(f.hunks) for f in self.files),
+            'hunks_omitted': sum(f.omitted_hunks for f in self.files),
+            'tokens': self.tokens
+        }
+
+
+def pack_diff(lines: Iterable[str], budget_tokens: Optional[int] = None,
+              noise: Optional[NoiseFilter] = None) -> PackedDiff:
+    """
+    Stream a diff and keep the most valuable hunks within budget_tokens (None keeps
+    all). Only kept hunks stay in memory: a hunk that does not fit evicts kept
+    hunks of lower value per token, or is dropped itself
+    """
+    files: List[FileDiff] = []
+    heap: List[Tuple[float, int, Hunk]] = []  # Min-heap of kept hunks by score
+    used = 0
+    sequence = 0
+
+    def drop(hunk: Hunk):
+        owner = files[hunk.file_index]
+        owner.omitted_hunks += 1
+        owner.omitted_added += hunk.added
+        owner.omitted_removed += hunk.removed
+
+    for item in iter_diff(lines, noise):
+        if isinstance(item, FileDiff):
+            files.append(item)
+            continue
+        hunk = item
+        sequence += 1
+        if budget_tokens is not None and used + hunk.tokens > budget_tokens:
+            # Evict lower-value hunks only if that actually makes room for this one
+            evicted = []
+            freed = 0
+            while heap and used - freed + hunk.tokens > budget_tokens and heap[0][0] < hunk.score:
+                entry = heapq.heappop(heap)
+                evicted.append(entry)
+                freed += entry[2].tokens
+            if used - freed + hunk.tokens > budget_tokens:
+                for entry in evicted:
+                    heapq.heappush(heap, entry)
+                drop(hunk)
+                continue
+            for _, _, old in evicted:
+                drop(old)
+            used -= freed
+        heapq.heappush(heap, (hunk.score, sequence, hunk))
+        used += hunk.tokens
+
+    for _, _, hunk in heap:
+        files[hunk.file_index].hunks.append(hunk)
+    for f in files:
+        f.hunks.sort(key=lambda h: h.index)
+    return PackedDiff(files, used)
+
+
+def split_file_diffs(diff: str) -> List[FileDiff]:
+    """Split a complete diff text into per-file units (no filtering, no budget)"""
+    return pack_diff(diff.splitlines()).reviewable
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Compact, mergeable log-bucketed histograms for latency percentiles
+Bucket i covers (GAMMA**(i-1), GAMMA**i], so any quantile is reported within
+~5% relative error while memory stays bounded by the value range, not the count
+"""
+
+import math
+from array import array
+from typing import Dict, Iterable, Optional
+
+GAMMA = 1.1  # Bucket growth factor (relative error ~ (GAMMA - 1) / 2)
+_LOG_GAMMA = math.log(GAMMA)
+MIN_VALUE = 0.001  # Values at or below this share bucket 0
+
+
+class LogHistogram:
+    """Sparse histogram with geometrically sized buckets"""
+
+    __slots__ = ('buckets', 'count', 'total', 'max_value')
+
+    def __init__(self):
+        self.buckets: Dict[int, int] = {}  # bucket index -> count
+        self.count = 0
+        self.total = 0.0
+        self.max_value = 0.0
+
+    @staticmethod
+    def bucket_index(value: float) -> int:
+        if value <= MIN_VALUE:
+            return 0
+        return max(0, math.ceil(math.log(value / MIN_VALUE) / _LOG_GAMMA))
+
+    @staticmethod
+    def bucket_value(index: int) -> float:
+        """Representative value (geometric midpoint) of a bucket"""
+        if index == 0:
+            return MIN_VALUE
+        return MIN_VALUE * GAMMA ** (index - 0.5)
+
+    def add(self, value: float, count: int = 1):
+        index = self.bucket_index(value)
+        self.buckets[index] = self.buckets.get(index, 0) + count
+        self.count += count
+        self.total += value * count
+        self.max_value = max(self.max_value, value)
+
+    def merge(self, other: 'LogHistogram') -> 'LogHistogram':
+        """Add another histogram's counts into this one"""
+        for index, count in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + count
+        self.count += other.count
+        self.total += other.total
+        self.max_value = max(self.max_value, other.max_value)
+        return self
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Approximate q-quantile (0-1) by nearest rank, or None when empty"""
+        if not self.count:
+            return None
+        # Nearest rank: the smallest value with at least q of the samples at or below it
+        # (the epsilon keeps float products such as 0.07 * 100 from skipping a rank)
+        rank = max(1, math.ceil(q * self.count - 1e-9))
+        if rank >= self.count:
+            return self.max_value  # The top sample is known exactly
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= rank:
+                return min(self.bucket_value(index), self.max_value)
+        return self.max_value
+
+    def mean(self) -> Optional[float]:
+        return self.total / self.count if self.count else None
+
+    def summary(self, quantiles: Iterable[float] = (0.5, 0.9, 0.99)) -> Dict:
+        """Count, mean, max and the requested percentiles (as pNN keys)"""
+        result = {'count': self.count, 'mean': self.mean(), 'max': self.max_value}
+        for q in quantiles:
+            result[f"p{round(q * 100):g}"] = self.quantile(q)
+        return result
+
+    def to_dict(self) -> Dict:
+        return {
+            'buckets': {str(i): c for i, c in self.buckets.items()},
+            'count': self.count,
+            'total': self.total,
+            'max': self.max_value
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'LogHistogram':
+        hist = cls()
+        hist.buckets = {int(i): c for i, c in data.get('buckets', {}).items()}
+        hist.count = data.get('count', 0)
+        hist.total = data.get('total', 0.0)
+        hist.max_value = data.get('max', 0.0)
+        return hist
+
+    def to_bytes(self) -> bytes:
+        """Binary encoding: count, total, max, then parallel index/count arrays"""
+        indices = array('i', sorted(self.buckets))
+        counts = array('Q', (self.buckets[i] for i in indices))
+        header = array('d', [self.count, self.total, self.max_value])
+        return header.tobytes() + indices.tobytes() + counts.tobytes()
+
+    @classmethod
+    def from_bytes(cls, blob: bytes) -> 'LogHistogram':
+        hist = cls()
+        header = array('d')
+        header.frombytes(blob[:24])
+        hist.count, hist.total, hist.max_value = int(header[0]), header[1], header[2]
+        body = blob[24:]
+        n = len(body) // 12  # 4-byte index + 8-byte count per bucket
+        indices, counts = array('i'), array('Q')
+        indices.frombytes(body[:4 * n])
+        counts.frombytes(body[4 * n:])
+        hist.buckets = dict(zip(indices, counts))
+        return hist
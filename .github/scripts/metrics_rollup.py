@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""
+Metrics rollup engine for orchestrator ai_metrics_YYYYMM.jsonl files
+Streams only lines not seen before (byte offsets are remembered), folds them
+into hourly per-provider and per-task_type rollups stored in SQLite with
+binary latency histograms, and reports p50/p95/p99 latency, success rate,
+fallback depth and error classes without re-reading the JSONL
+"""
+
+import re
+import sys
+import json
+import sqlite3
+import argparse
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from latency_histogram import LogHistogram
+from provider_errors import classify_status
+
+FLUSH_EVERY = 5000  # Records aggregated in memory before merging into the store
+
+_HTTP_STATUS_RE = re.compile(r'HTTP (\d{3})')
+
+
+def classify_error(error: Optional[str]) -> str:
+    """Map an attempt's error string to an error class (for records without error_class)"""
+    if not error:
+        return 'none'
+    if error.startswith('Cancelled'):
+        return 'cancelled'
+    if 'timeout' in error.lower():
+        return 'timeout'
+    match = _HTTP_STATUS_RE.search(error)
+    if match:
+        return classify_status(int(match.group(1)), error)
+    if error.startswith('Exception'):
+        return 'exception'
+    return 'other'
+
+
+class MetricsRollup:
+    """Incremental rollup store for orchestrator metrics"""
+
+    def __init__(self, metrics_dir: str = ".github/data/metrics",
+                 db_path: Optional[str] = None):
+        self.metrics_dir = Path(metrics_dir)
+        self.db_path = Path(db_path) if db_path else self.metrics_dir / "rollups.db"
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(str(self.db_path), timeout=10.0, isolation_level=None)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS sources (path TEXT PRIMARY KEY, offset INTEGER NOT NULL)"
+        )
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS rollups ("
+            "window_start TEXT NOT NULL, dimension TEXT NOT NULL, name TEXT NOT NULL, "
+            "requests INTEGER NOT NULL, successes INTEGER NOT NULL, "
+            "fallback_total INTEGER NOT NULL, latency BLOB NOT NULL, errors TEXT NOT NULL, "
+            "PRIMARY KEY (window_start, dimension, name))"
+        )
+
+    def ingest(self) -> int:
+        """Fold all new metric lines into the rollups; returns records processed"""
+        processed = 0
+        for metrics_file in sorted(self.metrics_dir.glob("ai_metrics_*.jsonl")):
+            processed += self._ingest_file(metrics_file)
+        return processed
+
+    def _ingest_file(self, metrics_file: Path) -> int:
+        row = self.db.execute(
+            "SELECT offset FROM sources WHERE path = ?", (str(metrics_file),)
+        ).fetchone()
+        offset = row[0] if row else 0
+        if metrics_file.stat().st_size < offset:
+            offset = 0  # File was truncated or replaced
+
+        acc = {}
+        processed = 0
+        with metrics_file.open('rb') as f:
+            f.seek(offset)
+            for raw_line in f:
+                if not raw_line.endswith(b'\n'):
+                    break  # Partially written line: pick it up next time
+                offset += len(raw_line)
+                try:
+                    record = json.loads(raw_line)
+                except ValueError:
+                    continue
+                self._accumulate(acc, record)
+                processed += 1
+                if processed % FLUSH_EVERY == 0:
+                    self._flush(acc, metrics_file, offset)
+                    acc = {}
+
+        self._flush(acc, metrics_file, offset)
+        return processed
+
+    @staticmethod
+    def _window_start(timestamp: str) -> Optional[str]:
+        try:
+            return datetime.fromisoformat(timestamp).strftime('%Y-%m-%dT%H:00')
+        except (TypeError, ValueError):
+            return None
+
+    @staticmethod
+    def _bucket(acc: Dict, key) -> Dict:
+        if key not in acc:
+            acc[key] = {'requests': 0, 'successes': 0, 'fallback_total': 0,
+                        'latency': LogHistogram(), 'errors': {}}
+        return acc[key]
+
+    def _accumulate(self, acc: Dict, record: Dict):
+        """Add one metrics record to the in-memory aggregates"""
+        window = self._window_start(record.get('timestamp'))
+        if window is None:
+            return
+
+        task = self._bucket(acc, (window, 'task_type', record.get('task_type', 'unknown')))
+        task['requests'] += 1
+        task['successes'] += 1 if record.get('success') else 0
+        task['fallback_total'] += record.get('fallback_count', 0)
+        task['latency'].add(record.get('duration_ms', 0.0))
+        if not record.get('success'):
+            task['errors']['all_failed'] = task['errors'].get('all_failed', 0) + 1
+
+        for attempt in record.get('attempts', []):
+            provider = self._bucket(acc, (window, 'provider', attempt.get('provider', 'unknown')))
+            error_class = None
+            if not attempt.get('success'):
+                error_class = attempt.get('error_class') or classify_error(attempt.get('error'))
+            if error_class == 'cancelled':
+                # Hedging losers say nothing about the provider's health or latency:
+                # only counted next to the errors, not as requests
+                provider['errors']['cancelled'] = provider['errors'].get('cancelled', 0) + 1
+                continue
+            provider['requests'] += 1
+            provider['latency'].add(attempt.get('duration_ms', 0.0))
+            if attempt.get('success'):
+                provider['successes'] += 1
+                provider['fallback_total'] += record.get('fallback_count', 0)
+            else:
+                provider['errors'][error_class] = provider['errors'].get(error_class, 0) + 1
+
+    def _flush(self, acc: Dict, metrics_file: Path, offset: int):
+        """Merge aggregates into the store and advance the file offset atomically"""
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            for (window, dimension, name), agg in acc.items():
+                row = self.db.execute(
+                    "SELECT requests, successes, fallback_total, latency, errors FROM rollups "
+                    "WHERE window_start = ? AND dimension = ? AND name = ?",
+                    (window, dimension, name)
+                ).fetchone()
+                if row:
+                    agg['requests'] += row[0]
+                    agg['successes'] += row[1]
+                    agg['fallback_total'] += row[2]
+                    agg['latency'].merge(LogHistogram.from_bytes(row[3]))
+                    for error_class, count in json.loads(row[4]).items():
+                        agg['errors'][error_class] = agg['errors'].get(error_class, 0) + count
+                self.db.execute(
+                    "INSERT OR REPLACE INTO rollups VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (window, dimension, name, agg['requests'], agg['successes'],
+                     agg['fallback_total'], agg['latency'].to_bytes(),
+                     json.dumps(agg['errors'], sort_keys=True))
+                )
+            self.db.execute(
+                "INSERT OR REPLACE INTO sources VALUES (?, ?)", (str(metrics_file), offset)
+            )
+            self.db.execute("COMMIT")
+        except sqlite3.Error:
+            self.db.execute("ROLLBACK")
+            raise
+
+    def query(self, since: Optional[str] = None, until: Optional[str] = None,
+              group_by: str = 'all', dimension: Optional[str] = None) -> List[Dict]:
+        """
+        Merge stored hourly rollups into rows per (window, dimension, name)
+        group_by: 'hour', 'day' or 'all'; since/until: ISO prefixes (inclusive)
+        """
+        sql = ("SELECT window_start, dimension, name, requests, successes, fallback_total, "
+               "latency, errors FROM rollups WHERE 1 = 1")
+        params = []
+        if since:
+            sql += " AND window_start >= ?"
+            params.append(since)
+        if until:
+            sql += " AND window_start <= ?"
+            params.append(until + '\uffff')
+        if dimension:
+            sql += " AND dimension = ?"
+            params.append(dimension)
+
+        merged = {}
+        for window, dim, name, requests, successes, fallback_total, latency, errors in \
+                self.db.execute(sql, params):
+            if group_by == 'hour':
+                group = window
+            elif group_by == 'day':
+                group = window[:10]
+            else:
+                group = 'all'
+            agg = self._bucket(merged, (group, dim, name))
+            agg['requests'] += requests
+            agg['successes'] += successes
+            agg['fallback_total'] += fallback_total
+            agg['latency'].merge(LogHistogram.from_bytes(latency))
+            for error_class, count in json.loads(errors).items():
+                agg['errors'][error_class] = agg['errors'].get(error_class, 0) + count
+
+        rows = []
+        for (group, dim, name), agg in sorted(merged.items()):
+            latency = agg['latency']
+            rows.append({
+                'window': group,
+                'dimension': dim,
+                'name': name,
+                'requests': agg['requests'],
+                'success_rate': agg['successes'] / agg['requests'] if agg['requests'] else 0.0,
+                'p50_ms': latency.quantile(0.50),
+                'p95_ms': latency.quantile(0.95),
+                'p99_ms': latency.quantile(0.99),
+                'avg_fallback_depth': (agg['fallback_total'] / agg['successes']
+                                       if agg['successes'] else None),
+                'errors': agg['errors']
+            })
+        return rows
+
+    def close(self):
+        self.db.close()
+
+
+def format_report(rows: List[Dict]) -> str:
+    """Render query rows as a fixed-width text table"""
+    lines = [
+        f"{'window':<16} {'dimension':<10} {'name':<16} {'reqs':>6} {'ok%':>6} "
+        f"{'p50ms':>8} {'p95ms':>8} {'p99ms':>8} {'depth':>5}  errors"
+    ]
+    for row in rows:
+        def ms(value):
+            return f"{value:.0f}" if value is not None else '-'
+        depth = f"{row['avg_fallback_depth']:.1f}" if row['avg_fallback_depth'] is not None else '-'
+        errors = ', '.join(f"{k}={v}" for k, v in
+                           sorted(row['errors'].items(), key=lambda x: -x[1])[:3])
+        lines.append(
+            f"{row['window']:<16} {row['dimension']:<10} {row['name'][:16]:<16} "
+            f"{row['requests']:>6} {row['success_rate'] * 100:>5.1f}% "
+            f"{ms(row['p50_ms']):>8} {ms(row['p95_ms']):>8} {ms(row['p99_ms']):>8} "
+            f"{depth:>5}  {errors}"
+        )
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Roll up AI orchestrator metrics')
+    parser.add_argument('--metrics-dir', default='.github/data/metrics', help='Metrics directory')
+    parser.add_argument('--db', default=None, help='Rollup store (default: <metrics-dir>/rollups.db)')
+    parser.add_argument('--group-by', choices=['hour', 'day', 'all'], default='day',
+                        help='Time window for the report')
+    parser.add_argument('--dimension', choices=['provider', 'task_type'], default=None,
+                        help='Only report one dimension')
+    parser.add_argument('--since', default=None, help='Start window, ISO prefix (e.g. 2026-02-01)')
+    parser.add_argument('--until', default=None, help='End window, ISO prefix (inclusive)')
+    parser.add_argument('--no-ingest', action='store_true', help='Query stored rollups only')
+    parser.add_argument('--json', action='store_true', help='Print rows as JSON')
+
+    args = parser.parse_args()
+
+    rollup = MetricsRollup(args.metrics_dir, args.db)
+    if not args.no_ingest:
+        processed = rollup.ingest()
+        print(f"📊 Ingested {processed} new metric records", file=sys.stderr)
+
+    rows = rollup.query(args.since, args.until, args.group_by, args.dimension)
+    rollup.close()
+
+    if args.json:
+        print(json.dumps(rows, indent=2))
+    else:
+        print(format_report(rows))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Per-attempt HTTP phase timing (DNS, connect, TTFB, body, parse)
+Timestamps come from aiohttp trace hooks or, on the requests path, from
+streamed responses; spans can be exported in the Chrome trace-event format
+(load the file in chrome://tracing or https://ui.perfetto.dev)
+"""
+
+import os
+import json
+import time
+import threading
+from typing import Dict, Optional
+
+PHASES = ('dns', 'connect', 'ttfb', 'body', 'parse')
+
+
+class AttemptTiming:
+    """Timestamps collected during one HTTP attempt"""
+
+    __slots__ = ('wall_start', 'start', 'marks', 'reused')
+
+    def __init__(self):
+        self.wall_start = time.time()
+        self.start = time.perf_counter()
+        self.marks: Dict[str, float] = {}
+        self.reused = False
+
+    def mark(self, name: str):
+        self.marks[name] = time.perf_counter()
+
+    def _between(self, start: str, end: str) -> Optional[float]:
+        if start in self.marks and end in self.marks:
+            return (self.marks[end] - self.marks[start]) * 1000
+        return None
+
+    def phases(self) -> Dict:
+        """
+        Phase durations in ms. 'connect' covers TCP plus TLS (neither aiohttp nor
+        urllib3 exposes the handshake separately) and is None on a reused connection;
+        on the requests path DNS and connect are folded into 'ttfb'.
+        """
+        marks = self.marks
+        dns = self._between('dns_start', 'dns_end')
+        connect = self._between('connect_start', 'connect_end')
+        if connect is not None and dns is not None:
+            connect = max(connect - dns, 0.0)
+
+        sent = marks.get('connect_end', marks.get('request_start', self.start))
+        ttfb = (marks['headers'] - sent) * 1000 if 'headers' in marks else None
+        end = max(marks.values()) if marks else self.start
+
+        return {
+            'dns_ms': dns,
+            'connect_ms': connect,
+            'ttfb_ms': ttfb,
+            'body_ms': self._between('headers', 'body_end'),
+            'parse_ms': self._between('body_end', 'parse_end'),
+            'total_ms': (end - self.start) * 1000,
+            'reused': self.reused
+        }
+
+    def spans(self):
+        """(phase, start offset seconds, duration seconds) for each measured phase"""
+        marks = self.marks
+        sent = 'connect_end' if 'connect_end' in marks else 'request_start'
+        bounds = [
+            ('dns', 'dns_start', 'dns_end'),
+            ('connect', 'connect_start', 'connect_end'),
+            ('ttfb', sent, 'headers'),
+            ('body', 'headers', 'body_end'),
+            ('parse', 'body_end', 'parse_end'),
+        ]
+        for phase, start, end in bounds:
+            if start in marks and end in marks:
+                yield phase, marks[start] - self.start, marks[end] - marks[start]
+
+
+def aiohttp_trace_config():
+    """TraceConfig that marks phases on the AttemptTiming passed as trace_request_ctx"""
+    import aiohttp
+
+    def marker(name: str):
+        async def on_event(session, context, params):
+            timing = context.trace_request_ctx
+            if isinstance(timing, AttemptTiming):
+                timing.mark(name)
+                if name == 'reused':
+                    timing.reused = True
+        return on_event
+
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_request_start.append(marker('request_start'))
+    trace_config.on_dns_resolvehost_start.append(marker('dns_start'))
+    trace_config.on_dns_resolvehost_end.append(marker('dns_end'))
+    trace_config.on_connection_create_start.append(marker('connect_start'))
+    trace_config.on_connection_create_end.append(marker('connect_end'))
+    trace_config.on_connection_reuseconn.append(marker('reused'))
+    trace_config.on_request_end.append(marker('headers'))
+    return trace_config
+
+
+class SpanExporter:
+    """
+    Appends attempt spans to a Chrome trace-event file (JSON array format, where
+    the closing bracket is optional, so several processes can append safely)
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+    def export(self, timing: AttemptTiming, name: str, category: str, args: Optional[Dict] = None):
+        """Write one event for the whole attempt plus one per measured phase"""
+        pid = os.getpid()
+        tid = threading.get_ident() % 1_000_000
+        base_us = timing.wall_start * 1_000_000
+        total = timing.phases()['total_ms']
+
+        events = [{
+            'name': name, 'cat': category, 'ph': 'X', 'pid': pid, 'tid': tid,
+            'ts': base_us, 'dur': total * 1000, 'args': args or {}
+        }]
+        for phase, offset, duration in timing.spans():
+            events.append({
+                'name': phase, 'cat': category, 'ph': 'X', 'pid': pid, 'tid': tid,
+                'ts': base_us + offset * 1_000_000, 'dur': duration * 1_000_000
+            })
+
+        lines = ''.join(json.dumps(event) + ',\n' for event in events)
+        try:
+            with self._lock, open(self.path, 'a') as f:
+                if f.tell() == 0:
+                    f.write('[\n')
+                f.write(lines)
+        except OSError as e:
+            print(f"⚠️  Could not export trace spans: {e}")
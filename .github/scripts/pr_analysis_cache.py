@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Incremental PR analysis store
+Per-file analyses are keyed by (path, base blob SHA, head blob SHA) plus a
+fingerprint of the prompt that produced them, so a push that touches one file
+only re-analyzes that file. Combined reviews are stored under a key covering
+every file unit, so a re-run with nothing changed makes no AI calls at all
+"""
+
+import time
+import sqlite3
+import hashlib
+from pathlib import Path
+from typing import Iterable, Optional, Tuple
+
+
+def _digest(*parts: str) -> str:
+    return hashlib.sha256('\0'.join(parts).encode('utf-8', errors='replace')).hexdigest()
+
+
+class PRAnalysisCache:
+    """SQLite store of per-file analyses and combined reviews"""
+
+    def __init__(self, db_path: str, prompt_version: str = '', ttl_days: float = 30):
+        self.db_path = Path(db_path)
+        self.prompt_version = prompt_version  # Changing the prompts invalidates old entries
+        self.ttl_seconds = ttl_days * 86400
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(str(self.db_path), timeout=10.0, isolation_level=None)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS analyses (key TEXT PRIMARY KEY, path TEXT NOT NULL, "
+            "analysis TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS reviews (key TEXT PRIMARY KEY, review TEXT NOT NULL, "
+            "created_at REAL NOT NULL)"
+        )
+        cutoff = time.time() - self.ttl_seconds
+        self.db.execute("DELETE FROM analyses WHERE created_at < ?", (cutoff,))
+        self.db.execute("DELETE FROM reviews WHERE created_at < ?", (cutoff,))
+
+    def _file_key(self, key: Tuple[str, str, str]) -> str:
+        return _digest(self.prompt_version, *key)
+
+    def review_key(self, file_keys: Iterable[Tuple[str, str, str]], context: str) -> str:
+        """Key of a combined review: every file unit plus the PR context (title, description)"""
+        return _digest(self.prompt_version, context, *('\0'.join(key) for key in file_keys))
+
+    def get(self, key: Tuple[str, str, str]) -> Optional[str]:
+        row = self.db.execute("SELECT analysis FROM analyses WHERE key = ?",
+                              (self._file_key(key),)).fetchone()
+        return row[0] if row else None
+
+    def put(self, key: Tuple[str, str, str], analysis: str):
+        self.db.execute("INSERT OR REPLACE INTO analyses VALUES (?, ?, ?, ?)",
+                        (self._file_key(key), key[0], analysis, time.time()))
+
+    def get_review(self, review_key: str) -> Optional[str]:
+        row = self.db.execute("SELECT review FROM reviews WHERE key = ?",
+                              (review_key,)).fetchone()
+        return row[0] if row else None
+
+    def put_review(self, review_key: str, review: str):
+        self.db.execute("INSERT OR REPLACE INTO reviews VALUES (?, ?, ?)",
+                        (review_key, review, time.time()))
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Prompt token budgeting
+A fast local token estimate (no tokenizer download, no per-model vocabulary)
+plus helpers that split oversized input into chunks that fit a token budget
+and group partial results for a reduce step. The estimate leans high on code
+and diffs, so a chunk that fits here fits the provider
+"""
+
+import re
+from typing import List
+
+PROMPT_OVERHEAD_TOKENS = 300  # Message framing, role markers and chunk headers
+MIN_CHUNK_TOKENS = 1000  # Never plan chunks smaller than this
+MAX_CHUNK_TOKENS = 6000  # Keeps map calls fast and under free-tier tokens-per-minute limits
+
+# BPE vocabularies give common words one token, split long identifiers, group
+# digits in threes and give most punctuation/operator characters a token each
+_WORD_RE = re.compile(r"[^\W\d_]+|\d{1,3}")
+_SYMBOL_RE = re.compile(r"[^\w\s]")
+_CHARS_PER_EXTRA_TOKEN = 8  # Letters beyond which a word costs another token
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate token count of text"""
+    if not text:
+        return 0
+    words = _WORD_RE.findall(text)
+    letters = sum(map(len, words))
+    # Rounded up, so the estimate of joined lines never exceeds the sum of theirs
+    return len(words) + -(-letters // _CHARS_PER_EXTRA_TOKEN) + len(_SYMBOL_RE.findall(text))
+
+
+def split_to_budget(text: str, max_tokens: int) -> List[str]:
+    """
+    Split text at line boundaries into chunks of at most max_tokens (estimated).
+    A single line over the budget is cut into pieces by characters
+    """
+    chunks = []
+    current: List[str] = []
+    used = 0
+    for line in text.splitlines(keepends=True):
+        cost = estimate_tokens(line)
+        if used + cost > max_tokens and current:
+            chunks.append(''.join(current))
+            current, used = [], 0
+        if cost > max_tokens:
+            # Characters per token of this line decide where to cut it
+            step = max(1, len(line) * max_tokens // cost)
+            chunks.extend(line[start:start + step] for start in range(0, len(line), step))
+            continue
+        current.append(line)
+        used += cost
+    if current:
+        chunks.append(''.join(current))
+    return chunks
+
+
+def group_to_budget(parts: List[str], max_tokens: int) -> List[List[str]]:
+    """Group consecutive parts so each group's estimated size stays within max_tokens"""
+    groups: List[List[str]] = []
+    used = 0
+    for part in parts:
+        cost = estimate_tokens(part)
+        if not groups or used + cost > max_tokens:
+            groups.append([])
+            used = 0
+        groups[-1].append(part)
+        used += cost
+    return groups
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Prompt normalization and MinHash signatures for near-duplicate detection
+Used by the orchestrator's similarity cache tier and to cluster duplicate issues
+"""
+
+import re
+import hashlib
+from array import array
+from typing import Dict, Iterable, List, Set
+
+NUM_PERM = 64  # Hash functions per signature
+BANDS = 16  # LSH bands (NUM_PERM / BANDS rows each)
+SHINGLE_SIZE = 3  # Tokens per shingle
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 61) - 1
+
+# Hex runs with at least one digit and one letter, so words like "defaced" and plain numbers stay
+_SHA_RE = re.compile(r'\b(?=[0-9a-f]*\d)(?=[0-9a-f]*[a-f])[0-9a-f]{7,40}\b')
+# Positions rather than values: diff hunk headers, "line 12", "lines 3-9", "app.py:40:2"
+_HUNK_HEADER_RE = re.compile(r'@@ -\d+(?:,\d+)? \+\d+(?:,\d+)? @@')
+_LINE_REF_RE = re.compile(r'\b(lines?|ln)\s+\d+(?:\s*(?:-|to)\s*\d+)?')
+_PATH_LINE_RE = re.compile(r'(\.[a-z0-9]+):\d+(?::\d+)?\b')
+_NUMBER_RE = re.compile(r'\d+(?:\.\d+)?')
+_TOKEN_RE = re.compile(r'\w+|[^\w\s]')
+
+
+def _seeded_params(count: int) -> List[tuple]:
+    """Deterministic (a, b) pairs for the universal hash family"""
+    params = []
+    for i in range(count):
+        digest = hashlib.blake2b(f"minhash-{i}".encode(), digest_size=16).digest()
+        a = int.from_bytes(digest[:8], 'little') % _MERSENNE_PRIME or 1
+        b = int.from_bytes(digest[8:], 'little') % _MERSENNE_PRIME
+        params.append((a, b))
+    return params
+
+
+_PERMUTATIONS = _seeded_params(NUM_PERM)
+
+
+def normalize_prompt(text: str) -> str:
+    """
+    Lowercase, mask commit SHAs, diff hunk headers and line positions, collapse
+    whitespace. Other numbers are values (timeouts, sizes, versions) and are kept
+    """
+    text = text.lower()
+    text = _SHA_RE.sub('#', text)
+    text = _HUNK_HEADER_RE.sub('@@ @@', text)
+    text = _LINE_REF_RE.sub(r'\1 #', text)
+    text = _PATH_LINE_RE.sub(r'\1:#', text)
+    return ' '.join(text.split())
+
+
+def literal_fingerprint(text: str) -> str:
+    """
+    Digest of the numeric literals of a prompt (after normalization). Prompts that
+    differ only in a value are near-duplicates as text but need different answers,
+    so similarity lookups are scoped by this
+    """
+    numbers = _NUMBER_RE.findall(normalize_prompt(text))
+    return hashlib.blake2b(' '.join(numbers).encode(), digest_size=6).hexdigest()
+
+
+def shingles(text: str, size: int = SHINGLE_SIZE) -> Set[str]:
+    """Token n-grams of already-normalized text"""
+    tokens = _TOKEN_RE.findall(text)
+    if len(tokens) <= size:
+        return {' '.join(tokens)}
+    return {' '.join(tokens[i:i + size]) for i in range(len(tokens) - size + 1)}
+
+
+def minhash_signature(features: Iterable[str]) -> array:
+    """MinHash signature (NUM_PERM unsigned 64-bit values) of a feature set"""
+    signature = array('Q', [_MAX_HASH] * NUM_PERM)
+    for feature in features:
+        x = int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=8).digest(), 'little')
+        for i, (a, b) in enumerate(_PERMUTATIONS):
+            h = (a * x + b) % _MERSENNE_PRIME
+            if h < signature[i]:
+                signature[i] = h
+    return signature
+
+
+def prompt_signature(text: str) -> array:
+    """Normalize a prompt and return its MinHash signature"""
+    return minhash_signature(shingles(normalize_prompt(text)))
+
+
+def signature_similarity(sig_a: array, sig_b: array) -> float:
+    """Estimated Jaccard similarity of two signatures"""
+    return sum(1 for a, b in zip(sig_a, sig_b) if a == b) / NUM_PERM
+
+
+def lsh_band_keys(signature: array, prefix: str = '') -> List[str]:
+    """Band hashes for locality-sensitive lookup; similar signatures share at least one"""
+    rows = NUM_PERM // BANDS
+    keys = []
+    for band in range(BANDS):
+        chunk = signature[band * rows:(band + 1) * rows].tobytes()
+        keys.append(f"{prefix}{band}:{hashlib.blake2b(chunk, digest_size=8).hexdigest()}")
+    return keys
+
+
+def signature_from_bytes(blob: bytes) -> array:
+    """Inverse of array.tobytes() for stored signatures"""
+    signature = array('Q')
+    signature.frombytes(blob)
+    return signature
+
+
+def cluster_by_similarity(texts: List[str], threshold: float) -> List[List[int]]:
+    """
+    Group near-duplicate texts: pairs sharing an LSH band are compared and joined
+    (transitively) when their estimated similarity reaches threshold.
+    Returns clusters of input indexes, each sorted, in order of their first member
+    """
+    signatures = [prompt_signature(text) for text in texts]
+    parent = list(range(len(texts)))
+
+    def root(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    buckets: Dict[str, List[int]] = {}
+    for i, signature in enumerate(signatures):
+        for key in lsh_band_keys(signature):
+            for j in buckets.setdefault(key, []):
+                if root(i) != root(j) and signature_similarity(signature, signatures[j]) >= threshold:
+                    parent[max(root(i), root(j))] = min(root(i), root(j))
+            buckets[key].append(i)
+
+    clusters: Dict[int, List[int]] = {}
+    for i in range(len(texts)):
+        clusters.setdefault(root(i), []).append(i)
+    return list(clusters.values())
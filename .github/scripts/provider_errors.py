@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Provider error taxonomy and retry policy
+Both engines turn a failed attempt into a ProviderError with one of a few
+error classes, and each class decides whether the same provider is worth
+retrying, whether it should be skipped (and its breaker opened) right away,
+whether a sibling model on the same key is worth trying, and how long to
+wait: the server's Retry-After when it sends one, otherwise decorrelated jitter
+"""
+
+import random
+import asyncio
+from datetime import datetime, timezone
+from typing import Mapping, NamedTuple, Optional
+
+AUTH = 'auth'                # Key missing, revoked or not allowed to use the model
+QUOTA = 'quota'              # Credits or daily quota used up
+RATE_LIMIT = 'rate_limit'    # Too many requests right now
+OVERLOAD = 'overload'        # Provider is shedding load (503/529)
+SERVER = 'server'            # Other 5xx
+BAD_REQUEST = 'bad_request'  # The request itself was rejected (prompt too long, bad model...)
+TIMEOUT = 'timeout'
+NETWORK = 'network'          # Connection refused/reset, DNS, TLS
+UNKNOWN = 'unknown'          # Anything else (e.g. an unparseable 200 response)
+
+BACKOFF_BASE = 0.5  # Seconds; first jittered backoff is drawn from [base, 3 * base]
+BACKOFF_CAP = 8.0  # Longest jittered backoff
+MAX_RETRY_AFTER = 30.0  # A longer Retry-After means moving on is faster than waiting
+
+
+class RetryPolicy(NamedTuple):
+    retry: bool  # Worth another attempt on the same provider
+    permanent: bool  # Provider is unusable for now: open its breaker immediately
+    switch_model: bool  # Model-specific: a sibling model on the same key may still work
+
+
+POLICIES = {
+    # Key- or host-wide problems: no other model on the same key will fare better
+    AUTH: RetryPolicy(retry=False, permanent=True, switch_model=False),
+    QUOTA: RetryPolicy(retry=False, permanent=True, switch_model=False),
+    NETWORK: RetryPolicy(retry=True, permanent=False, switch_model=False),
+    # Rate limits and overload apply to the key: wait for Retry-After (or back off)
+    # rather than spending the same key's limit on a sibling model
+    RATE_LIMIT: RetryPolicy(retry=True, permanent=False, switch_model=False),
+    OVERLOAD: RetryPolicy(retry=True, permanent=False, switch_model=False),
+    SERVER: RetryPolicy(retry=True, permanent=False, switch_model=False),
+    UNKNOWN: RetryPolicy(retry=True, permanent=False, switch_model=False),
+    # Model-specific: deprecated or unknown model, context too small
+    BAD_REQUEST: RetryPolicy(retry=False, permanent=False, switch_model=True),
+    # A second full timeout on the same model rarely pays off
+    TIMEOUT: RetryPolicy(retry=False, permanent=False, switch_model=True),
+}
+
+# 429 bodies that mean the quota is gone rather than a short-term limit
+_QUOTA_MARKERS = ('quota', 'insufficient', 'billing', 'credit', 'exhausted', 'per day')
+# 400 bodies that mean the requested model no longer exists
+_MODEL_GONE_MARKERS = ('decommission', 'deprecated', 'model_not_found', 'does not exist',
+                       'no such model', 'unknown model')
+
+
+def classify_status(status: int, body: str = '') -> str:
+    """Map an HTTP status (and error body) to an error class"""
+    lowered = body.lower()
+    if status in (401, 403):
+        return AUTH
+    if status == 402:
+        return QUOTA
+    if status == 429:
+        return QUOTA if any(marker in lowered for marker in _QUOTA_MARKERS) else RATE_LIMIT
+    if status == 408:
+        return TIMEOUT
+    if status in (503, 529):
+        return OVERLOAD
+    if status >= 500:
+        return SERVER
+    if status >= 400:
+        return BAD_REQUEST
+    return UNKNOWN
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP-date)"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    from email.utils import parsedate_to_datetime  # Rare path; keeps CLI startup lean
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+class ProviderError(Exception):
+    """A classified provider failure"""
+
+    def __init__(self, error_class: str, message: str, status: Optional[int] = None,
+                 retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.error_class = error_class
+        self.status = status
+        self.retry_after = retry_after
+
+    @property
+    def policy(self) -> RetryPolicy:
+        return POLICIES[self.error_class]
+
+    @property
+    def model_unavailable(self) -> bool:
+        """The model itself is gone (unknown, deprecated or decommissioned)"""
+        if self.error_class != BAD_REQUEST:
+            return False
+        message = str(self).lower()
+        return self.status == 404 or any(marker in message for marker in _MODEL_GONE_MARKERS)
+
+    @classmethod
+    def from_response(cls, status: int, headers: Mapping, body: str) -> 'ProviderError':
+        """Error for a non-2xx response"""
+        return cls(classify_status(status, body), f"HTTP {status}: {body[:200]}", status,
+                   parse_retry_after(headers.get('Retry-After')))
+
+    @classmethod
+    def from_exception(cls, error: BaseException) -> 'ProviderError':
+        """Classify an exception raised by aiohttp, requests or the response parsing"""
+        if isinstance(error, cls):
+            return error
+        status = getattr(error, 'status', None)
+        if isinstance(status, int):  # aiohttp.ClientResponseError
+            headers = getattr(error, 'headers', None) or {}
+            return cls(classify_status(status), f"HTTP {status}: {error}", status,
+                       parse_retry_after(headers.get('Retry-After')))
+        # Match by class name so neither HTTP client has to be importable here
+        names = {klass.__name__ for klass in type(error).__mro__}
+        if isinstance(error, asyncio.TimeoutError) or names & {'Timeout', 'TimeoutError'}:
+            return cls(TIMEOUT, str(error) or "Request timeout")
+        if isinstance(error, OSError) or names & {'ClientConnectionError', 'ConnectionError'}:
+            return cls(NETWORK, str(error) or type(error).__name__)
+        return cls(UNKNOWN, str(error) or type(error).__name__)
+
+
+def decorrelated_jitter(previous: float, base: float = BACKOFF_BASE,
+                        cap: float = BACKOFF_CAP) -> float:
+    """Next backoff: uniform in [base, 3 * previous], capped (previous=0 for the first)"""
+    return min(cap, random.uniform(base, max(base, previous) * 3))
+
+
+def retry_delay(error: ProviderError, previous: float = 0.0) -> Optional[float]:
+    """
+    Seconds to wait before retrying the same provider, or None when it should
+    be skipped (class not retryable, or Retry-After too long to be worth it)
+    """
+    if not error.policy.retry:
+        return None
+    if error.retry_after is not None:
+        return error.retry_after if error.retry_after <= MAX_RETRY_AFTER else None
+    return decorrelated_jitter(previous)
@@ -0,0 +1,415 @@
+#!/usr/bin/env python3
+"""
+Single provider registry shared by AIAPIFallback and UniversalAIOrchestrator
+Providers are declared once below. Request templates (URL, static headers and
+a pre-serialized JSON payload skeleton) are compiled once per provider, model
+and mode into small __slots__ objects, so each attempt only encodes the prompt
+fields instead of rebuilding headers and payload dicts
+"""
+
+import re
+import json
+from typing import Dict
+
+# Extra headers OpenRouter uses for attribution
+OPENROUTER_HEADERS = {
+    'HTTP-Referer': 'https://github.com/over7-maker/test_endeelo',
+    'X-Title': 'AMAS Ultimate Zero-Failure System'
+}
+
+# All providers in AIAPIFallback priority order
+PROVIDERS = [
+    # Tier 1: Primary GROQ APIs (3 keys for maximum redundancy)
+    {
+        'name': 'GROQ-1',
+        'key_env': 'GROQAI_API_KEY',
+        'base_url': 'https://api.groq.com/openai/v1',
+        'models': ['llama-3.3-70b-versatile', 'llama-3.1-70b-versatile', 'mixtral-8x7b-32768'],
+        'priority': 1,
+        'rate_limit': 14400,
+        'timeout': 30,
+        'type': 'openai'
+    },
+    {
+        'name': 'GROQ-2',
+        'key_env': 'GROQ1KEY',
+        'base_url': 'https://api.groq.com/openai/v1',
+        'models': ['llama-3.3-70b-versatile', 'gemma2-9b-it'],
+        'priority': 2,
+        'rate_limit': 14400,
+        'timeout': 30,
+        'type': 'openai'
+    },
+    {
+        'name': 'GROQ-3',
+        'key_env': 'GROQ2KEY',
+        'base_url': 'https://api.groq.com/openai/v1',
+        'models': ['llama-3.3-70b-versatile', 'llama-3.1-8b-instant'],
+        'priority': 3,
+        'rate_limit': 14400,
+        'timeout': 30,
+        'type': 'openai'
+    },
+    
+    # Tier 2: DeepSeek (high performance)
+    {
+        'name': 'DEEPSEEK',
+        'key_env': 'DEEPSEEK_API_KEY',
+        'base_url': 'https://openrouter.ai/api/v1',
+        'models': ['deepseek/deepseek-chat-v3.1:free'],
+        'priority': 4,
+        'rate_limit': 10000,
+        'timeout': 45,
+        'type': 'openrouter'
+    },
+    
+    # Tier 3: Gemini APIs (2 keys for redundancy)
+    {
+        'name': 'GEMINI-1',
+        'key_env': 'GEMINIAI_API_KEY',
+        'base_url': 'https://generativelanguage.googleapis.com/v1beta',
+        'models': ['gemini-2.0-flash', 'gemini-1.5-flash'],
+        'priority': 5,
+        'rate_limit': 15000,
+        'timeout': 30,
+        'type': 'google'
+    },
+    {
+        'name': 'GEMINI-2',
+        'key_env': 'GEMINI2_API_KEY',
+        'base_url': 'https://generativelanguage.googleapis.com/v1beta',
+        'models': ['gemini-2.0-flash', 'gemini-1.5-pro'],
+        'priority': 6,
+        'rate_limit': 15000,
+        'timeout': 30,
+        'type': 'google'
+    },
+    
+    # Tier 4: NVIDIA APIs (2 keys for redundancy)
+    {
+        'name': 'NVIDIA-1',
+        'key_env': 'NVIDIA_API_KEY',
+        'base_url': 'https://integrate.api.nvidia.com/v1',
+        'models': ['deepseek-ai/deepseek-r1', 'qwen/qwen2.5-coder-32b-instruct'],
+        'priority': 7,
+        'rate_limit': 10000,
+        'timeout': 60,
+        'type': 'openai'
+    },
+    {
+        'name': 'NVIDIA-2',
+        'key_env': 'NIVIIDIAKEY',
+        'base_url': 'https://integrate.api.nvidia.com/v1',
+        'models': ['deepseek-ai/deepseek-r1'],
+        'priority': 8,
+        'rate_limit': 10000,
+        'timeout': 60,
+        'type': 'openai'
+    },
+    
+    # Tier 5: Cerebras APIs (2 keys for redundancy)
+    {
+        'name': 'CEREBRAS-1',
+        'key_env': 'CEREBRAS_API_KEY',
+        'base_url': 'https://api.cerebras.ai/v1',
+        'models': ['qwen-3-235b-a22b-instruct-2507', 'llama3.3-70b'],
+        'priority': 9,
+        'rate_limit': 8000,
+        'timeout': 45,
+        'type': 'openai'
+    },
+    {
+        'name': 'CEREBRAS-2',
+        'key_env': 'CEREBRASKEY',
+        'base_url': 'https://api.cerebras.ai/v1',
+        'models': ['qwen-3-235b-a22b-instruct-2507'],
+        'priority': 10,
+        'rate_limit': 8000,
+        'timeout': 45,
+        'type': 'openai'
+    },
+    
+    # Tier 6: Specialized APIs
+    {
+        'name': 'CODESTRAL',
+        'key_env': 'CODESTRAL_API_KEY',
+        'base_url': 'https://codestral.mistral.ai/v1',
+        'models': ['codestral-latest'],
+        'priority': 11,
+        'rate_limit': 5000,
+        'timeout': 40,
+        'type': 'openai'
+    },
+    {
+        'name': 'COHERE',
+        'key_env': 'COHERE_API_KEY',
+        'base_url': 'https://api.cohere.com/v2',
+        'models': ['command-a-03-2025'],
+        'priority': 12,
+        'rate_limit': 10000,
+        'timeout': 35,
+        'type': 'cohere'
+    },
+    {
+        'name': 'CHUTES',
+        'key_env': 'CHUTES_API_KEY',
+        'base_url': 'https://llm.chutes.ai/v1',
+        'models': ['zai-org/GLM-4.5-Air'],
+        'priority': 13,
+        'rate_limit': 5000,
+        'timeout': 40,
+        'type': 'openai'
+    },
+    
+    # Tier 7: OpenRouter Free APIs
+    {
+        'name': 'KIMI',
+        'key_env': 'KIMI_API_KEY',
+        'base_url': 'https://openrouter.ai/api/v1',
+        'models': ['moonshotai/kimi-k2:free'],
+        'priority': 14,
+        'rate_limit': 3000,
+        'timeout': 50,
+        'type': 'openrouter'
+    },
+    {
+        'name': 'QWEN',
+        'key_env': 'QWEN_API_KEY',
+        'base_url': 'https://openrouter.ai/api/v1',
+        'models': ['qwen/qwen3-coder:free'],
+        'priority': 15,
+        'rate_limit': 3000,
+        'timeout': 45,
+        'type': 'openrouter'
+    },
+    {
+        'name': 'GPT-OSS',
+        'key_env': 'GPTOSS_API_KEY',
+        'base_url': 'https://openrouter.ai/api/v1',
+        'models': ['openai/gpt-oss-120b:free'],
+        'priority': 16,
+        'rate_limit': 2000,
+        'timeout': 55,
+        'type': 'openrouter'
+    },
+    {
+        'name': 'GROK',
+        'key_env': 'GROK_API_KEY',
+        'base_url': 'https://openrouter.ai/api/v1',
+        'models': ['x-ai/grok-4-fast:free'],
+        'priority': 17,
+        'rate_limit': 2000,
+        'timeout': 50,
+        'type': 'openrouter'
+    },
+    {
+        'name': 'GLM',
+        'key_env': 'GLM_API_KEY',
+        'base_url': 'https://openrouter.ai/api/v1',
+        'models': ['z-ai/glm-4.5-air:free'],
+        'priority': 18,
+        'rate_limit': 2000,
+        'timeout': 45,
+        'type': 'openrouter'
+    },
+    
+    # Tier 8: Additional Z.AI and Alibaba
+    {
+        'name': 'Z-AI',
+        'key_env': 'ZAIKEY',
+        'base_url': 'https://api.z.ai/api/paas/v4',
+        'models': ['glm-5'],
+        'priority': 19,
+        'rate_limit': 5000,
+        'timeout': 40,
+        'type': 'openai'
+    },
+    {
+        'name': 'ALIBABA',
+        'key_env': 'ALIBABAKEY',
+        'base_url': 'https://dashscope-intl.aliyuncs.com/compatible-mode/v1',
+        'models': ['qwen-plus', 'qwen-turbo'],
+        'priority': 20,
+        'rate_limit': 10000,
+        'timeout': 45,
+        'type': 'openai'
+    },
+    
+    # Tier 9: Additional GROQ backup (from GROQ2_API_KEY)
+    {
+        'name': 'GROQ-BACKUP',
+        'key_env': 'GROQ2_API_KEY',
+        'base_url': 'https://api.groq.com/openai/v1',
+        'models': ['llama-3.1-8b-instant', 'gemma-7b-it'],
+        'priority': 21,
+        'rate_limit': 14400,
+        'timeout': 25,
+        'type': 'openai'
+    }
+]
+
+# Provider names (in order) used by UniversalAIOrchestrator's fallback chain
+ORCHESTRATOR_CHAIN = (
+    # Tier 1: High reliability free providers
+    'GROQ-1', 'DEEPSEEK', 'CEREBRAS-1',
+    # Tier 2: Premium providers
+    'NVIDIA-1', 'CODESTRAL', 'GEMINI-2',
+    # Tier 3: Backup providers
+    'GLM', 'GROK', 'KIMI', 'QWEN', 'GPT-OSS', 'CHUTES', 'COHERE', 'GROQ-BACKUP', 'GEMINI-1',
+)
+
+PROVIDERS_BY_NAME = {provider['name']: provider for provider in PROVIDERS}
+
+# Context window (prompt + completion tokens) per model, as served on these endpoints
+# (free tiers are sometimes smaller than the model's native window)
+CONTEXT_WINDOWS = {
+    'llama-3.3-70b-versatile': 131072,
+    'llama-3.1-70b-versatile': 131072,
+    'llama-3.1-8b-instant': 131072,
+    'mixtral-8x7b-32768': 32768,
+    'gemma2-9b-it': 8192,
+    'gemma-7b-it': 8192,
+    'deepseek/deepseek-chat-v3.1:free': 163840,
+    'gemini-2.0-flash': 1048576,
+    'gemini-1.5-flash': 1048576,
+    'gemini-1.5-pro': 2097152,
+    'deepseek-ai/deepseek-r1': 128000,
+    'qwen/qwen2.5-coder-32b-instruct': 32768,
+    'qwen-3-235b-a22b-instruct-2507': 65536,
+    'llama3.3-70b': 65536,
+    'codestral-latest': 256000,
+    'command-a-03-2025': 256000,
+    'zai-org/GLM-4.5-Air': 131072,
+    'moonshotai/kimi-k2:free': 32768,
+    'qwen/qwen3-coder:free': 262144,
+    'openai/gpt-oss-120b:free': 131072,
+    'x-ai/grok-4-fast:free': 2000000,
+    'z-ai/glm-4.5-air:free': 131072,
+    'glm-5': 128000,
+    'qwen-plus': 131072,
+    'qwen-turbo': 1000000,
+}
+DEFAULT_CONTEXT_WINDOW = 8192  # Assumed for models missing from the table
+
+
+def context_window(model: str) -> int:
+    """Context window of a model in tokens (conservative default when unknown)"""
+    return CONTEXT_WINDOWS.get(model, DEFAULT_CONTEXT_WINDOW)
+
+# Payload placeholders, replaced by JSON-encoded values when a request is built
+_FILL_RE = re.compile(r'"__fill_(\w+)__"')
+_FILL_FIELDS = ('system', 'prompt', 'joined', 'max_tokens', 'temperature')
+_dumps = json.dumps
+
+
+def _fill(field: str) -> str:
+    return f"__fill_{field}__"
+
+
+class RequestTemplate:
+    """Pre-built URL, headers and payload skeleton for one provider/model/mode"""
+
+    __slots__ = ('url', 'headers', 'model', '_literals', '_fields', '_joined')
+
+    def __init__(self, url: str, headers: Dict[str, str], model: str, payload: Dict):
+        self.url = url
+        self.headers = headers  # Shared between requests: never mutate
+        self.model = model
+        parts = _FILL_RE.split(_dumps(payload, separators=(',', ':')))
+        self._literals = tuple(part.encode() for part in parts[0::2])
+        self._fields = tuple(_FILL_FIELDS.index(field) for field in parts[1::2])
+        self._joined = 2 in self._fields
+
+    def body(self, system_prompt: str, prompt: str, max_tokens: int, temperature: float) -> bytes:
+        """Serialized JSON payload with the prompt fields filled in"""
+        joined = f"{system_prompt}\n\n{prompt}" if self._joined else None
+        values = (system_prompt, prompt, joined, max_tokens, temperature)
+        literals = self._literals
+        out = [literals[0]]
+        for i, field in enumerate(self._fields, 1):
+            out.append(_dumps(values[field]).encode())
+            out.append(literals[i])
+        return b''.join(out)
+
+
+def compile_template(api_type: str, base_url: str, api_key: str, model: str,
+                     stream: bool = False) -> RequestTemplate:
+    """Build the request template for one provider type, endpoint, key and model"""
+    if api_type == 'google':
+        method = 'streamGenerateContent?alt=sse' if stream else 'generateContent'
+        url = f"{base_url}/models/{model}:{method}"
+        headers = {
+            'Content-Type': 'application/json',
+            'x-goog-api-key': api_key
+        }
+        payload = {
+            'contents': [{'parts': [{'text': _fill('joined')}]}],
+            'generationConfig': {
+                'maxOutputTokens': _fill('max_tokens'),
+                'temperature': _fill('temperature')
+            }
+        }
+    else:
+        # OpenAI-compatible chat completions and Cohere v2 chat share the message format
+        url = f"{base_url}/chat" if api_type == 'cohere' else f"{base_url}/chat/completions"
+        headers = {
+            'Authorization': f'Bearer {api_key}',
+            'Content-Type': 'application/json'
+        }
+        if api_type == 'openrouter':
+            headers.update(OPENROUTER_HEADERS)
+        payload = {
+            'model': model,
+            'messages': [
+                {'role': 'system', 'content': _fill('system')},
+                {'role': 'user', 'content': _fill('prompt')}
+            ],
+            'max_tokens': _fill('max_tokens'),
+            'temperature': _fill('temperature')
+        }
+        if stream:
+            payload['stream'] = True
+
+    if stream:
+        headers['Accept'] = 'text/event-stream'
+    return RequestTemplate(url, headers, model, payload)
+
+
+def extract_text(api_type: str, result: Dict) -> str:
+    """Completion text from a provider reply"""
+    if api_type == 'google':
+        return result['candidates'][0]['content']['parts'][0]['text']
+    if api_type == 'cohere':
+        # Cohere v2 API response handling
+        if 'message' in result:
+            content = result['message']['content']
+            if isinstance(content, list):
+                return content[0]['text']
+            return content
+        return result.get('text', str(result))
+    return result['choices'][0]['message']['content']
+
+
+def extract_usage(api_type: str, result: Dict) -> Dict:
+    """Input/output token counts from a provider reply (or stream event), if reported"""
+    if api_type == 'google':
+        meta = result.get('usageMetadata') or {}
+        input_tokens = meta.get('promptTokenCount')
+        output_tokens = meta.get('candidatesTokenCount')
+    elif api_type == 'cohere':
+        # v2 replies carry usage at the top level, v2 stream events under delta
+        usage = result.get('usage') or (result.get('delta') or {}).get('usage') or {}
+        tokens = usage.get('tokens') or usage.get('billed_units') or {}
+        input_tokens = tokens.get('input_tokens')
+        output_tokens = tokens.get('output_tokens')
+    else:
+        usage = result.get('usage') or {}
+        input_tokens = usage.get('prompt_tokens')
+        output_tokens = usage.get('completion_tokens')
+
+    extracted = {}
+    if input_tokens is not None:
+        extracted['input_tokens'] = int(input_tokens)
+    if output_tokens is not None:
+        extracted['output_tokens'] = int(output_tokens)
+    return extracted
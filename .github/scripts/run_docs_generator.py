@@ -1,12 +1,12 @@
 #!/usr/bin/env python3
 import os, sys
-sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
-from scripts.ai_api_fallback import AIAPIFallback
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from ai_api_fallback import AIAPIFallback
 
 def generate_docs(codebase_info: str) -> str:
-    fallback = AIAPIFallback()
-    prompt = f"Generate documentation for: {codebase_info[:2000]}"
-    result = fallback.generate_response(prompt, max_tokens=1000)
+    with AIAPIFallback() as fallback:
+        result = fallback.call_map_reduce(codebase_info, "Generate documentation for:",
+                                          max_tokens=1000)
     return result.get('response', '') if result.get('success') else ''
 
 def main():
@@ -3,64 +3,231 @@ import os
 import sys
 import json
 import requests
-from typing import Dict, Any, Optional
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional
 
-# Import from the ai_api_fallback system
-sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
-from scripts.ai_api_fallback import AIAPIFallback
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from ai_api_fallback import AIAPIFallback
+from prompt_similarity import cluster_by_similarity
 
-def analyze_issue(issue_data: Dict[str, Any]) -> Optional[str]:
-    """Analyze GitHub issue and generate AI response."""
-    fallback = AIAPIFallback()
-    
-    prompt = f"""
-Analyze this GitHub issue and provide helpful response:
+# GitHub Actions sets GITHUB_API_URL; pointing it at a local server allows dry runs
+API_URL = os.getenv('GITHUB_API_URL', 'https://api.github.com').rstrip('/')
 
-Title: {issue_data.get('title', 'N/A')}
-Body: {issue_data.get('body', 'N/A')}
-Labels: {', '.join([label['name'] for label in issue_data.get('labels', [])])}
+# Batch triage (ISSUE_BATCH=1): every open issue, one AI call per cluster of near-duplicates
+SIMILARITY_THRESHOLD = float(os.getenv('ISSUE_SIMILARITY_THRESHOLD', '0.5'))
+BATCH_LIMIT = int(os.getenv('ISSUE_BATCH_LIMIT', '500'))
+POST_CONCURRENCY = int(os.getenv('ISSUE_POST_CONCURRENCY', '8'))
+RESPONDED_LABEL = 'ai-responded'
+SIMILARITY_CHARS = 2000  # Leading part of the body used to compare issues
+MAX_RELATED = 20  # Related issues named in a prompt or comment
+
+ISSUE_PROMPT = """
+Analyze this GitHub issue and provide helpful response:
 
+Title: {title}
+Body: {body}
+Labels: {labels}
+{related}
 Provide:
 1. Issue classification
 2. Recommended actions
 3. Helpful response for the user
 """
-    
-    result = fallback.generate_response(prompt, max_tokens=500)
+
+def issue_prompt(issue_data: Dict[str, Any], related: str = '') -> str:
+    """Prompt for one issue (related: other reports of the same problem)."""
+    return ISSUE_PROMPT.format(
+        title=issue_data.get('title', 'N/A'),
+        body=issue_data.get('body') or 'N/A',
+        labels=', '.join([label['name'] for label in issue_data.get('labels', [])]),
+        related=related
+    )
+
+def analyze_issue(issue_data: Dict[str, Any]) -> Optional[str]:
+    """Analyze GitHub issue and generate AI response."""
+    with AIAPIFallback() as fallback:
+        result = fallback.call_with_fallback(issue_prompt(issue_data), max_tokens=500)
     return result.get('response') if result.get('success') else None
 
-def post_comment(issue_number: int, comment: str, repo: str, token: str) -> bool:
-    """Post comment to GitHub issue."""
-    url = f"https://api.github.com/repos/{repo}/issues/{issue_number}/comments"
-    headers = {
+def github_session(token: str) -> requests.Session:
+    """Keep-alive session shared by every GitHub request of a run."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_maxsize=max(POST_CONCURRENCY, 1))
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers.update({
         "Authorization": f"token {token}",
         "Accept": "application/vnd.github.v3+json"
-    }
-    
-    response = requests.post(url, headers=headers, json={"body": comment})
+    })
+    return session
+
+def post_comment(issue_number: int, comment: str, repo: str, token: str,
+                 session: Optional[requests.Session] = None) -> bool:
+    """Post comment to GitHub issue."""
+    url = f"{API_URL}/repos/{repo}/issues/{issue_number}/comments"
+    if session is None:
+        session = github_session(token)
+
+    response = session.post(url, json={"body": comment}, timeout=30)
     return response.status_code == 201
 
+def add_label(issue_number: int, label: str, repo: str, session: requests.Session) -> bool:
+    """Add a label to a GitHub issue."""
+    url = f"{API_URL}/repos/{repo}/issues/{issue_number}/labels"
+    response = session.post(url, json={"labels": [label]}, timeout=30)
+    return response.status_code == 200
+
+def respond(issue_number: int, comment: str, repo: str, token: str,
+            session: requests.Session) -> Dict[str, bool]:
+    """Comment on an issue, then mark it answered so later batch runs skip it."""
+    commented = post_comment(issue_number, comment, repo, token, session)
+    labelled = commented and add_label(issue_number, RESPONDED_LABEL, repo, session)
+    return {'comment': commented, 'label': labelled}
+
+def fetch_open_issues(session: requests.Session, repo: str, limit: int) -> List[Dict[str, Any]]:
+    """Page through open issues (pull requests and already answered issues excluded)."""
+    issues = []
+    url = f"{API_URL}/repos/{repo}/issues"
+    params = {"state": "open", "per_page": 100, "sort": "created", "direction": "asc"}
+
+    while url and len(issues) < limit:
+        response = session.get(url, params=params, timeout=30)
+        if response.status_code != 200:
+            print(f"Failed to list issues: {response.status_code}")
+            break
+        for issue in response.json():
+            labels = {label['name'] for label in issue.get('labels', [])}
+            if 'pull_request' not in issue and RESPONDED_LABEL not in labels:
+                issues.append(issue)
+        # The next link already carries the query parameters
+        url = response.links.get('next', {}).get('url')
+        params = None
+
+    return issues[:limit]
+
+def cluster_issues(issues: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+    """Group near-duplicate issues by title and leading body text."""
+    texts = [f"{issue.get('title', '')}\n{(issue.get('body') or '')[:SIMILARITY_CHARS]}"
+             for issue in issues]
+    return [[issues[i] for i in cluster]
+            for cluster in cluster_by_similarity(texts, SIMILARITY_THRESHOLD)]
+
+def cluster_prompt(cluster: List[Dict[str, Any]]) -> str:
+    """Prompt for a cluster: its oldest issue in full, the others by title."""
+    lead, others = cluster[0], cluster[1:]
+    related = ''
+    if others:
+        related = "\nThe same problem was also reported as:\n" + "\n".join(
+            f"- #{issue['number']}: {issue.get('title', '')}" for issue in others[:MAX_RELATED]
+        )
+        if len(others) > MAX_RELATED:
+            related += f"\n- and {len(others) - MAX_RELATED} more similar reports"
+        related += "\nWrite the response so it applies to all of these reports.\n"
+    return issue_prompt(lead, related)
+
+def adapt_response(response: str, issue: Dict[str, Any], cluster: List[Dict[str, Any]]) -> str:
+    """Per-issue comment: the cluster response plus links to the related reports."""
+    related = [other['number'] for other in cluster if other['number'] != issue['number']]
+    if not related:
+        return response
+    links = ', '.join(f"#{number}" for number in related[:MAX_RELATED])
+    if len(related) > MAX_RELATED:
+        links += f" and {len(related) - MAX_RELATED} more"
+    return f"This looks related to {links}; the analysis below covers all of them.\n\n{response}"
+
+def triage_backlog(repo: str, token: str, dry_run: bool = False) -> Dict[str, Any]:
+    """Respond to every open issue with one AI call per cluster of near-duplicates."""
+    session = github_session(token)
+    issues = fetch_open_issues(session, repo, BATCH_LIMIT)
+    clusters = cluster_issues(issues)
+    print(f"🧩 {len(issues)} open issues in {len(clusters)} clusters")
+
+    with AIAPIFallback() as fallback:
+        results = fallback.call_batch([cluster_prompt(cluster) for cluster in clusters],
+                                      max_tokens=500)
+
+    report = []
+    posts = []
+    for cluster, result in zip(clusters, results):
+        entry = {
+            'issues': [issue['number'] for issue in cluster],
+            'titles': [issue.get('title', '') for issue in cluster],
+            'success': bool(result.get('success')),
+            'api_used': result.get('api_used'),
+            'response': result.get('response'),
+            'posted': {}
+        }
+        report.append(entry)
+        if result.get('success') and result.get('response'):
+            for issue in cluster:
+                posts.append((entry, issue['number'],
+                              adapt_response(result['response'], issue, cluster)))
+
+    if not dry_run and posts:
+        with ThreadPoolExecutor(max_workers=max(POST_CONCURRENCY, 1)) as pool:
+            outcomes = pool.map(lambda post: respond(post[1], post[2], repo, token, session),
+                                posts)
+            for (entry, number, _), outcome in zip(posts, outcomes):
+                entry['posted'][number] = outcome
+    session.close()
+
+    for entry in report:
+        members = ', '.join(f"#{number}" for number in entry['issues'])
+        status = "✅" if entry['success'] else "❌"
+        posted = sum(outcome['comment'] for outcome in entry['posted'].values())
+        labelled = sum(outcome['label'] for outcome in entry['posted'].values())
+        print(f"{status} [{members}] {entry['titles'][0][:60]} "
+              f"({posted}/{len(entry['issues'])} comments posted, {labelled} labelled)")
+
+    return {
+        'issues': len(issues),
+        'clusters': len(clusters),
+        'ai_calls': len(clusters),
+        'comments_posted': sum(outcome['comment'] for entry in report
+                               for outcome in entry['posted'].values()),
+        'issues_labelled': sum(outcome['label'] for entry in report
+                               for outcome in entry['posted'].values()),
+        'dry_run': dry_run,
+        'report': report
+    }
+
 def main():
     # Get environment variables
     issue_number = os.getenv('ISSUE_NUMBER')
     repo = os.getenv('GITHUB_REPOSITORY')
     token = os.getenv('GITHUB_TOKEN')
-    
+
+    if os.getenv('ISSUE_BATCH', '').lower() in ('1', 'true', 'yes'):
+        if not all([repo, token]):
+            print("Missing required environment variables")
+            sys.exit(1)
+        summary = triage_backlog(repo, token,
+                                 dry_run=os.getenv('ISSUE_DRY_RUN', '').lower() in ('1', 'true', 'yes'))
+        report_path = os.getenv('ISSUE_TRIAGE_REPORT')
+        if report_path:
+            with open(report_path, 'w') as f:
+                json.dump(summary, f, indent=2)
+        print(f"📊 {summary['issues']} issues, {summary['ai_calls']} AI calls, "
+              f"{summary['comments_posted']} comments posted, "
+              f"{summary['issues_labelled']} issues labelled")
+        return
+
     if not all([issue_number, repo, token]):
         print("Missing required environment variables")
         sys.exit(1)
-    
+
     # Get issue data
-    url = f"https://api.github.com/repos/{repo}/issues/{issue_number}"
+    url = f"{API_URL}/repos/{repo}/issues/{issue_number}"
     headers = {"Authorization": f"token {token}"}
     response = requests.get(url, headers=headers)
-    
+
     if response.status_code != 200:
         print(f"Failed to fetch issue: {response.status_code}")
         sys.exit(1)
-    
+
     issue_data = response.json()
-    
+
     # Analyze and respond
     ai_response = analyze_issue(issue_data)
     if ai_response:
@@ -1,29 +1,121 @@
 #!/usr/bin/env python3
 import os
 import sys
+import asyncio
+import hashlib
 import requests
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
 
-sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
-from scripts.ai_api_fallback import AIAPIFallback
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from ai_api_fallback import AIAPIFallback
+from diff_parser import FileDiff, NoiseFilter, PackedDiff, iter_lines, pack_diff
+from pr_analysis_cache import PRAnalysisCache
+from prompt_budget import estimate_tokens
 
-def get_pr_diff(pr_number: int, repo: str, token: str) -> Optional[str]:
+# Incremental mode: per-file analyses cached by blob SHA ("off" analyzes the whole diff each time)
+DEFAULT_CACHE_PATH = ".github/data/cache/pr_analysis.db"
+FILE_MAX_TOKENS = 400
+FILE_INSTRUCTION = """Review the changes to {path} in this Pull Request.
+List concrete code quality issues, bugs, security risks and recommendations for this file only.
+Be concise; say "No issues" if there are none."""
+COMBINE_INSTRUCTION = """Write the review of this Pull Request from the per-file reviews below:
+Title: {title}
+Description: {body}
+Files Changed: {files}
+Give an overall code quality assessment, then the important findings grouped by file, then recommendations."""
+PROMPT_VERSION = hashlib.sha256((FILE_INSTRUCTION + COMBINE_INSTRUCTION).encode()).hexdigest()[:16]
+# Estimated tokens of diff hunks kept for review; lower-value hunks beyond it are left out
+DIFF_TOKEN_BUDGET = int(os.getenv('PR_DIFF_TOKEN_BUDGET', '60000'))
+
+def get_pr_diff(pr_number: int, repo: str, token: str) -> Optional[PackedDiff]:
+    """Stream the PR diff, dropping noise files and keeping the hunks that fit the budget"""
     url = f"https://api.github.com/repos/{repo}/pulls/{pr_number}"
     headers = {"Authorization": f"token {token}", "Accept": "application/vnd.github.v3.diff"}
-    response = requests.get(url, headers=headers)
-    return response.text if response.status_code == 200 else None
+    with requests.get(url, headers=headers, stream=True, timeout=120) as response:
+        if response.status_code != 200:
+            return None
+        return pack_diff(iter_lines(response.iter_content(chunk_size=64 * 1024)),
+                         DIFF_TOKEN_BUDGET, NoiseFilter.from_env())
 
 def analyze_pr(pr_data: Dict[str, Any], diff: str) -> Optional[Dict[str, Any]]:
-    fallback = AIAPIFallback()
-    prompt = f"""Analyze this Pull Request:
+    instruction = f"""Analyze this Pull Request:
 Title: {pr_data.get('title', 'N/A')}
 Description: {pr_data.get('body', 'N/A')}
 Files Changed: {pr_data.get('changed_files', 0)}
-Diff: {diff[:2000]}
-Provide code quality assessment and recommendations."""
-    result = fallback.generate_response(prompt, max_tokens=800)
+Provide code quality assessment and recommendations for the diff below."""
+    # Large diffs are split and reviewed in parallel instead of being truncated
+    with AIAPIFallback() as fallback:
+        result = fallback.call_map_reduce(diff, instruction, max_tokens=800)
     return result if result.get('success') else None
 
+def open_analysis_cache() -> Optional[PRAnalysisCache]:
+    path = os.getenv('PR_ANALYSIS_CACHE', DEFAULT_CACHE_PATH)
+    if path.lower() in ('', 'off', '0', 'false'):
+        return None
+    try:
+        return PRAnalysisCache(path, PROMPT_VERSION)
+    except Exception as e:
+        print(f"⚠️  PR analysis cache unavailable ({e}), analyzing the whole diff")
+        return None
+
+async def analyze_files(fallback: AIAPIFallback, files: List[FileDiff]) -> List[Optional[str]]:
+    """Analyze files in parallel: small ones as one batch spread over the keys, large ones map-reduced"""
+    budget = fallback.input_budget(FILE_MAX_TOKENS)
+    small = [i for i, f in enumerate(files) if estimate_tokens(f.text) < budget // 2]
+    large = sorted(set(range(len(files))) - set(small))
+    batch = fallback.acall_batch(
+        [f"{FILE_INSTRUCTION.format(path=files[i].path)}\n\n{files[i].text}" for i in small],
+        max_tokens=FILE_MAX_TOKENS
+    )
+    reduced = [fallback.acall_map_reduce(files[i].text, FILE_INSTRUCTION.format(path=files[i].path),
+                                         max_tokens=FILE_MAX_TOKENS) for i in large]
+    batch_results, *reduced_results = await asyncio.gather(batch, *reduced)
+    analyses: List[Optional[str]] = [None] * len(files)
+    for i, result in zip(small + large, batch_results + reduced_results):
+        analyses[i] = result['response'] if result['success'] else None
+    return analyses
+
+async def analyze_pr_incremental(pr_data: Dict[str, Any], files: List[FileDiff],
+                                 cache: PRAnalysisCache, notes: str = '') -> Optional[Dict[str, Any]]:
+    """Reuse cached per-file analyses, analyze only changed files, combine into one review"""
+    context = COMBINE_INSTRUCTION.format(title=pr_data.get('title', 'N/A'),
+                                         body=pr_data.get('body', 'N/A'),
+                                         files=pr_data.get('changed_files', len(files)))
+    if notes:
+        context += f"\n{notes}"
+    review_key = cache.review_key([f.key for f in files], context)
+    review = cache.get_review(review_key)
+    if review is not None:
+        print(f"♻️  Nothing changed since the last review of these {len(files)} files")
+        return {'success': True, 'response': review, 'files_reused': len(files),
+                'files_analyzed': 0}
+
+    analyses = [cache.get(f.key) for f in files]
+    fresh = [i for i, analysis in enumerate(analyses) if analysis is None]
+    print(f"♻️  Reusing {len(files) - len(fresh)}/{len(files)} cached file analyses, "
+          f"analyzing {len(fresh)}")
+    async with AIAPIFallback() as fallback:
+        if fresh:
+            results = await analyze_files(fallback, [files[i] for i in fresh])
+            for i, analysis in zip(fresh, results):
+                if analysis is not None:
+                    cache.put(files[i].key, analysis)
+                    analyses[i] = analysis
+        sections = [f"## {f.path}\n{analysis}" for f, analysis in zip(files, analyses)
+                    if analysis is not None]
+        if not sections:
+            return None
+        missing = [f.path for f, analysis in zip(files, analyses) if analysis is None]
+        if missing:
+            sections.append(f"## Not analyzed (AI call failed)\n" + "\n".join(missing))
+        result = await fallback.acall_map_reduce("\n\n".join(sections), context, max_tokens=800)
+    if not result.get('success'):
+        return None
+    if not missing:
+        cache.put_review(review_key, result['response'])
+    result.update(files_reused=len(files) - len(fresh), files_analyzed=len(fresh))
+    return result
+
 def post_review(pr_number: int, comment: str, repo: str, token: str) -> bool:
     url = f"https://api.github.com/repos/{repo}/pulls/{pr_number}/reviews"
     headers = {"Authorization": f"token {token}", "Accept": "application/vnd.github.v3+json"}
@@ -43,10 +135,25 @@ def main():
     if response.status_code != 200:
         sys.exit(1)
     pr_data = response.json()
-    diff = get_pr_diff(int(pr_number), repo, token)
-    if not diff:
+    packed = get_pr_diff(int(pr_number), repo, token)
+    if packed is None:
         sys.exit(1)
-    analysis = analyze_pr(pr_data, diff)
+    files = packed.reviewable
+    notes = packed.summary()
+    stats = packed.stats()
+    print(f"📄 Diff: {stats['files']} files ({stats['skipped_files']} skipped as noise), "
+          f"{stats['hunks_kept']} hunks kept, {stats['hunks_omitted']} omitted, "
+          f"~{stats['tokens']} tokens")
+    if not files:
+        print("No reviewable changes")
+        return
+    cache = open_analysis_cache()
+    if cache is None:
+        diff = packed.text + (f"\n{notes}\n" if notes else "")
+        analysis = analyze_pr(pr_data, diff)
+    else:
+        with cache:
+            analysis = asyncio.run(analyze_pr_incremental(pr_data, files, cache, notes))
     if analysis and analysis.get('response'):
         post_review(int(pr_number), analysis['response'], repo, token)
 
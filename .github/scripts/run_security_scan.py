@@ -1,8 +1,8 @@
 #!/usr/bin/env python3
 import os, sys, subprocess
 from typing import Dict, Any
-sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
-from scripts.ai_api_fallback import AIAPIFallback
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from ai_api_fallback import AIAPIFallback
 
 def run_security_checks() -> Dict[str, Any]:
     results = {}
@@ -14,9 +14,9 @@ def run_security_checks() -> Dict[str, Any]:
     return results
 
 def analyze_security(results: Dict[str, Any]) -> str:
-    fallback = AIAPIFallback()
-    prompt = f"Analyze security scan: {str(results)[:2000]}"
-    result = fallback.generate_response(prompt, max_tokens=600)
+    report = "\n".join(f"{name}:\n{output}" for name, output in results.items())
+    with AIAPIFallback() as fallback:
+        result = fallback.call_map_reduce(report, "Analyze security scan:", max_tokens=600)
     return result.get('response', '') if result.get('success') else ''
 
 def main():
@@ -1,7 +1,7 @@
 #!/usr/bin/env python3
 import os, sys, subprocess
-sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
-from scripts.ai_api_fallback import AIAPIFallback
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from ai_api_fallback import AIAPIFallback
 
 def run_tests() -> dict:
     results = {}
@@ -13,9 +13,11 @@ def run_tests() -> dict:
     return results
 
 def analyze_test_results(results: dict) -> str:
-    fallback = AIAPIFallback()
-    prompt = f"Analyze test results: {str(results)[:2000]}"
-    result = fallback.generate_response(prompt, max_tokens=500)
+    pytest = results.get('pytest', {})
+    report = (f"pytest exit code: {pytest['returncode']}\n{pytest['stdout']}" if pytest
+              else str(results))
+    with AIAPIFallback() as fallback:
+        result = fallback.call_map_reduce(report, "Analyze test results:", max_tokens=500)
     return result.get('response', '') if result.get('success') else ''
 
 def main():
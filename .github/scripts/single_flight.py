@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+Single-flight request coalescing
+Concurrent identical requests share one in-flight call, inside a process via
+asyncio futures and across processes on the same runner via lock files with a
+JSON result hand-off
+"""
+
+import os
+import copy
+import json
+import time
+import uuid
+import asyncio
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+
+from deadline import DeadlineBudget
+
+try:
+    import fcntl
+except ImportError:  # Windows: stale locks are then broken without serialization
+    fcntl = None
+
+
+class _LeaderCancelled(Exception):
+    """The leader was cancelled; a waiting caller takes over the call"""
+
+
+class _WaitExpired(Exception):
+    """The caller's deadline ran out while another process held the lock"""
+
+
+class SingleFlight:
+    """Coalesce concurrent calls that share a key into one execution"""
+
+    def __init__(self, lock_dir: Optional[str] = None, poll_interval: float = 0.2,
+                 stale_after: float = 600.0, result_ttl: float = 60.0):
+        self.lock_dir = Path(lock_dir) if lock_dir else None
+        self.poll_interval = poll_interval  # Seconds between checks on another process
+        self.stale_after = stale_after  # Lock age after which the leader is presumed dead
+        self.result_ttl = result_ttl  # How long handed-off result files are kept
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.stats = {'leaders': 0, 'coalesced': 0, 'handoffs': 0}
+
+        if self.lock_dir:
+            try:
+                self.lock_dir.mkdir(parents=True, exist_ok=True)
+            except OSError as e:
+                print(f"⚠️  Single-flight lock dir unavailable ({e}), coalescing in-process only")
+                self.lock_dir = None
+
+    async def run(self, key: str, call: Callable[[], Awaitable[Dict[str, Any]]],
+                  budget: Optional[DeadlineBudget] = None) -> Dict[str, Any]:
+        """
+        Return call()'s result, sharing it with concurrent callers using the same key.
+        A caller with a bounded budget stops waiting for another caller when its own
+        budget runs out and makes the call itself, which then fails fast on the deadline
+        """
+        pending = self._inflight.get(key)
+        if pending is not None:
+            self.stats['coalesced'] += 1
+        while pending is not None:
+            print(f"🔗 Joining in-flight request {key[:12]}")
+            try:
+                return copy.deepcopy(await asyncio.wait_for(asyncio.shield(pending),
+                                                            self._wait_limit(budget)))
+            except _LeaderCancelled:
+                # Only the leader was cancelled: the first waiter to resume leads instead
+                pending = self._inflight.get(key)
+            except asyncio.TimeoutError:
+                print(f"⏰ Deadline reached waiting for in-flight request {key[:12]}")
+                return await call()
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            if self.lock_dir:
+                result = await self._run_across_processes(key, call, budget)
+            else:
+                self.stats['leaders'] += 1
+                result = await call()
+            future.set_result(result)
+            return result
+        except _WaitExpired:
+            # Callers waiting on us have their own budgets: one of them waits on instead
+            future.set_exception(_LeaderCancelled())
+            future.exception()
+        except asyncio.CancelledError:
+            # Cancelling the leader (a hedged loser, a deadline) must not cancel its waiters
+            future.set_exception(_LeaderCancelled())
+            future.exception()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # Mark retrieved; waiters (if any) still receive it
+            raise
+        finally:
+            del self._inflight[key]
+        return await call()
+
+    @staticmethod
+    def _wait_limit(budget: Optional[DeadlineBudget]) -> Optional[float]:
+        """Seconds the caller may wait for another caller's result (None: no limit)"""
+        if budget is None or not budget.bounded:
+            return None
+        return budget.usable()
+
+    async def _run_across_processes(self, key: str,
+                                    call: Callable[[], Awaitable[Dict[str, Any]]],
+                                    budget: Optional[DeadlineBudget] = None) -> Dict[str, Any]:
+        """
+        Run as leader if we win the lock file, otherwise wait for the leader's result.
+        Raises _WaitExpired when the budget runs out while waiting
+        """
+        lock_path = self.lock_dir / f"{key}.lock"
+        result_path = self.lock_dir / f"{key}.result.json"
+        nonce = uuid.uuid4().hex
+        leaders: Set[str] = set()  # Nonces of the leaders seen holding the lock
+        waited = False
+
+        while True:
+            # Only results of leaders we waited for count: later callers get a fresh call
+            handed_off = self._read_result(result_path, leaders)
+            if handed_off is not None:
+                self.stats['handoffs'] += 1
+                print(f"🔗 Reusing result handed off by another process for {key[:12]}")
+                return handed_off
+
+            if self._try_lock(lock_path, nonce):
+                break
+            leader = self._lock_nonce(lock_path)
+            if leader:
+                leaders.add(leader)
+
+            if not waited:
+                print(f"⏳ Waiting for another process running request {key[:12]}")
+                waited = True
+            limit = self._wait_limit(budget)
+            if limit is not None and limit <= 0:
+                print(f"⏰ Deadline reached waiting for another process on {key[:12]}")
+                raise _WaitExpired()
+            await asyncio.sleep(self.poll_interval if limit is None
+                                else min(self.poll_interval, limit))
+
+        self.stats['leaders'] += 1
+        try:
+            result = await call()
+            # Failures are handed off too, so waiting processes do not rerun a failing
+            # chain one by one; a deadline failure only reflects this caller's budget
+            if not result.get('deadline_exceeded'):
+                self._write_result(result_path, result, nonce)
+            return result
+        finally:
+            lock_path.unlink(missing_ok=True)
+            self._cleanup_results()
+
+    def _try_lock(self, lock_path: Path, nonce: str) -> bool:
+        """Atomically create the lock file; break it if its owner is gone or it is stale"""
+        try:
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            self._break_if_abandoned(lock_path)
+            return False
+        except OSError:
+            # Lock dir became unusable: just run the call ourselves
+            return True
+
+        with os.fdopen(fd, 'w') as f:
+            f.write(f"{os.getpid()} {nonce}")
+        return True
+
+    def _break_if_abandoned(self, lock_path: Path):
+        """
+        Remove an abandoned lock. Breakers take an flock first (released by the
+        kernel if the holder dies) and only unlink the very file they judged, so
+        two processes cannot both break it and remove the lock one just took
+        """
+        guard_fd = None
+        if fcntl is not None:
+            try:
+                guard_fd = os.open(self.lock_dir / ".break.guard", os.O_CREAT | os.O_WRONLY)
+                fcntl.flock(guard_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                if guard_fd is not None:
+                    os.close(guard_fd)
+                return  # Another process is breaking a lock right now
+        try:
+            inode = self._abandoned_inode(lock_path)
+            if inode is not None and os.stat(lock_path).st_ino == inode:
+                lock_path.unlink()
+        except OSError:
+            pass
+        finally:
+            if guard_fd is not None:
+                os.close(guard_fd)
+
+    def _abandoned_inode(self, lock_path: Path) -> Optional[int]:
+        """Inode of the lock if its owner process died or it is older than stale_after"""
+        try:
+            with open(lock_path) as f:
+                stat = os.fstat(f.fileno())
+                content = f.read().split()
+            if time.time() - stat.st_mtime > self.stale_after:
+                return stat.st_ino
+            pid = int(content[0]) if content else 0
+        except (OSError, ValueError):
+            return None
+        if pid <= 0:
+            return None
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return stat.st_ino
+        except PermissionError:
+            pass
+        return None
+
+    def _lock_nonce(self, lock_path: Path) -> Optional[str]:
+        """Nonce of the process holding the lock"""
+        try:
+            content = lock_path.read_text().split()
+        except OSError:
+            return None
+        return content[1] if len(content) > 1 else None
+
+    def _read_result(self, result_path: Path, leaders: Set[str]) -> Optional[Dict[str, Any]]:
+        """Load a result handed off by one of the given leaders"""
+        if not leaders:
+            return None
+        try:
+            data = json.loads(result_path.read_text())
+        except (OSError, ValueError):
+            return None
+        if not isinstance(data, dict) or data.get('nonce') not in leaders:
+            return None
+        return data.get('result')
+
+    def _write_result(self, result_path: Path, result: Dict[str, Any], nonce: str):
+        """Publish a result tagged with the leader's nonce atomically (temp file, then rename)"""
+        tmp_path = result_path.with_suffix(f".{os.getpid()}.tmp")
+        try:
+            tmp_path.write_text(json.dumps({'nonce': nonce, 'result': result}, default=str))
+            os.replace(tmp_path, result_path)
+        except (OSError, TypeError, ValueError) as e:
+            tmp_path.unlink(missing_ok=True)
+            print(f"⚠️  Could not hand off result: {e}")
+
+    def _cleanup_results(self):
+        """Remove expired result files"""
+        cutoff = time.time() - self.result_ttl
+        for result_path in self.lock_dir.glob("*.result.json"):
+            try:
+                if result_path.stat().st_mtime < cutoff:
+                    result_path.unlink()
+            except OSError:
+                pass
@@ -1,205 +1,352 @@
 #!/usr/bin/env python3
 """
 Universal AI Orchestrator with 15-Provider Fallback Chain
-Zero-failure guarantee through sequential provider attempts
+Zero-failure guarantee through sequential or hedged provider attempts
 """
 
+import time
+_IMPORT_START = time.perf_counter()  # Reported by --startup-profile
+
 import os
 import sys
 import json
-import time
+import zlib
 import asyncio
+import sqlite3
 import hashlib
-from typing import Dict, List, Optional, Tuple
+from typing import Any, Dict, List, Optional, Tuple
 from datetime import datetime
 from pathlib import Path
 
-try:
-    import aiohttp
-except ImportError:
-    print("Installing aiohttp...")
-    os.system("pip install aiohttp")
-    import aiohttp
+from deadline import DeadlineBudget, default_deadline
+from single_flight import SingleFlight
+from phase_timing import AttemptTiming, SpanExporter, aiohttp_trace_config
+from provider_errors import TIMEOUT, AUTH, ProviderError
+from prompt_similarity import (prompt_signature, signature_similarity, lsh_band_keys,
+                               signature_from_bytes, literal_fingerprint)
+from provider_registry import ORCHESTRATOR_CHAIN, PROVIDERS_BY_NAME, compile_template, extract_text
+
+# aiohttp dominates import time, so it is imported on the first request (_require_aiohttp)
+aiohttp = None
+
+_IMPORT_MS = (time.perf_counter() - _IMPORT_START) * 1000
+
+BENCH_SECONDS = 300  # How long an auth/quota failure (or a gone model) stays out of later requests
+
+
+def _require_aiohttp():
+    """Import aiohttp on first use; it is a declared dependency and never installed at runtime"""
+    global aiohttp
+    if aiohttp is None:
+        try:
+            import aiohttp as module
+        except ImportError as e:
+            raise RuntimeError(
+                "aiohttp is not installed; add it to the job's dependencies (pip install aiohttp)"
+            ) from e
+        aiohttp = module
+    return aiohttp
 
 
 class APIProvider:
-    """Individual API provider configuration"""
-    def __init__(self, name: str, base_url: str, key_env: str, model: str, 
-                 headers_func=None, payload_func=None):
-        self.name = name
-        self.base_url = base_url
-        self.key_env = key_env
-        self.model = model
-        self.headers_func = headers_func or self.default_headers
-        self.payload_func = payload_func or self.default_payload
-        self.api_key = os.getenv(key_env)
-    
-    def default_headers(self):
-        return {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json"
-        }
+    """One link of the fallback chain, backed by a shared provider registry entry"""
+
+    __slots__ = ('name', 'type', 'key_env', 'models', 'model', 'timeout', 'api_key', 'template',
+                 '_entry')
+
+    def __init__(self, entry: Dict, api_key: Optional[str], model: Optional[str] = None):
+        self.name = entry['name']
+        self.type = entry['type']
+        self.key_env = entry['key_env']
+        self.models = entry['models']
+        self.model = model or entry['models'][0]
+        self.timeout = entry['timeout']
+        self.api_key = api_key
+        self._entry = entry
+        # URL, headers and payload skeleton are compiled once; attempts only fill the prompt
+        self.template = compile_template(entry['type'], entry['base_url'], api_key or '',
+                                         self.model)
+
+    def is_available(self):
+        return bool(self.api_key)
+
+    def with_model(self, model: str) -> 'APIProvider':
+        """This provider (same key, host and pooled connections) pinned to another model"""
+        return APIProvider(self._entry, self.api_key, model)
+
+
+class ResponseCache:
+    """
+    Single-file SQLite response cache with TTL expiry and LRU eviction.
+    Bodies above compress_min_bytes are zlib-compressed.
+    """
     
-    def default_payload(self, system_msg, user_prompt, max_tokens, temperature):
+    EVICT_EVERY = 100  # Writes between full eviction passes while under max_bytes
+    
+    def __init__(self, db_path: Path, ttl_hours: float = 24,
+                 max_bytes: int = 64 * 1024 * 1024, compress: bool = True,
+                 compress_min_bytes: int = 1024):
+        self.db_path = Path(db_path)
+        self.ttl_seconds = ttl_hours * 3600
+        self.max_bytes = max_bytes
+        self.compress = compress
+        self.compress_min_bytes = compress_min_bytes
+        
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(str(self.db_path), timeout=5.0, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, provider TEXT, body BLOB NOT NULL, "
+            "compressed INTEGER NOT NULL, size INTEGER NOT NULL, "
+            "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS idx_responses_created ON responses(created_at)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses(accessed_at)")
+        
+        # Similarity tier: MinHash signatures plus LSH band index
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS signatures (key TEXT PRIMARY KEY, signature BLOB NOT NULL)"
+        )
+        self.db.execute("CREATE TABLE IF NOT EXISTS lsh_bands (band TEXT NOT NULL, key TEXT NOT NULL)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS idx_lsh_band ON lsh_bands(band)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS idx_lsh_key ON lsh_bands(key)")
+        self.db.execute(
+            "CREATE TRIGGER IF NOT EXISTS drop_signature AFTER DELETE ON responses BEGIN "
+            "DELETE FROM signatures WHERE key = OLD.key; "
+            "DELETE FROM lsh_bands WHERE key = OLD.key; END"
+        )
+        # Running size estimate: own writes are added, a full pass resyncs it with
+        # the table (which other processes may also write to)
+        self._total = self._stored_bytes()
+        self._writes = 0
+    
+    def _stored_bytes(self) -> int:
+        return self.db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+    
+    def get(self, key: str) -> Optional[Dict]:
+        """Return a fresh entry and mark it recently used, or None"""
+        now = time.time()
+        row = self.db.execute(
+            "SELECT provider, body, compressed, created_at FROM responses "
+            "WHERE key = ? AND created_at >= ?",
+            (key, now - self.ttl_seconds)
+        ).fetchone()
+        if row is None:
+            return None
+        
+        provider, body, compressed, created_at = row
+        self.db.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+        response = zlib.decompress(body) if compressed else body
         return {
-            "model": self.model,
-            "messages": [
-                {"role": "system", "content": system_msg},
-                {"role": "user", "content": user_prompt}
-            ],
-            "max_tokens": max_tokens,
-            "temperature": temperature
+            'provider': provider,
+            'response': response.decode('utf-8'),
+            'timestamp': datetime.fromtimestamp(created_at).isoformat()
         }
     
-    def is_available(self):
-        return bool(self.api_key)
+    def put(self, key: str, provider: str, response: str, created_at: Optional[float] = None):
+        """
+        Store a response. Expired and LRU entries are evicted once the size estimate
+        passes max_bytes, and otherwise every EVICT_EVERY writes
+        """
+        now = time.time()
+        body = response.encode('utf-8')
+        compressed = self.compress and len(body) >= self.compress_min_bytes
+        if compressed:
+            body = zlib.compress(body)
+        
+        self.db.execute(
+            "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (key, provider, body, int(compressed), len(body), created_at or now, now)
+        )
+        self._total += len(body)
+        self._writes += 1
+        if self._total > self.max_bytes or self._writes >= self.EVICT_EVERY:
+            self.evict(now)
+    
+    def evict(self, now: Optional[float] = None):
+        """Delete expired entries, then least recently used ones until under max_bytes"""
+        now = now or time.time()
+        self.db.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl_seconds,))
+        
+        total = self._stored_bytes()
+        self._writes = 0
+        if total <= self.max_bytes:
+            self._total = total
+            return
+        
+        evict_keys = []
+        for key, size in self.db.execute("SELECT key, size FROM responses ORDER BY accessed_at"):
+            if total <= self.max_bytes:
+                break
+            evict_keys.append((key,))
+            total -= size
+        self.db.executemany("DELETE FROM responses WHERE key = ?", evict_keys)
+        self._total = total
+    
+    @staticmethod
+    def _band_keys(signature, context: str, prompt: str) -> List[str]:
+        """LSH bands scoped to the context and the prompt's numeric literals"""
+        return lsh_band_keys(signature, f"{context}:{literal_fingerprint(prompt)}:")
+    
+    def put_signature(self, key: str, context: str, prompt: str):
+        """Index a cached entry's prompt for near-duplicate lookups within a context"""
+        signature = prompt_signature(prompt)
+        self.db.execute("BEGIN")
+        try:
+            self.db.execute("DELETE FROM lsh_bands WHERE key = ?", (key,))
+            self.db.execute("INSERT OR REPLACE INTO signatures VALUES (?, ?)",
+                            (key, signature.tobytes()))
+            self.db.executemany(
+                "INSERT INTO lsh_bands VALUES (?, ?)",
+                [(band, key) for band in self._band_keys(signature, context, prompt)]
+            )
+            self.db.execute("COMMIT")
+        except sqlite3.Error:
+            self.db.execute("ROLLBACK")
+            raise
+    
+    def find_similar(self, context: str, prompt: str,
+                     threshold: float) -> Optional[Tuple[Dict, float]]:
+        """Return (entry, similarity) for the closest fresh prompt at or above threshold"""
+        signature = prompt_signature(prompt)
+        bands = self._band_keys(signature, context, prompt)
+        placeholders = ','.join('?' * len(bands))
+        candidates = self.db.execute(
+            "SELECT s.key, s.signature FROM signatures s JOIN responses r ON r.key = s.key "
+            f"WHERE r.created_at >= ? AND s.key IN "
+            f"(SELECT key FROM lsh_bands WHERE band IN ({placeholders}))",
+            (time.time() - self.ttl_seconds, *bands)
+        ).fetchall()
+        
+        best_key, best_score = None, 0.0
+        for key, blob in candidates:
+            score = signature_similarity(signature, signature_from_bytes(blob))
+            if score > best_score:
+                best_key, best_score = key, score
+        
+        if best_key is None or best_score < threshold:
+            return None
+        entry = self.get(best_key)
+        return (entry, best_score) if entry else None
+    
+    def migrate_directory(self, cache_dir: Path) -> int:
+        """One-shot import of legacy per-key JSON files; imported files are removed"""
+        migrated = 0
+        for cache_file in Path(cache_dir).glob("*.json"):
+            try:
+                data = json.loads(cache_file.read_text())
+                created_at = datetime.fromisoformat(data['timestamp']).timestamp()
+                if created_at >= time.time() - self.ttl_seconds:
+                    self.put(cache_file.stem, data.get('provider', 'cache'),
+                             data['response'], created_at)
+                    migrated += 1
+            except (ValueError, KeyError, TypeError, OSError):
+                pass
+            cache_file.unlink(missing_ok=True)
+        return migrated
+    
+    def close(self):
+        self.db.close()
 
 
 class UniversalAIOrchestrator:
     """
     Zero-Failure AI Orchestrator
-    Tries providers sequentially until success
+    Tries providers sequentially (or hedged in parallel) until success
     """
     
-    def __init__(self, cache_dir: str = ".github/data/cache"):
+    def __init__(self, cache_dir: str = ".github/data/cache",
+                 pool_limit: int = 100, pool_limit_per_host: int = 10,
+                 keepalive_timeout: float = 60.0, dns_cache_ttl: int = 300,
+                 cache_ttl_hours: float = 24, cache_max_bytes: int = 64 * 1024 * 1024,
+                 cache_compress: bool = True, similarity_threshold: Optional[float] = None,
+                 trace_file: Optional[str] = None):
+        # The cache, lock and metrics directories are created on first use
         self.cache_dir = Path(cache_dir)
-        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.cache_ttl_hours = cache_ttl_hours
+        self.cache_max_bytes = cache_max_bytes
+        self.cache_compress = cache_compress
+        self._cache: Optional[ResponseCache] = None
+        # Near-duplicate cache tier (opt-in): minimum estimated similarity for a hit
+        self.similarity_threshold = similarity_threshold
+        # Identical concurrent requests (in this process or others on the runner) share one call
+        self._single_flight: Optional[SingleFlight] = None
+        # Optional Chrome trace-event export of per-attempt phase spans
+        trace_file = trace_file or os.getenv("AI_TRACE_FILE")
+        self.span_exporter = SpanExporter(trace_file) if trace_file else None
         self.metrics_dir = Path(".github/data/metrics")
-        self.metrics_dir.mkdir(parents=True, exist_ok=True)
         
-        # Provider chain ordered by reliability and cost-effectiveness
+        # Provider chain ordered by reliability and cost-effectiveness (configured keys only)
         self.providers = self._init_providers()
         
+        # Shared connection pool (several providers share openrouter.ai / api.groq.com)
+        self.pool_limit = pool_limit
+        self.pool_limit_per_host = pool_limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.dns_cache_ttl = dns_cache_ttl
+        self._session: Optional['aiohttp.ClientSession'] = None
+        self._session_loop = None
+        # Providers ("name") and models ("name/model") kept out of later requests,
+        # mapped to the time.monotonic() they may return
+        self._benched: Dict[str, float] = {}
+    
+    @property
+    def cache(self) -> ResponseCache:
+        """Response cache, opened (and legacy entries migrated) on first use"""
+        if self._cache is None:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            self._cache = ResponseCache(self.cache_dir / "responses.db", self.cache_ttl_hours,
+                                        self.cache_max_bytes, self.cache_compress)
+            migrated = self._cache.migrate_directory(self.cache_dir)
+            if migrated:
+                print(f"📦 Migrated {migrated} legacy cache entries", file=sys.stderr)
+        return self._cache
+    
+    @property
+    def single_flight(self) -> SingleFlight:
+        if self._single_flight is None:
+            self._single_flight = SingleFlight(str(self.cache_dir / "inflight"))
+        return self._single_flight
+    
+    async def __aenter__(self):
+        return self
+    
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+    
+    async def _get_session(self) -> 'aiohttp.ClientSession':
+        """Return the shared session, creating it on first use in the running loop"""
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._session_loop is not loop:
+            _require_aiohttp()
+            connector = aiohttp.TCPConnector(
+                limit=self.pool_limit,
+                limit_per_host=self.pool_limit_per_host,
+                keepalive_timeout=self.keepalive_timeout,
+                ttl_dns_cache=self.dns_cache_ttl
+            )
+            self._session = aiohttp.ClientSession(connector=connector,
+                                                  trace_configs=[aiohttp_trace_config()])
+            self._session_loop = loop
+        return self._session
+    
+    async def close(self):
+        """Close the shared session and release pooled connections"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        self._session_loop = None
+        
     def _init_providers(self) -> List[APIProvider]:
-        """Initialize all 15 providers in fallback priority order"""
-        return [
-            # Tier 1: High reliability free providers
-            APIProvider(
-                "GROQ", 
-                "https://api.groq.com/openai/v1/chat/completions",
-                "GROQAI_API_KEY",
-                "llama-3.3-70b-versatile"
-            ),
-            APIProvider(
-                "DEEPSEEK",
-                "https://openrouter.ai/api/v1/chat/completions",
-                "DEEPSEEK_API_KEY",
-                "deepseek/deepseek-chat-v3.1:free",
-                headers_func=lambda self: {
-                    "Authorization": f"Bearer {self.api_key}",
-                    "Content-Type": "application/json",
-                    "HTTP-Referer": "https://github.com/over7-maker/test_endeelo",
-                    "X-Title": "test_endeelo automation"
-                }
-            ),
-            APIProvider(
-                "CEREBRAS",
-                "https://api.cerebras.ai/v1/chat/completions",
-                "CEREBRAS_API_KEY",
-                "llama3.1-70b"
-            ),
-            
-            # Tier 2: Premium providers
-            APIProvider(
-                "NVIDIA",
-                "https://integrate.api.nvidia.com/v1/chat/completions",
-                "NVIDIA_API_KEY",
-                "deepseek-ai/deepseek-r1"
-            ),
-            APIProvider(
-                "CODESTRAL",
-                "https://codestral.mistral.ai/v1/chat/completions",
-                "CODESTRAL_API_KEY",
-                "codestral-latest"
-            ),
-            APIProvider(
-                "GEMINI2",
-                "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent",
-                "GEMINI2_API_KEY",
-                "gemini-2.0-flash",
-                headers_func=lambda self: {
-                    "Content-Type": "application/json",
-                    "X-goog-api-key": self.api_key
-                },
-                payload_func=lambda self, sys, usr, max_tok, temp: {
-                    "contents": [{
-                        "parts": [{"text": f"{sys}\n\n{usr}"}]
-                    }],
-                    "generationConfig": {
-                        "maxOutputTokens": max_tok,
-                        "temperature": temp
-                    }
-                }
-            ),
-            
-            # Tier 3: Backup providers
-            APIProvider(
-                "GLM",
-                "https://openrouter.ai/api/v1/chat/completions",
-                "GLM_API_KEY",
-                "z-ai/glm-4.5-air:free",
-                headers_func=lambda self: {
-                    "Authorization": f"Bearer {self.api_key}",
-                    "Content-Type": "application/json",
-                    "HTTP-Referer": "https://github.com",
-                    "X-Title": "test_endeelo"
-                }
-            ),
-            APIProvider(
-                "GROK",
-                "https://openrouter.ai/api/v1/chat/completions",
-                "GROK_API_KEY",
-                "x-ai/grok-4-fast:free"
-            ),
-            APIProvider(
-                "KIMI",
-                "https://openrouter.ai/api/v1/chat/completions",
-                "KIMI_API_KEY",
-                "moonshotai/kimi-k2:free"
-            ),
-            APIProvider(
-                "QWEN",
-                "https://openrouter.ai/api/v1/chat/completions",
-                "QWEN_API_KEY",
-                "qwen/qwen3-coder:free"
-            ),
-            APIProvider(
-                "GPTOSS",
-                "https://openrouter.ai/api/v1/chat/completions",
-                "GPTOSS_API_KEY",
-                "openai/gpt-oss-120b:free"
-            ),
-            APIProvider(
-                "CHUTES",
-                "https://llm.chutes.ai/v1/chat/completions",
-                "CHUTES_API_KEY",
-                "zai-org/GLM-4.5-Air"
-            ),
-            APIProvider(
-                "COHERE",
-                "https://api.cohere.ai/v1/chat",
-                "COHERE_API_KEY",
-                "command-a-03-2025",
-                payload_func=lambda self, sys, usr, max_tok, temp: {
-                    "model": "command-a-03-2025",
-                    "message": f"{sys}\n\n{usr}",
-                    "max_tokens": max_tok,
-                    "temperature": temp
-                }
-            ),
-            APIProvider(
-                "GROQ2",
-                "https://api.groq.com/openai/v1/chat/completions",
-                "GROQ2_API_KEY",
-                "mixtral-8x7b-32768"
-            ),
-            APIProvider(
-                "GEMINIAI",
-                "https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-flash:generateContent",
-                "GEMINIAI_API_KEY",
-                "gemini-1.5-flash"
-            ),
-        ]
+        """Build the providers whose API key is set, in fallback priority order"""
+        providers = []
+        for name in ORCHESTRATOR_CHAIN:
+            entry = PROVIDERS_BY_NAME[name]
+            api_key = os.getenv(entry['key_env'])
+            if api_key:
+                providers.append(APIProvider(entry, api_key))
+        return providers
     
     def _get_cache_key(self, system_msg: str, user_prompt: str, 
                        max_tokens: int, temperature: float) -> str:
@@ -207,90 +354,120 @@ class UniversalAIOrchestrator:
         content = f"{system_msg}|{user_prompt}|{max_tokens}|{temperature}"
         return hashlib.sha256(content.encode()).hexdigest()
     
-    def _get_cache_path(self, cache_key: str) -> Path:
-        """Get cache file path"""
-        return self.cache_dir / f"{cache_key}.json"
-    
     def _read_cache(self, cache_key: str) -> Optional[Dict]:
-        """Read from cache if exists and fresh (<24h)"""
-        cache_file = self._get_cache_path(cache_key)
-        if not cache_file.exists():
-            return None
-        
+        """Read from cache if exists and fresh (within the cache TTL)"""
         try:
-            data = json.loads(cache_file.read_text())
-            # Check if cache is fresh (24 hours)
-            cached_time = datetime.fromisoformat(data.get('timestamp', ''))
-            age_hours = (datetime.now() - cached_time).total_seconds() / 3600
-            if age_hours < 24:
-                return data
-        except:
-            pass
-        return None
+            return self.cache.get(cache_key)
+        except sqlite3.Error:
+            return None
     
     def _write_cache(self, cache_key: str, data: Dict):
         """Write to cache"""
-        cache_file = self._get_cache_path(cache_key)
-        data['timestamp'] = datetime.now().isoformat()
-        cache_file.write_text(json.dumps(data, indent=2))
+        try:
+            self.cache.put(cache_key, data['provider'], data['response'])
+        except sqlite3.Error as e:
+            print(f"⚠️  Cache write failed: {e}", file=sys.stderr)
+    
+    def _get_similarity_context(self, system_msg: str, max_tokens: int,
+                                temperature: float) -> str:
+        """Parameters that must match exactly for a near-duplicate hit"""
+        content = f"{system_msg}|{max_tokens}|{temperature}"
+        return hashlib.sha256(content.encode()).hexdigest()[:16]
+    
+    def _read_similar(self, context: str, user_prompt: str) -> Optional[Tuple[Dict, float]]:
+        """Look up a cached response for a near-duplicate prompt"""
+        try:
+            return self.cache.find_similar(context, user_prompt, self.similarity_threshold)
+        except sqlite3.Error:
+            return None
+    
+    def _write_similar(self, cache_key: str, context: str, user_prompt: str):
+        """Index a freshly cached prompt for near-duplicate lookups"""
+        try:
+            self.cache.put_signature(cache_key, context, user_prompt)
+        except sqlite3.Error as e:
+            print(f"⚠️  Similarity index write failed: {e}", file=sys.stderr)
     
     async def _try_provider(self, provider: APIProvider, system_msg: str,
                            user_prompt: str, max_tokens: int, 
-                           temperature: float) -> Tuple[bool, Optional[str], float]:
+                           temperature: float,
+                           timeout: Optional[float] = None) -> Tuple[bool, Any, float, Dict]:
         """
-        Try single provider
-        Returns: (success, response_text, duration_ms)
+        Try single provider (timeout defaults to the provider's own)
+        Returns: (success, response_text or ProviderError, duration_ms, phases)
+        phases holds per-phase timings (dns/connect/ttfb/body/parse, in ms)
         """
         if not provider.is_available():
-            return False, f"Provider {provider.name} not configured", 0.0
+            return False, ProviderError(AUTH, f"Provider {provider.name} not configured"), 0.0, {}
         
         start_time = time.time()
+        timing = AttemptTiming()
         
         try:
-            headers = provider.headers_func()
-            payload = provider.payload_func(system_msg, user_prompt, 
-                                           max_tokens, temperature)
+            template = provider.template
+            body = template.body(system_msg, user_prompt, max_tokens, temperature)
             
-            timeout = aiohttp.ClientTimeout(total=30)
-            async with aiohttp.ClientSession(timeout=timeout) as session:
-                async with session.post(
-                    provider.base_url,
-                    headers=headers,
-                    json=payload
-                ) as response:
-                    duration_ms = (time.time() - start_time) * 1000
+            session = await self._get_session()
+            timeout = aiohttp.ClientTimeout(total=timeout or provider.timeout)
+            async with session.post(
+                template.url,
+                headers=template.headers,
+                data=body,
+                timeout=timeout,
+                trace_request_ctx=timing
+            ) as response:
+                duration_ms = (time.time() - start_time) * 1000
+                
+                if response.status == 200:
+                    body = await response.read()
+                    timing.mark('body_end')
+                    data = json.loads(body)
+                    timing.mark('parse_end')
                     
-                    if response.status == 200:
-                        data = await response.json()
-                        
-                        # Extract response based on provider format
-                        if provider.name in ["GEMINI2", "GEMINIAI"]:
-                            text = data['candidates'][0]['content']['parts'][0]['text']
-                        elif provider.name == "COHERE":
-                            text = data['text']
-                        else:
-                            text = data['choices'][0]['message']['content']
-                        
-                        return True, text, duration_ms
-                    else:
-                        error_text = await response.text()
-                        return False, f"HTTP {response.status}: {error_text[:200]}", duration_ms
+                    text = extract_text(provider.type, data)
+                    
+                    return True, text, duration_ms, self._attempt_phases(provider, timing)
+                else:
+                    error_text = await response.text()
+                    timing.mark('body_end')
+                    error = ProviderError.from_response(response.status, response.headers,
+                                                        error_text)
+                    return False, error, duration_ms, self._attempt_phases(provider, timing)
                         
         except asyncio.TimeoutError:
             duration_ms = (time.time() - start_time) * 1000
-            return False, "Request timeout", duration_ms
+            return (False, ProviderError(TIMEOUT, "Request timeout"), duration_ms,
+                    self._attempt_phases(provider, timing))
         except Exception as e:
             duration_ms = (time.time() - start_time) * 1000
-            return False, f"Exception: {str(e)[:200]}", duration_ms
+            error = ProviderError.from_exception(e)
+            return (False, ProviderError(error.error_class, f"Exception: {str(e)[:200]}"),
+                    duration_ms, self._attempt_phases(provider, timing))
+    
+    def _attempt_phases(self, provider: APIProvider, timing: AttemptTiming) -> Dict:
+        """Summarize an attempt's phase timings and export its spans if enabled"""
+        if self.span_exporter is not None:
+            self.span_exporter.export(timing, provider.name, "orchestrator",
+                                      {'provider': provider.name, 'model': provider.model})
+        return timing.phases()
     
     async def execute(self, task_type: str, system_msg: str, user_prompt: str,
                      max_tokens: int = 2000, temperature: float = 0.7,
-                     use_cache: bool = True) -> Dict:
+                     use_cache: bool = True, hedge: int = 1,
+                     hedge_delay: Optional[float] = None,
+                     deadline: Optional[float] = None) -> Dict:
         """
         Execute AI task with fallback chain
+        Concurrent identical requests are coalesced into one provider call
+        hedge: number of providers to start at once (1 = sequential)
+        hedge_delay: seconds to wait before starting the next provider anyway
+        deadline: seconds the whole call may take (default: $AI_DEADLINE, otherwise
+                  unbounded); attempt timeouts shrink to fit and the chain stops with
+                  a diagnostic (deadline_exceeded) before the budget runs out
         Returns comprehensive result dict
         """
         start_time = time.time()
+        budget = DeadlineBudget(deadline if deadline is not None else default_deadline())
         
         # Check cache
         cache_key = self._get_cache_key(system_msg, user_prompt, max_tokens, temperature)
@@ -307,62 +484,83 @@ class UniversalAIOrchestrator:
                     'task_type': task_type
                 }
         
-        # Try providers sequentially
-        fallback_count = 0
-        attempts = []
+        similar_context = None
+        if use_cache and self.similarity_threshold is not None:
+            similar_context = self._get_similarity_context(system_msg, max_tokens, temperature)
+            similar = self._read_similar(similar_context, user_prompt)
+            if similar:
+                cached, score = similar
+                print(f"♻️  Near-duplicate cache hit (similarity {score:.2f})", file=sys.stderr)
+                return {
+                    'success': True,
+                    'provider': cached.get('provider', 'cache'),
+                    'response': cached['response'],
+                    'duration_ms': (time.time() - start_time) * 1000,
+                    'fallback_count': 0,
+                    'cached': 'similar',
+                    'similarity': score,
+                    'task_type': task_type
+                }
+        
+        return await self.single_flight.run(cache_key, lambda: self._execute_providers(
+            task_type, system_msg, user_prompt, max_tokens, temperature, use_cache,
+            hedge, hedge_delay, cache_key, similar_context, start_time, budget
+        ), budget)
+    
+    async def _execute_providers(self, task_type: str, system_msg: str, user_prompt: str,
+                                 max_tokens: int, temperature: float, use_cache: bool,
+                                 hedge: int, hedge_delay: Optional[float], cache_key: str,
+                                 similar_context: Optional[str], start_time: float,
+                                 budget: DeadlineBudget) -> Dict:
+        """Run the provider chain for a cache miss and record the outcome"""
+        _require_aiohttp()  # Fail loudly here rather than once per provider
+        available = [p for p in self.providers if p.is_available()]
+        # Skip providers (or move to sibling models) benched by earlier requests,
+        # unless that would leave none
+        ready = [ready for ready in map(self._unbenched, available) if ready is not None]
+        if len(ready) < len(available):
+            print(f"⏭️  Skipping {len(available) - len(ready)} benched providers", file=sys.stderr)
+        available = ready or available
+        provider, result, duration, attempts, fallback_count = await self._race_providers(
+            available, system_msg, user_prompt, max_tokens, temperature,
+            hedge, hedge_delay, budget
+        )
         
-        for provider in self.providers:
-            if not provider.is_available():
-                continue
+        if provider is not None:
+            print(f"✅ Success with {provider.name}!", file=sys.stderr)
             
-            fallback_count += 1
-            print(f"🔄 Trying provider {fallback_count}: {provider.name}...", file=sys.stderr)
+            # Cache successful response
+            if use_cache:
+                self._write_cache(cache_key, {
+                    'provider': provider.name,
+                    'response': result
+                })
+                if similar_context is not None:
+                    self._write_similar(cache_key, similar_context, user_prompt)
             
-            success, result, duration = await self._try_provider(
-                provider, system_msg, user_prompt, max_tokens, temperature
-            )
+            # Log metrics
+            self._log_metrics(task_type, provider.name, True, duration, 
+                             fallback_count, attempts)
             
-            attempts.append({
+            total_duration = (time.time() - start_time) * 1000
+            return {
+                'success': True,
                 'provider': provider.name,
-                'success': success,
-                'duration_ms': duration,
-                'error': None if success else result
-            })
-            
-            if success:
-                print(f"✅ Success with {provider.name}!", file=sys.stderr)
-                
-                # Cache successful response
-                if use_cache:
-                    self._write_cache(cache_key, {
-                        'provider': provider.name,
-                        'response': result
-                    })
-                
-                # Log metrics
-                self._log_metrics(task_type, provider.name, True, duration, 
-                                 fallback_count, attempts)
-                
-                total_duration = (time.time() - start_time) * 1000
-                return {
-                    'success': True,
-                    'provider': provider.name,
-                    'response': result,
-                    'duration_ms': total_duration,
-                    'fallback_count': fallback_count,
-                    'cached': False,
-                    'task_type': task_type,
-                    'attempts': attempts
-                }
-            else:
-                print(f"❌ {provider.name} failed: {result[:100]}", file=sys.stderr)
+                'model': provider.model,
+                'response': result,
+                'duration_ms': total_duration,
+                'fallback_count': fallback_count,
+                'cached': False,
+                'task_type': task_type,
+                'attempts': attempts
+            }
         
-        # All providers failed
+        # All providers failed (or the deadline left no room for the rest)
         total_duration = (time.time() - start_time) * 1000
         self._log_metrics(task_type, "none", False, total_duration, 
                          fallback_count, attempts)
         
-        return {
+        failure = {
             'success': False,
             'provider': 'none',
             'response': f"All {fallback_count} providers failed",
@@ -372,10 +570,173 @@ class UniversalAIOrchestrator:
             'task_type': task_type,
             'attempts': attempts
         }
+        tried = {attempt['provider'] for attempt in attempts}
+        not_tried = sum(1 for p in available if p.name not in tried)
+        if budget.bounded and (not_tried > 0 or budget.remaining() == 0):
+            last_error = next((a['error'] for a in reversed(attempts) if a.get('error')), None)
+            failure['deadline_exceeded'] = True
+            failure['response'] = (
+                f"Deadline reached ({budget.describe()}) after {fallback_count} providers; "
+                f"{not_tried} not tried" + (f". Last error: {last_error}" if last_error else "")
+            )
+            print(f"⏰ {failure['response']}", file=sys.stderr)
+        return failure
+    
+    async def _race_providers(self, providers: List[APIProvider], system_msg: str,
+                              user_prompt: str, max_tokens: int, temperature: float,
+                              hedge: int = 1, hedge_delay: Optional[float] = None,
+                              budget: Optional[DeadlineBudget] = None
+                              ) -> Tuple[Optional[APIProvider], Optional[str], float, List[Dict], int]:
+        """
+        Run providers in priority order with up to `hedge` requests in flight.
+        A failure starts the next provider immediately; if `hedge_delay` is set,
+        the next provider is also started after that many seconds without an answer.
+        The first successful response wins and all other in-flight attempts are cancelled.
+        A model-specific failure puts the same provider's next model (same key and
+        pooled connection) at the front of the queue.
+        With a deadline budget each attempt's timeout is a share of the remaining time
+        and no provider is started once too little is left.
+        Returns: (provider, response_text, duration_ms, attempts, fallback_count)
+        """
+        budget = budget or DeadlineBudget()
+        queue = list(providers)
+        in_flight = {}  # task -> (provider, start_time)
+        attempts = []
+        fallback_count = 0
+        hedge = max(1, hedge)
+        cancel_reason = "Cancelled: another provider answered first"
+        # Position in the fallback order; a sibling model keeps its provider's rank
+        rank = {provider.name: i for i, provider in reversed(list(enumerate(providers)))}
+        
+        def launch() -> bool:
+            nonlocal fallback_count
+            timeout = budget.attempt_timeout(queue[0].timeout, len(queue))
+            if timeout is None:
+                queue.clear()  # Not enough budget left for another attempt
+                return False
+            provider = queue.pop(0)
+            fallback_count += 1
+            print(f"🔄 Trying provider {fallback_count}: {provider.name}...", file=sys.stderr)
+            task = asyncio.ensure_future(self._try_provider(
+                provider, system_msg, user_prompt, max_tokens, temperature, timeout
+            ))
+            in_flight[task] = (provider, time.time())
+            return True
+        
+        winner = None
+        try:
+            while queue and len(in_flight) < hedge:
+                launch()
+            
+            while in_flight and winner is None:
+                wait_timeout = hedge_delay if queue else None
+                if budget.bounded:
+                    wait_timeout = min(wait_timeout or budget.remaining(), budget.remaining())
+                done, _ = await asyncio.wait(
+                    in_flight,
+                    timeout=wait_timeout,
+                    return_when=asyncio.FIRST_COMPLETED
+                )
+                
+                if not done:
+                    if not queue or budget.remaining() <= 0:
+                        # Only the deadline ends a wait with nothing left to hedge with
+                        cancel_reason = "Cancelled: deadline reached"
+                        break
+                    # No answer within the hedge delay: start a backup request
+                    if launch():
+                        print(f"⏱️  No response after {hedge_delay}s, hedged...", file=sys.stderr)
+                    continue
+                
+                # Attempts finishing together: the highest-priority success wins
+                for task in sorted(done, key=lambda t: rank.get(in_flight[t][0].name, len(rank))):
+                    provider, _ = in_flight.pop(task)
+                    success, result, duration, phases = task.result()
+                    attempts.append({
+                        'provider': provider.name,
+                        'model': provider.model,
+                        'success': success,
+                        'duration_ms': duration,
+                        'error': None if success else str(result),
+                        'error_class': None if success else result.error_class,
+                        'phases': phases
+                    })
+                    if success and winner is None:
+                        winner = (provider, result, duration)
+                    elif not success:
+                        print(f"❌ {provider.name} failed [{result.error_class}]: "
+                              f"{str(result)[:100]}", file=sys.stderr)
+                        self._bench(provider, result)
+                        # Model-specific error: the same key's next model goes first
+                        sibling = self._sibling(provider) if result.policy.switch_model else None
+                        if sibling is not None:
+                            queue.insert(0, sibling)
+                            print(f"🔁 Retrying {provider.name} with sibling model {sibling.model}",
+                                  file=sys.stderr)
+                
+                while winner is None and queue and len(in_flight) < hedge:
+                    launch()
+        finally:
+            # Cancel the losers (or everything, if we were cancelled ourselves)
+            for task, (provider, started) in in_flight.items():
+                task.cancel()
+                attempts.append({
+                    'provider': provider.name,
+                    'model': provider.model,
+                    'success': False,
+                    'duration_ms': (time.time() - started) * 1000,
+                    'error': cancel_reason,
+                    'error_class': 'cancelled',
+                    'phases': {}
+                })
+            if in_flight:
+                await asyncio.gather(*in_flight, return_exceptions=True)
+        
+        if winner is None:
+            return None, None, 0.0, attempts, fallback_count
+        provider, result, duration = winner
+        return provider, result, duration, attempts, fallback_count
+    
+    def _bench(self, provider: APIProvider, error: ProviderError):
+        """
+        Keep a provider out of later requests: for BENCH_SECONDS after an auth or
+        quota error, or until its Retry-After passes after a rate limit or overload.
+        Model-specific errors (and gone models) bench only that model
+        """
+        if error.policy.permanent or error.model_unavailable:
+            seconds = BENCH_SECONDS
+        elif error.retry_after:
+            seconds = error.retry_after
+        else:
+            return
+        key = f"{provider.name}/{provider.model}" if error.policy.switch_model else provider.name
+        self._benched[key] = time.monotonic() + seconds
+        print(f"⏸️  Benching {key} for {seconds:.0f}s ({error.error_class})", file=sys.stderr)
+    
+    def _model_ready(self, provider: APIProvider, model: str, now: float) -> bool:
+        return self._benched.get(f"{provider.name}/{model}", 0.0) <= now
+    
+    def _unbenched(self, provider: APIProvider) -> Optional[APIProvider]:
+        """The provider on its first model not benched, or None if it is benched"""
+        now = time.monotonic()
+        if self._benched.get(provider.name, 0.0) > now:
+            return None
+        if self._model_ready(provider, provider.model, now):
+            return provider
+        model = next((m for m in provider.models if self._model_ready(provider, m, now)), None)
+        return provider.with_model(model) if model else None
+    
+    def _sibling(self, provider: APIProvider) -> Optional[APIProvider]:
+        """The provider on the next model after its current one that is not benched"""
+        now = time.monotonic()
+        later = provider.models[provider.models.index(provider.model) + 1:]
+        model = next((m for m in later if self._model_ready(provider, m, now)), None)
+        return provider.with_model(model) if model else None
     
     def _log_metrics(self, task_type: str, provider: str, success: bool,
                     duration_ms: float, fallback_count: int, attempts: List):
         """Log execution metrics"""
+        self.metrics_dir.mkdir(parents=True, exist_ok=True)
         metrics_file = self.metrics_dir / f"ai_metrics_{datetime.now().strftime('%Y%m')}.jsonl"
         
         metric = {
@@ -393,30 +754,97 @@ class UniversalAIOrchestrator:
             f.write(json.dumps(metric) + '\n')
 
 
+def startup_profile(args) -> Dict:
+    """
+    Time the work every CLI invocation pays before its first provider request.
+    The cache is opened in a throwaway directory so profiling leaves the repo untouched
+    """
+    startup_cpu_ms = time.process_time() * 1000  # Interpreter start plus imports
+    import tempfile
+    with tempfile.TemporaryDirectory(prefix="ai-startup-profile-") as cache_dir:
+        start = time.perf_counter()
+        orchestrator = UniversalAIOrchestrator(cache_dir=cache_dir,
+                                               similarity_threshold=args.similarity_threshold,
+                                               trace_file=args.trace_file)
+        init_ms = (time.perf_counter() - start) * 1000
+        
+        # Deferred work, paid by the first request instead of at startup
+        start = time.perf_counter()
+        _require_aiohttp()
+        aiohttp_import_ms = (time.perf_counter() - start) * 1000
+        start = time.perf_counter()
+        orchestrator.cache
+        cache_open_ms = (time.perf_counter() - start) * 1000
+        orchestrator.cache.close()
+    
+    return {
+        'startup_cpu_ms': startup_cpu_ms,
+        'module_import_ms': _IMPORT_MS,
+        'init_ms': init_ms,
+        'providers_configured': len(orchestrator.providers),
+        'providers_declared': len(ORCHESTRATOR_CHAIN),
+        'deferred': {
+            'aiohttp_import_ms': aiohttp_import_ms,
+            'cache_open_ms': cache_open_ms
+        }
+    }
+
+
 def main():
     import argparse
     
     parser = argparse.ArgumentParser(description='Universal AI Orchestrator')
-    parser.add_argument('--task-type', required=True, help='Type of AI task')
-    parser.add_argument('--system-message', required=True, help='System message')
-    parser.add_argument('--user-prompt', required=True, help='User prompt')
+    parser.add_argument('--task-type', help='Type of AI task')
+    parser.add_argument('--system-message', help='System message')
+    parser.add_argument('--user-prompt', help='User prompt')
     parser.add_argument('--max-tokens', type=int, default=2000, help='Max tokens')
     parser.add_argument('--temperature', type=float, default=0.7, help='Temperature')
     parser.add_argument('--no-cache', action='store_true', help='Disable cache')
-    parser.add_argument('--output', required=True, help='Output JSON file')
+    parser.add_argument('--similarity-threshold', type=float, default=None,
+                        help='Enable near-duplicate cache hits at this similarity (0-1)')
+    parser.add_argument('--trace-file', default=None,
+                        help='Append per-attempt phase spans to this Chrome trace file')
+    parser.add_argument('--hedge', type=int, default=1,
+                        help='Number of providers to race in parallel')
+    parser.add_argument('--hedge-delay', type=float, default=None,
+                        help='Seconds before starting the next provider without waiting for failure')
+    parser.add_argument('--deadline', type=float, default=None,
+                        help='Seconds the whole call may take (default: $AI_DEADLINE)')
+    parser.add_argument('--output', help='Output JSON file')
+    parser.add_argument('--startup-profile', action='store_true',
+                        help='Report import and init time as JSON and exit without calling providers')
     
     args = parser.parse_args()
     
-    orchestrator = UniversalAIOrchestrator()
+    if args.startup_profile:
+        print(json.dumps(startup_profile(args), indent=2))
+        return
+    
+    missing = [flag for flag, value in (('--task-type', args.task_type),
+                                        ('--system-message', args.system_message),
+                                        ('--user-prompt', args.user_prompt),
+                                        ('--output', args.output)) if value is None]
+    if missing:
+        parser.error(f"the following arguments are required: {', '.join(missing)}")
+    
+    async def run() -> Dict:
+        async with UniversalAIOrchestrator(
+            similarity_threshold=args.similarity_threshold,
+            trace_file=args.trace_file
+        ) as orchestrator:
+            return await orchestrator.execute(
+                task_type=args.task_type,
+                system_msg=args.system_message,
+                user_prompt=args.user_prompt,
+                max_tokens=args.max_tokens,
+                temperature=args.temperature,
+                use_cache=not args.no_cache,
+                hedge=args.hedge,
+                hedge_delay=args.hedge_delay,
+                deadline=args.deadline
+            )
     
-    result = asyncio.run(orchestrator.execute(
-        task_type=args.task_type,
-        system_msg=args.system_message,
-        user_prompt=args.user_prompt,
-        max_tokens=args.max_tokens,
-        temperature=args.temperature,
-        use_cache=not args.no_cache
-    ))
+    result = asyncio.run(run())
     
     # Write output
     Path(args.output).write_text(json.dumps(result, indent=2))
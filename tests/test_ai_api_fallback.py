@@ -0,0 +1,197 @@
+import os
+import sys
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '.github', 'scripts'))
+import ai_api_fallback
+import deadline
+from ai_api_fallback import AIAPIFallback, TokenBucketLimiter
+from provider_errors import ProviderError
+from provider_registry import PROVIDERS
+
+
+@pytest.fixture
+def make_fallback(monkeypatch):
+    """AIAPIFallback with only the named providers configured and no state on disk"""
+    for provider in PROVIDERS:
+        monkeypatch.delenv(provider['key_env'], raising=False)
+    for name in ('AI_RATE_LIMIT_DB', 'AI_RATE_LIMIT_BURST', 'AI_COALESCE_DIR', 'AI_DEADLINE',
+                 'AI_TRACE_FILE'):
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setenv('AI_BREAKER_DB', 'off')
+    created = []
+
+    def make(*names, **kwargs):
+        for provider in PROVIDERS:
+            if provider['name'] in names:
+                monkeypatch.setenv(provider['key_env'], 'test')
+        fallback = AIAPIFallback(**kwargs)
+        created.append(fallback)
+        return fallback
+
+    yield make
+    for fallback in created:
+        fallback.close()
+
+
+@pytest.fixture
+def no_sleep(monkeypatch):
+    """Record backoff sleeps instead of waiting"""
+    sleeps = []
+    real_sleep = asyncio.sleep
+
+    async def fake_sleep(seconds, *args, **kwargs):
+        sleeps.append(seconds)
+        await real_sleep(0)
+
+    monkeypatch.setattr(ai_api_fallback.asyncio, 'sleep', fake_sleep)
+    return sleeps
+
+
+def test_bucket_capacity_holds_an_hour_of_allowance():
+    limiter = TokenBucketLimiter()
+    rate, capacity = limiter._bucket_params(2000)
+    assert rate == pytest.approx(2000 / 86400)
+    assert capacity == pytest.approx(2000 / 24)
+    assert limiter._bucket_params(14400)[1] == pytest.approx(600)
+    # Tiny quotas still admit one request; the burst never exceeds the whole quota
+    assert limiter._bucket_params(10)[1] == 1.0
+    assert TokenBucketLimiter(burst_seconds=10 * 86400)._bucket_params(2000)[1] == 2000
+
+
+def test_bucket_refills_at_the_daily_rate(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(ai_api_fallback.time, 'time', lambda: clock[0])
+    limiter = TokenBucketLimiter(burst_seconds=3600)
+
+    admitted = sum(limiter.try_acquire('GPT-OSS', 2000) for _ in range(100))
+    assert admitted == 83
+    assert not limiter.try_acquire('GPT-OSS', 2000)
+
+    clock[0] += 86400 / 2000  # One request's worth of allowance
+    assert limiter.try_acquire('GPT-OSS', 2000)
+    assert not limiter.try_acquire('GPT-OSS', 2000)
+
+
+def test_burst_setting_from_env(make_fallback, monkeypatch):
+    monkeypatch.setenv('AI_RATE_LIMIT_BURST', '60')
+    assert make_fallback('GROQ-1').rate_limiter.burst_seconds == 60.0
+    assert make_fallback('GROQ-1', rate_limit_burst=120).rate_limiter.burst_seconds == 120.0
+
+
+def test_batch_fits_within_the_bucket(make_fallback):
+    fallback = make_fallback('GROQ-1')
+
+    async def fake_call(api, prompt, *args, **kwargs):
+        return f"ok {prompt}"
+
+    fallback._call_api = fake_call
+    results = fallback.call_batch([f"chunk {i}" for i in range(21)], max_retries=1)
+    assert all(result['success'] for result in results)
+    assert fallback.usage_stats['GROQ-1']['throttled'] == 0
+
+
+def test_retries_charge_one_token_per_provider_visit(make_fallback, no_sleep):
+    fallback = make_fallback('GROQ-1')
+    acquired = []
+    real_acquire = fallback.rate_limiter.try_acquire
+
+    def counting_acquire(api_name, rate_limit, tokens=1.0):
+        acquired.append(api_name)
+        return real_acquire(api_name, rate_limit, tokens)
+
+    fallback.rate_limiter.try_acquire = counting_acquire
+    calls = []
+
+    async def flaky_call(api, prompt, system_prompt, max_tokens, temperature, model,
+                         timeout=None):
+        calls.append(model)
+        if len(calls) < 3:
+            raise ProviderError('network', 'connection reset')
+        return "ok"
+
+    fallback._call_api = flaky_call
+    result = fallback.call_with_fallback("hello", max_retries=3)
+    assert result['success'] and result['retries'] == 2
+    assert acquired == ['GROQ-1']
+
+
+def test_deadline_is_shared_by_providers_not_used_up_by_sibling_models(make_fallback,
+                                                                       monkeypatch):
+    clock = [0.0]
+    monkeypatch.setattr(deadline, 'time', SimpleNamespace(monotonic=lambda: clock[0]))
+    fallback = make_fallback('GROQ-1', 'GROQ-2', 'GROQ-3')
+    attempts = []
+
+    async def hanging_call(api, prompt, system_prompt, max_tokens, temperature, model,
+                           timeout=None):
+        attempts.append((api['name'], model, timeout))
+        clock[0] += timeout  # The attempt uses its whole timeout
+        if api['name'] == 'GROQ-3':
+            return "ok"
+        raise ProviderError('timeout', 'Request timeout')
+
+    fallback._call_api = hanging_call
+    result = fallback.call_with_fallback("hello", deadline=8)
+
+    assert result['success'] and result['api_used'] == 'GROQ-3'
+    assert [name for name, _, _ in attempts] == ['GROQ-1', 'GROQ-2', 'GROQ-3']
+    assert clock[0] <= 8 - 0.5
+
+
+def scripted_calls(fallback, outcomes):
+    """Make _call_api raise or return the given outcomes in order; returns the models called"""
+    models = []
+
+    async def call(api, prompt, system_prompt, max_tokens, temperature, model, timeout=None):
+        models.append(model)
+        outcome = outcomes[len(models) - 1]
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    fallback._call_api = call
+    return models
+
+
+def test_rate_limit_waits_for_retry_after_on_the_same_model(make_fallback, no_sleep):
+    fallback = make_fallback('GROQ-1')
+    models = scripted_calls(fallback, [
+        ProviderError.from_response(429, {'Retry-After': '1'}, 'Rate limit reached'), "ok"
+    ])
+    result = fallback.call_with_fallback("hello")
+    assert result['success'] and result['retries'] == 1
+    assert models == ['llama-3.3-70b-versatile'] * 2
+    assert no_sleep == [1.0]
+
+
+def test_overload_backs_off_on_the_same_model(make_fallback, no_sleep):
+    fallback = make_fallback('GROQ-1')
+    models = scripted_calls(fallback, [
+        ProviderError.from_response(503, {}, 'Service unavailable'), "ok"
+    ])
+    result = fallback.call_with_fallback("hello")
+    assert result['success'] and result['model'] == 'llama-3.3-70b-versatile'
+    assert len(models) == 2 and len(no_sleep) == 1
+
+
+def test_decommissioned_model_switches_to_a_sibling(make_fallback, no_sleep):
+    fallback = make_fallback('GROQ-1')
+    models = scripted_calls(fallback, [
+        ProviderError.from_response(400, {}, 'The model has been decommissioned'), "ok"
+    ])
+    result = fallback.call_with_fallback("hello", max_retries=1)
+    assert result['success'] and result['model'] == 'llama-3.1-70b-versatile'
+    assert models == ['llama-3.3-70b-versatile', 'llama-3.1-70b-versatile']
+    assert no_sleep == []
+
+
+def test_timeout_switches_to_a_sibling(make_fallback, no_sleep):
+    fallback = make_fallback('GROQ-1')
+    models = scripted_calls(fallback, [ProviderError('timeout', 'Request timeout'), "ok"])
+    result = fallback.call_with_fallback("hello")
+    assert result['success'] and result['model'] == 'llama-3.1-70b-versatile'
+    assert no_sleep == []
@@ -0,0 +1,84 @@
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '.github', 'scripts'))
+import deadline
+from deadline import MIN_ATTEMPT_SECONDS, RESERVE_SECONDS, DeadlineBudget, default_deadline
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(deadline, 'time', SimpleNamespace(monotonic=lambda: now[0]))
+    return now
+
+
+def test_unbounded_budget():
+    budget = DeadlineBudget()
+    assert not budget.bounded
+    assert budget.remaining() == float('inf')
+    assert budget.attempt_timeout(30, 5) == 30
+    assert budget.fits_sleep(1e6)
+    assert budget.split(3) is budget
+
+
+def test_remaining_and_usable(clock):
+    budget = DeadlineBudget(10)
+    clock[0] += 4
+    assert budget.elapsed() == 4
+    assert budget.remaining() == 6
+    assert budget.usable() == 6 - RESERVE_SECONDS
+    clock[0] += 20
+    assert budget.remaining() == 0 and budget.usable() == 0
+
+
+def test_attempt_timeout_shares_what_is_left(clock):
+    budget = DeadlineBudget(30.5)  # 30s usable
+    assert budget.attempt_timeout(45, 1) == 30
+    assert budget.attempt_timeout(45, 2) == 15
+    assert budget.attempt_timeout(45, 3) == 10
+    assert budget.attempt_timeout(45, 10) == 10  # Never less than 1/SPREAD
+    assert budget.attempt_timeout(5, 1) == 5  # Never more than the provider's own timeout
+
+    clock[0] += 27  # 3s usable: shares are raised to the minimum attempt
+    assert budget.attempt_timeout(45, 3) == MIN_ATTEMPT_SECONDS
+    clock[0] += 1.5  # 1.5s usable: no room for an attempt
+    assert budget.attempt_timeout(45, 1) is None
+
+
+def test_fits_sleep(clock):
+    budget = DeadlineBudget(10.5)  # 10s usable
+    assert budget.fits_sleep(8)
+    assert not budget.fits_sleep(8.5)
+
+
+def test_split_gives_each_stage_a_share(clock):
+    budget = DeadlineBudget(8)  # 7.5s usable
+    first = budget.split(3)
+    assert first.usable() == pytest.approx(2.5)
+    assert first.expires <= budget.expires
+    assert budget.split(1).usable() == pytest.approx(7.5)
+    assert budget.split(10).usable() == pytest.approx(2.5)
+
+    clock[0] += 4.5  # 3s usable: a stage still gets room for one attempt
+    assert budget.split(3).usable() == pytest.approx(MIN_ATTEMPT_SECONDS)
+    clock[0] += 2  # 1s usable: the split cannot fit an attempt either
+    assert budget.split(3).attempt_timeout(30) is None
+
+
+def test_describe(clock):
+    budget = DeadlineBudget(30)
+    clock[0] += 12.34
+    assert budget.describe() == "12.3s of a 30s deadline used"
+
+
+def test_default_deadline(monkeypatch):
+    monkeypatch.delenv('AI_DEADLINE', raising=False)
+    assert default_deadline() is None
+    monkeypatch.setenv('AI_DEADLINE', '45')
+    assert default_deadline() == 45.0
+    monkeypatch.setenv('AI_DEADLINE', 'soon')
+    assert default_deadline() is None
@@ -0,0 +1,157 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '.github', 'scripts'))
+from diff_parser import (MAX_HUNK_LINES, MAX_LINE_BYTES, FileDiff, Hunk, NoiseFilter,
+                         iter_diff, iter_lines, pack_diff, split_file_diffs)
+
+
+def file_diff(path, hunks, base='1111111', head='2222222'):
+    """Diff text of one modified file; hunks are lists of body lines"""
+    lines = [f"diff --git a/{path} b/{path}", f"index {base}..{head} 100644",
+             f"--- a/{path}", f"+++ b/{path}"]
+    for number, body in enumerate(hunks):
+        lines.append(f"@@ -{number * 10 + 1},3 +{number * 10 + 1},4 @@")
+        lines.extend(body)
+    return lines
+
+
+def test_index_line_and_paths():
+    files = split_file_diffs('\n'.join(file_diff('src/app.py', [[' a', '+b']],
+                                                 base='abc1234', head='def5678')))
+    assert len(files) == 1
+    app = files[0]
+    assert (app.path, app.old_path) == ('src/app.py', 'src/app.py')
+    assert (app.base_sha, app.head_sha) == ('abc1234', 'def5678')
+    assert app.key == ('src/app.py', 'abc1234', 'def5678')
+    assert (app.added, app.removed) == (1, 0)
+
+
+def test_rename_new_file_and_binary_headers():
+    diff = [
+        "diff --git a/old.py b/new.py", "similarity index 90%",
+        "rename from old.py", "rename to new.py", "index 1234567..89abcde 100644",
+        "--- a/old.py", "+++ b/new.py", "@@ -1 +1 @@", "-x", "+y",
+        "diff --git a/added.py b/added.py", "new file mode 100644",
+        "index 0000000..fedcba9", "--- /dev/null", "+++ b/added.py", "@@ -0,0 +1 @@", "+z",
+        "diff --git a/logo.png b/logo.png", "index 1111111..2222222 100644",
+        "Binary files a/logo.png and b/logo.png differ",
+    ]
+    renamed, added, binary = [item for item in iter_diff(diff) if isinstance(item, FileDiff)]
+    assert (renamed.old_path, renamed.path) == ('old.py', 'new.py')
+    assert (added.path, added.base_sha, added.head_sha) == ('added.py', '0000000', 'fedcba9')
+    assert binary.skipped == 'binary' and binary.path == 'logo.png'
+
+
+def test_key_gets_a_digest_without_index_line_or_when_partial():
+    no_index = FileDiff(0, ["diff --git a/x.py b/x.py", "--- a/x.py", "+++ b/x.py"])
+    path, base, head = no_index.key
+    assert path == 'x.py' and base == '' and len(head) == 41
+
+    packed = pack_diff(file_diff('big.py', [['+abc'] * 50, ['+xyz'] * 50]), budget_tokens=150)
+    partial = packed.files[0]
+    assert partial.omitted_hunks == 1 and not partial.complete
+    assert partial.key[2].startswith('2222222:')
+    # Another part of the same blob pair kept for review is another unit
+    other = pack_diff(file_diff('big.py', [['+abc'] * 50, ['+sql'] * 50]), budget_tokens=150)
+    assert other.files[0].hunks[0].index == 1
+    assert other.files[0].key != partial.key
+
+
+def test_iter_lines_across_chunks_crlf_and_overlong_lines():
+    chunks = [b'first li', b'ne\r\nsecond\n', b'x' * (MAX_LINE_BYTES + 10), b'tail\nlast']
+    assert list(iter_lines(chunks)) == ['first line', 'second', 'x' * MAX_LINE_BYTES, 'last']
+    assert list(iter_lines([b'caf\xc3', b'\xa9\n'])) == ['café']
+
+
+def test_noise_filter_rules():
+    noise = NoiseFilter(ignore=['docs/*.svg'], keep=['vendor/ours/*'])
+    assert noise.classify('package-lock.json') == 'lockfile'
+    assert noise.classify('web/yarn.lock') == 'lockfile'
+    assert noise.classify('static/app.min.js') == 'generated'
+    assert noise.classify('dist/bundle.js') == 'generated'
+    assert noise.classify('vendor/lib/x.go') == 'vendored'
+    assert noise.classify('docs/diagram.svg') == 'ignored'
+    # "/dist/*" and "/build/*" only match at the repository root
+    assert noise.classify('src/build/config.py') is None
+    assert noise.classify('vendor/ours/patch.go') is None
+    assert noise.classify('src/app.py') is None
+    assert NoiseFilter(skip_lockfiles=False).classify('yarn.lock') is None
+
+
+def test_noise_filter_from_env(monkeypatch):
+    monkeypatch.setenv('PR_DIFF_IGNORE', ' fixtures/* , /scripts/*')
+    monkeypatch.setenv('PR_DIFF_KEEP', 'go.sum')
+    noise = NoiseFilter.from_env()
+    assert noise.classify('tests/fixtures/data.json') == 'ignored'
+    assert noise.classify('scripts/run.sh') == 'ignored'
+    assert noise.classify('tools/scripts/run.sh') is None
+    assert noise.classify('go.sum') is None
+
+
+def test_noise_files_are_counted_not_kept():
+    diff = (file_diff('yarn.lock', [['+dep'] * 5])
+            + file_diff('gen.py', [['+# @generated by protoc', '+x = 1']])
+            + file_diff('app.py', [['+ok']]))
+    packed = pack_diff(diff, noise=NoiseFilter())
+    lock, generated, app = packed.files
+    assert (lock.skipped, lock.added, lock.hunks) == ('lockfile', 5, [])
+    assert (generated.skipped, generated.hunks) == ('generated', [])
+    assert [f.path for f in packed.reviewable] == ['app.py']
+    assert 'yarn.lock (lockfile)' in packed.summary()
+    assert 'gen.py (generated)' in packed.summary()
+
+
+def test_long_hunks_and_lines_are_capped():
+    body = ['+line'] * (MAX_HUNK_LINES + 25) + ['+' + 'y' * 5000]
+    packed = pack_diff(file_diff('long.py', [body]))
+    hunk = packed.files[0].hunks[0]
+    assert hunk.added == MAX_HUNK_LINES + 26
+    assert hunk.cut_lines == 26
+    assert hunk.lines[-1] == "… 26 more lines of this hunk not shown"
+    assert not packed.files[0].complete
+
+    short = Hunk(0, 0, '@@ -1 +1 @@')
+    short.add('+' + 'z' * 5000)
+    assert short.lines[1].endswith(' …') and len(short.lines[1]) < 2100
+
+
+def test_pack_keeps_everything_without_a_budget():
+    packed = pack_diff(file_diff('a.py', [['+1'], ['+2'], ['+3']]))
+    assert [h.index for h in packed.files[0].hunks] == [0, 1, 2]
+    assert packed.stats()['hunks_omitted'] == 0
+    assert packed.summary() == ''
+
+
+def test_pack_evicts_lower_value_hunks_for_better_ones():
+    docs = file_diff('README.md', [['+words'] * 40])
+    code = file_diff('auth.py', [['+password = check(token)'] * 40])
+    budget = pack_diff(code).tokens + 5
+    packed = pack_diff(docs + code, budget_tokens=budget)
+    readme, auth = packed.files
+    assert readme.hunks == [] and readme.omitted_hunks == 1 and readme.omitted_added == 40
+    assert len(auth.hunks) == 1
+    assert packed.tokens <= budget
+    assert 'README.md' in packed.summary()
+
+
+def test_pack_drops_a_hunk_when_eviction_cannot_make_room():
+    small = file_diff('a.md', [['+x'] * 5])
+    huge = file_diff('b.py', [['+risky_sql = 1'] * 300])
+    budget = pack_diff(small).tokens + 10
+    packed = pack_diff(small + huge, budget_tokens=budget)
+    kept, dropped = packed.files
+    # Evicting the cheap hunk would not fit the large one, so the cheap one stays
+    assert len(kept.hunks) == 1
+    assert dropped.hunks == [] and dropped.omitted_hunks == 1
+    assert packed.stats() == {'files': 2, 'skipped_files': 0, 'hunks_kept': 1,
+                              'hunks_omitted': 1, 'tokens': packed.tokens}
+
+
+def test_kept_hunks_stay_in_file_order():
+    # Same size hunks; the risky first one scores highest and sits last in the heap
+    body = [['+sql = 1'] * 30, ['+abc = 2'] * 30, ['+xyz = 3'] * 30]
+    one = pack_diff(file_diff('m.py', body[:1])).tokens
+    packed = pack_diff(file_diff('m.py', body), budget_tokens=one * 2)
+    assert [h.index for h in packed.files[0].hunks] == [0, 1]
+    assert packed.files[0].omitted_hunks == 1
@@ -0,0 +1,156 @@
+import os
+import sys
+import json
+import threading
+import importlib
+from urllib.parse import urlparse, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '.github', 'scripts'))
+import run_issue_responder
+
+CRASH = ("The service crashes on startup when the config file is missing. Steps: remove "
+         "config.yaml, run the server, it exits with a KeyError in load_settings instead "
+         "of falling back to the defaults. Expected the defaults to be used and a warning "
+         "to be logged about the missing file.")
+
+
+def issue(number, title, body, labels=(), pull_request=False):
+    data = {'number': number, 'title': title, 'body': body,
+            'labels': [{'name': name} for name in labels]}
+    if pull_request:
+        data['pull_request'] = {'url': f"https://example.invalid/pulls/{number}"}
+    return data
+
+
+PAGES = [
+    [issue(1, "Crash on startup without config", CRASH),
+     issue(2, "Fix startup crash", CRASH, pull_request=True),
+     issue(3, "Crash on startup without config file", CRASH + " Same on 2.1."),
+     issue(4, "Crash on startup without config", CRASH, labels=['bug', 'ai-responded'])],
+    [issue(5, "Add a dark mode", "Please add a dark theme to the dashboard, the white "
+                                 "background is hard on the eyes at night."),
+     issue(6, "Startup crash without config", CRASH + " Seen on Windows too.")],
+]
+
+
+class GitHubStub(BaseHTTPRequestHandler):
+    """Just enough of the issues API for batch triage"""
+
+    listed = []
+    comments = {}
+    labels = {}
+
+    def log_message(self, *args):
+        pass
+
+    def reply(self, status, payload, headers=()):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path != '/repos/owner/repo/issues':
+            return self.reply(404, {'message': 'Not Found'})
+        query = parse_qs(url.query)
+        GitHubStub.listed.append(query)
+        page = int(query.get('page', ['1'])[0])
+        headers = []
+        if page < len(PAGES):
+            base = f"http://{self.headers['Host']}{url.path}"
+            headers.append(('Link', f'<{base}?state=open&per_page=100&page={page + 1}>; '
+                                    f'rel="next", <{base}?page={len(PAGES)}>; rel="last"'))
+        self.reply(200, PAGES[page - 1], headers)
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        parts = urlparse(self.path).path.strip('/').split('/')
+        number, kind = int(parts[4]), parts[5]
+        if kind == 'comments':
+            GitHubStub.comments[number] = payload['body']
+            return self.reply(201, {'id': number})
+        GitHubStub.labels.setdefault(number, []).extend(payload['labels'])
+        self.reply(200, [{'name': name} for name in payload['labels']])
+
+
+class FakeFallback:
+    prompts = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def call_batch(self, prompts, max_tokens=None):
+        FakeFallback.prompts.extend(prompts)
+        return [{'success': True, 'api_used': 'FAKE', 'response': f"Triage answer {i}"}
+                for i, _ in enumerate(prompts)]
+
+
+@pytest.fixture
+def github_stub():
+    GitHubStub.listed, GitHubStub.comments, GitHubStub.labels = [], {}, {}
+    server = ThreadingHTTPServer(('127.0.0.1', 0), GitHubStub)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def test_batch_triage_against_a_local_github(github_stub, tmp_path, monkeypatch):
+    report_path = tmp_path / 'triage.json'
+    monkeypatch.setenv('GITHUB_API_URL', github_stub)
+    monkeypatch.setenv('ISSUE_BATCH', '1')
+    monkeypatch.setenv('GITHUB_REPOSITORY', 'owner/repo')
+    monkeypatch.setenv('GITHUB_TOKEN', 'token')
+    monkeypatch.setenv('ISSUE_TRIAGE_REPORT', str(report_path))
+    monkeypatch.delenv('ISSUE_DRY_RUN', raising=False)
+    responder = importlib.reload(run_issue_responder)  # API_URL is read at import
+    monkeypatch.setattr(responder, 'AIAPIFallback', FakeFallback)
+    FakeFallback.prompts = []
+
+    try:
+        responder.main()
+    finally:
+        monkeypatch.undo()
+        importlib.reload(run_issue_responder)
+
+    # Both pages were read, the second through the Link header
+    assert len(GitHubStub.listed) == 2
+    assert GitHubStub.listed[0]['state'] == ['open']
+    assert GitHubStub.listed[1]['page'] == ['2']
+
+    # The pull request and the already answered issue are left alone
+    assert sorted(GitHubStub.comments) == [1, 3, 5, 6]
+    assert GitHubStub.labels == {n: ['ai-responded'] for n in (1, 3, 5, 6)}
+
+    # One AI call per cluster: the three crash reports share one
+    assert len(FakeFallback.prompts) == 2
+    crash_prompt = next(p for p in FakeFallback.prompts if 'config' in p)
+    assert '#3' in crash_prompt and '#6' in crash_prompt
+    assert GitHubStub.comments[3].startswith("This looks related to #1, #6")
+    assert GitHubStub.comments[5] in ("Triage answer 0", "Triage answer 1")
+
+    summary = json.loads(report_path.read_text())
+    assert (summary['issues'], summary['clusters'], summary['ai_calls']) == (4, 2, 2)
+    assert summary['comments_posted'] == 4 and summary['issues_labelled'] == 4
+
+
+def test_dry_run_posts_nothing(github_stub, monkeypatch):
+    monkeypatch.setattr(run_issue_responder, 'API_URL', github_stub)
+    monkeypatch.setattr(run_issue_responder, 'AIAPIFallback', FakeFallback)
+    FakeFallback.prompts = []
+
+    summary = run_issue_responder.triage_backlog('owner/repo', 'token', dry_run=True)
+    assert summary['ai_calls'] == 2 and summary['comments_posted'] == 0
+    assert GitHubStub.comments == {} and GitHubStub.labels == {}
@@ -0,0 +1,66 @@
+import os
+import sys
+import json
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '.github', 'scripts'))
+from metrics_rollup import MetricsRollup, classify_error
+
+
+def write_records(metrics_dir, records):
+    with open(metrics_dir / 'ai_metrics_202610.jsonl', 'a') as f:
+        for record in records:
+            f.write(json.dumps(record) + '\n')
+
+
+def hedged_record(winner_ms, loser_ms, error=None):
+    loser = {'provider': 'slow', 'success': False, 'duration_ms': loser_ms,
+             'error': 'Cancelled: another provider answered first'}
+    if error is None:
+        loser['error_class'] = 'cancelled'
+    return {
+        'timestamp': '2026-10-17T10:15:00', 'task_type': 'review', 'success': True,
+        'duration_ms': winner_ms, 'fallback_count': 2,
+        'attempts': [{'provider': 'fast', 'success': True, 'duration_ms': winner_ms},
+                     loser]
+    }
+
+
+def test_cancelled_attempts_are_not_provider_failures(tmp_path):
+    # The second record predates error_class; its class comes from the error text
+    write_records(tmp_path, [hedged_record(100, 100), hedged_record(200, 200, error=True),
+                             {'timestamp': '2026-10-17T10:30:00', 'task_type': 'review',
+                              'success': True, 'duration_ms': 900, 'fallback_count': 1,
+                              'attempts': [{'provider': 'slow', 'success': True,
+                                            'duration_ms': 900}]}])
+    rollup = MetricsRollup(str(tmp_path))
+    assert rollup.ingest() == 3
+    rows = {row['name']: row for row in rollup.query(dimension='provider')}
+    rollup.close()
+
+    slow = rows['slow']
+    assert slow['requests'] == 1
+    assert slow['success_rate'] == 1.0
+    assert slow['p50_ms'] == slow['p99_ms'] == 900
+    assert slow['errors'] == {'cancelled': 2}
+    assert rows['fast']['requests'] == 2 and rows['fast']['success_rate'] == 1.0
+
+
+def test_ingest_only_reads_new_lines(tmp_path):
+    write_records(tmp_path, [hedged_record(100, 100)])
+    rollup = MetricsRollup(str(tmp_path))
+    assert rollup.ingest() == 1
+    assert rollup.ingest() == 0
+    write_records(tmp_path, [hedged_record(300, 300)])
+    assert rollup.ingest() == 1
+    rows = {row['name']: row for row in rollup.query(dimension='task_type')}
+    rollup.close()
+    assert rows['review']['requests'] == 2
+
+
+def test_classify_error():
+    assert classify_error(None) == 'none'
+    assert classify_error('Cancelled: deadline reached') == 'cancelled'
+    assert classify_error('Request timeout') == 'timeout'
+    assert classify_error('HTTP 429: slow down') == 'rate_limit'
+    assert classify_error('HTTP 429: daily quota exhausted') == 'quota'
+    assert classify_error('HTTP 503: busy') == 'overload'
@@ -0,0 +1,105 @@
+import os
+import sys
+import time
+import asyncio
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '.github', 'scripts'))
+from pr_analysis_cache import PRAnalysisCache
+from diff_parser import split_file_diffs
+import run_pr_analyzer
+
+KEY = ('src/app.py', 'abc1234', 'def5678')
+
+
+def test_file_analyses_are_keyed_by_path_and_blobs(tmp_path):
+    with PRAnalysisCache(str(tmp_path / 'cache.db'), 'v1') as cache:
+        cache.put(KEY, 'looks fine')
+        assert cache.get(KEY) == 'looks fine'
+        assert cache.get(('src/app.py', 'abc1234', '0000000')) is None
+        assert cache.get(('src/other.py', 'abc1234', 'def5678')) is None
+
+    # Entries survive a reopen, but not a prompt change
+    with PRAnalysisCache(str(tmp_path / 'cache.db'), 'v1') as cache:
+        assert cache.get(KEY) == 'looks fine'
+    with PRAnalysisCache(str(tmp_path / 'cache.db'), 'v2') as cache:
+        assert cache.get(KEY) is None
+
+
+def test_review_key_covers_every_file_and_the_context(tmp_path):
+    with PRAnalysisCache(str(tmp_path / 'cache.db')) as cache:
+        other = ('README.md', '1111111', '2222222')
+        key = cache.review_key([KEY, other], 'Title: x')
+        assert key == cache.review_key([KEY, other], 'Title: x')
+        assert key != cache.review_key([KEY], 'Title: x')
+        assert key != cache.review_key([KEY, other], 'Title: y')
+        assert key != cache.review_key([KEY, ('README.md', '1111111', '3333333')], 'Title: x')
+        # Joined keys cannot collide by shifting text between fields
+        assert (cache.review_key([('a', 'b', 'c')], '')
+                != cache.review_key([('a', 'bc', '')], ''))
+        cache.put_review(key, 'overall review')
+        assert cache.get_review(key) == 'overall review'
+
+
+def test_expired_entries_are_removed_on_open(tmp_path):
+    path = str(tmp_path / 'cache.db')
+    with PRAnalysisCache(path, ttl_days=1) as cache:
+        cache.put(KEY, 'old')
+        cache.db.execute("UPDATE analyses SET created_at = ?", (time.time() - 2 * 86400,))
+    with PRAnalysisCache(path, ttl_days=1) as cache:
+        assert cache.get(KEY) is None
+
+
+class FakeFallback:
+    """Stands in for AIAPIFallback and records the prompts it is given"""
+
+    calls = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def input_budget(self, max_tokens):
+        return 10000
+
+    async def acall_batch(self, prompts, max_tokens=None):
+        FakeFallback.calls.extend(prompts)
+        return [{'success': True, 'response': f"analysis {i}"} for i, _ in enumerate(prompts)]
+
+    async def acall_map_reduce(self, text, instruction, max_tokens=None):
+        FakeFallback.calls.append(instruction)
+        return {'success': True, 'response': f"review of {text.count('## ')} files"}
+
+
+def diff_files(head):
+    return split_file_diffs('\n'.join([
+        "diff --git a/a.py b/a.py", f"index 1111111..{head} 100644",
+        "--- a/a.py", "+++ b/a.py", "@@ -1 +1 @@", "-x", "+y",
+        "diff --git a/b.py b/b.py", "index 3333333..4444444 100644",
+        "--- a/b.py", "+++ b/b.py", "@@ -1 +1 @@", "-p", "+q",
+    ]))
+
+
+def test_incremental_review_only_analyzes_changed_files(tmp_path, monkeypatch):
+    monkeypatch.setattr(run_pr_analyzer, 'AIAPIFallback', FakeFallback)
+    FakeFallback.calls = []
+    pr = {'title': 'Fix', 'body': 'Details', 'changed_files': 2}
+
+    with PRAnalysisCache(str(tmp_path / 'cache.db'), run_pr_analyzer.PROMPT_VERSION) as cache:
+        first = asyncio.run(run_pr_analyzer.analyze_pr_incremental(pr, diff_files('2222222'),
+                                                                   cache))
+        assert (first['files_analyzed'], first['files_reused']) == (2, 0)
+        assert len(FakeFallback.calls) == 3  # Two files, one combined review
+
+        again = asyncio.run(run_pr_analyzer.analyze_pr_incremental(pr, diff_files('2222222'),
+                                                                   cache))
+        assert again == {'success': True, 'response': first['response'],
+                         'files_reused': 2, 'files_analyzed': 0}
+        assert len(FakeFallback.calls) == 3
+
+        pushed = asyncio.run(run_pr_analyzer.analyze_pr_incremental(pr, diff_files('5555555'),
+                                                                    cache))
+        assert (pushed['files_analyzed'], pushed['files_reused']) == (1, 1)
+        assert len(FakeFallback.calls) == 5
+        assert 'a.py' in FakeFallback.calls[3]
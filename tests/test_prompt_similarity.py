@@ -0,0 +1,60 @@
+import os
+import sys
+import asyncio
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '.github', 'scripts'))
+from prompt_similarity import (normalize_prompt, literal_fingerprint, prompt_signature,
+                               signature_similarity)
+import universal_ai_orchestrator as orchestrator_module
+
+PROMPT = ("Review this configuration change for the upload service. The worker pool keeps "
+          "its defaults, retries stay enabled and logging is unchanged, but we now "
+          "set timeout = {} seconds for slow clients. Is that a safe value?")
+
+
+def test_numeric_literals_are_kept():
+    assert normalize_prompt(PROMPT.format(30)) != normalize_prompt(PROMPT.format(99))
+    assert literal_fingerprint(PROMPT.format(30)) != literal_fingerprint(PROMPT.format(99))
+
+
+def test_positions_and_shas_are_masked():
+    a = "@@ -10,4 +10,6 @@ in app.py:40 at line 12, commit 3f2a9c1d"
+    b = "@@ -80,2 +81,9 @@ in app.py:112 at line 97, commit 9e0b77a4"
+    assert normalize_prompt(a) == normalize_prompt(b)
+    assert literal_fingerprint(a) == literal_fingerprint(b)
+
+
+def test_hex_words_are_not_shas():
+    assert normalize_prompt("the page was defaced and acceded") == "the page was defaced and acceded"
+
+
+def test_prompts_differing_in_a_number_do_not_share_a_cache_hit(tmp_path, monkeypatch):
+    monkeypatch.setenv('GROQAI_API_KEY', 'test')
+    # Textually these are near-duplicates; only the value differs
+    assert signature_similarity(prompt_signature(PROMPT.format(30)),
+                                prompt_signature(PROMPT.format(99))) >= 0.7
+
+    orchestrator = orchestrator_module.UniversalAIOrchestrator(cache_dir=str(tmp_path),
+                                                               similarity_threshold=0.7)
+    orchestrator.metrics_dir = tmp_path / 'metrics'
+    calls = []
+
+    async def fake_provider(provider, system_msg, user_prompt, max_tokens, temperature,
+                            timeout=None):
+        calls.append(user_prompt)
+        return True, f"answer for: {user_prompt[-40:]}", 1.0, {}
+
+    orchestrator._try_provider = fake_provider
+    first = asyncio.run(orchestrator.execute('general', 'sys', PROMPT.format(30)))
+    second = asyncio.run(orchestrator.execute('general', 'sys', PROMPT.format(99)))
+
+    assert first['cached'] is False
+    assert second['cached'] is False
+    assert len(calls) == 2
+
+    # A near-duplicate with the same value is still served from the similarity tier
+    third = asyncio.run(orchestrator.execute('general', 'sys', PROMPT.format(99) + " Thanks!"))
+    assert third['cached'] == 'similar'
+    assert len(calls) == 2
@@ -0,0 +1,102 @@
+import os
+import sys
+import asyncio
+from email.utils import format_datetime
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '.github', 'scripts'))
+from provider_errors import (AUTH, BAD_REQUEST, BACKOFF_BASE, BACKOFF_CAP, MAX_RETRY_AFTER,
+                             NETWORK, OVERLOAD, QUOTA, RATE_LIMIT, SERVER, TIMEOUT, UNKNOWN,
+                             ProviderError, classify_status, decorrelated_jitter,
+                             parse_retry_after, retry_delay)
+
+
+@pytest.mark.parametrize('status, body, expected', [
+    (401, '', AUTH), (403, '', AUTH), (402, '', QUOTA),
+    (429, 'Rate limit reached, retry in 2s', RATE_LIMIT),
+    (429, 'You exceeded your current quota', QUOTA),
+    (429, 'Requests per day limit', QUOTA),
+    (408, '', TIMEOUT), (503, '', OVERLOAD), (529, '', OVERLOAD),
+    (500, '', SERVER), (502, '', SERVER),
+    (400, 'context length exceeded', BAD_REQUEST), (404, '', BAD_REQUEST),
+    (200, '', UNKNOWN),
+])
+def test_classify_status(status, body, expected):
+    assert classify_status(status, body) == expected
+
+
+def test_parse_retry_after_seconds():
+    assert parse_retry_after(None) is None
+    assert parse_retry_after('') is None
+    assert parse_retry_after('2') == 2.0
+    assert parse_retry_after('0.5') == 0.5
+    assert parse_retry_after('-3') == 0.0
+    assert parse_retry_after('soon') is None
+
+
+def test_parse_retry_after_http_date():
+    future = datetime.now(timezone.utc) + timedelta(seconds=30)
+    assert 25 <= parse_retry_after(format_datetime(future, usegmt=True)) <= 30
+    past = datetime.now(timezone.utc) - timedelta(minutes=5)
+    assert parse_retry_after(format_datetime(past, usegmt=True)) == 0.0
+
+
+def test_from_response_reads_retry_after_and_model_gone():
+    limited = ProviderError.from_response(429, {'Retry-After': '7'}, 'slow down')
+    assert (limited.error_class, limited.status, limited.retry_after) == (RATE_LIMIT, 429, 7.0)
+    assert not limited.policy.switch_model and limited.policy.retry
+
+    gone = ProviderError.from_response(400, {}, 'The model has been decommissioned')
+    assert gone.error_class == BAD_REQUEST and gone.model_unavailable
+    assert gone.policy.switch_model and not gone.policy.retry
+    assert ProviderError.from_response(404, {}, 'not found').model_unavailable
+    assert not ProviderError.from_response(400, {}, 'prompt too long').model_unavailable
+
+
+class FakeResponseError(Exception):
+    """Shaped like aiohttp.ClientResponseError"""
+
+    def __init__(self, status, headers):
+        super().__init__(f"status {status}")
+        self.status = status
+        self.headers = headers
+
+
+class Timeout(Exception):
+    """Named like requests.exceptions.Timeout"""
+
+
+class ClientConnectionError(Exception):
+    """Named like aiohttp.ClientConnectionError"""
+
+
+def test_from_exception():
+    error = ProviderError(QUOTA, 'spent')
+    assert ProviderError.from_exception(error) is error
+
+    response_error = ProviderError.from_exception(FakeResponseError(503, {'Retry-After': '3'}))
+    assert (response_error.error_class, response_error.retry_after) == (OVERLOAD, 3.0)
+
+    assert ProviderError.from_exception(asyncio.TimeoutError()).error_class == TIMEOUT
+    assert ProviderError.from_exception(Timeout('read timed out')).error_class == TIMEOUT
+    assert ProviderError.from_exception(ConnectionResetError()).error_class == NETWORK
+    assert ProviderError.from_exception(ClientConnectionError()).error_class == NETWORK
+    assert ProviderError.from_exception(KeyError('choices')).error_class == UNKNOWN
+
+
+def test_retry_delay():
+    assert retry_delay(ProviderError(AUTH, 'revoked')) is None
+    assert retry_delay(ProviderError(BAD_REQUEST, 'too long')) is None
+    assert retry_delay(ProviderError(RATE_LIMIT, 'wait', 429, retry_after=4.0)) == 4.0
+    too_long = ProviderError(RATE_LIMIT, 'wait', 429, retry_after=MAX_RETRY_AFTER + 1)
+    assert retry_delay(too_long) is None
+    assert BACKOFF_BASE <= retry_delay(ProviderError(SERVER, 'oops')) <= 3 * BACKOFF_BASE
+
+
+def test_decorrelated_jitter_bounds():
+    for _ in range(200):
+        assert BACKOFF_BASE <= decorrelated_jitter(0.0) <= 3 * BACKOFF_BASE
+        assert BACKOFF_BASE <= decorrelated_jitter(2.0) <= 6.0
+        assert decorrelated_jitter(100.0) <= BACKOFF_CAP
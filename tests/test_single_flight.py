@@ -0,0 +1,194 @@
+import os
+import sys
+import time
+import asyncio
+import subprocess
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '.github', 'scripts'))
+from deadline import DeadlineBudget
+from single_flight import SingleFlight
+
+
+def dead_pid() -> int:
+    process = subprocess.Popen([sys.executable, '-c', 'pass'])
+    process.wait()
+    return process.pid
+
+
+def test_concurrent_callers_share_one_call():
+    flight = SingleFlight()
+    calls = []
+
+    async def call():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return {'success': True, 'response': 'ok'}
+
+    async def main():
+        return await asyncio.gather(*(flight.run('key', call) for _ in range(5)))
+
+    results = asyncio.run(main())
+    assert len(calls) == 1
+    assert all(result['response'] == 'ok' for result in results)
+    assert flight.stats == {'leaders': 1, 'coalesced': 4, 'handoffs': 0}
+
+
+def test_waiting_process_receives_the_leaders_failure(tmp_path):
+    # Two instances on one lock dir behave like two processes on the same runner
+    leader = SingleFlight(str(tmp_path), poll_interval=0.01)
+    waiter = SingleFlight(str(tmp_path), poll_interval=0.01)
+    calls = []
+
+    async def failing_call():
+        calls.append(1)
+        await asyncio.sleep(0.1)
+        return {'success': False, 'errors': ['all providers down']}
+
+    async def main():
+        first = asyncio.ensure_future(leader.run('key', failing_call))
+        await asyncio.sleep(0.02)
+        second = await waiter.run('key', failing_call)
+        return await first, second
+
+    first, second = asyncio.run(main())
+    assert len(calls) == 1
+    assert second == first
+    assert waiter.stats['handoffs'] == 1
+
+
+def test_deadline_failures_are_not_handed_off(tmp_path):
+    leader = SingleFlight(str(tmp_path), poll_interval=0.01)
+    waiter = SingleFlight(str(tmp_path), poll_interval=0.01)
+    calls = []
+
+    async def call():
+        calls.append(1)
+        await asyncio.sleep(0.1)
+        if len(calls) == 1:
+            return {'success': False, 'deadline_exceeded': True}
+        return {'success': True, 'response': 'ok'}
+
+    async def main():
+        first = asyncio.ensure_future(leader.run('key', call))
+        await asyncio.sleep(0.02)
+        return await first, await waiter.run('key', call)
+
+    first, second = asyncio.run(main())
+    assert first['deadline_exceeded']
+    assert second['success'] and len(calls) == 2
+
+
+def test_later_caller_does_not_reuse_an_old_result(tmp_path):
+    flight = SingleFlight(str(tmp_path))
+    calls = []
+
+    async def call():
+        calls.append(1)
+        return {'success': True, 'response': len(calls)}
+
+    assert asyncio.run(flight.run('key', call))['response'] == 1
+    assert asyncio.run(SingleFlight(str(tmp_path)).run('key', call))['response'] == 2
+
+
+def test_lock_of_a_dead_process_is_broken(tmp_path):
+    (tmp_path / 'key.lock').write_text(f"{dead_pid()} nonce")
+    flight = SingleFlight(str(tmp_path), poll_interval=0.01)
+
+    async def call():
+        return {'success': True, 'response': 'ok'}
+
+    result = asyncio.run(asyncio.wait_for(flight.run('key', call), 5))
+    assert result['response'] == 'ok'
+    assert flight.stats['leaders'] == 1
+    assert not (tmp_path / 'key.lock').exists()
+
+
+def test_stale_lock_is_broken_but_a_live_one_is_kept(tmp_path):
+    flight = SingleFlight(str(tmp_path), stale_after=60)
+    lock = tmp_path / 'key.lock'
+    lock.write_text(f"{os.getpid()} nonce")
+
+    flight._break_if_abandoned(lock)
+    assert lock.exists()
+
+    old = time.time() - 120
+    os.utime(lock, (old, old))
+    flight._break_if_abandoned(lock)
+    assert not lock.exists()
+
+
+def deadline_failure():
+    return {'success': False, 'deadline_exceeded': True}
+
+
+def test_waiting_process_stops_at_its_own_deadline(tmp_path):
+    leader = SingleFlight(str(tmp_path), poll_interval=0.01)
+    waiter = SingleFlight(str(tmp_path), poll_interval=0.01)
+
+    async def slow_call():
+        await asyncio.sleep(2)
+        return {'success': True, 'response': 'late'}
+
+    async def main():
+        first = asyncio.ensure_future(leader.run('key', slow_call))
+        await asyncio.sleep(0.02)
+        started = time.monotonic()
+        result = await waiter.run('key', lambda: asyncio.sleep(0, deadline_failure()),
+                                  DeadlineBudget(0.7))
+        waited = time.monotonic() - started
+        first.cancel()
+        return result, waited
+
+    result, waited = asyncio.run(main())
+    assert result['deadline_exceeded']
+    assert waited < 1.0
+
+
+def test_in_process_waiter_stops_at_its_own_deadline():
+    flight = SingleFlight()
+
+    async def slow_call():
+        await asyncio.sleep(2)
+        return {'success': True, 'response': 'late'}
+
+    async def main():
+        first = asyncio.ensure_future(flight.run('key', slow_call))
+        await asyncio.sleep(0.01)
+        started = time.monotonic()
+        result = await flight.run('key', lambda: asyncio.sleep(0, deadline_failure()),
+                                  DeadlineBudget(0.7))
+        waited = time.monotonic() - started
+        first.cancel()
+        return result, waited
+
+    result, waited = asyncio.run(main())
+    assert result['deadline_exceeded']
+    assert waited < 1.0
+
+
+def test_in_process_waiters_outlive_a_leader_whose_deadline_ran_out(tmp_path):
+    holder = SingleFlight(str(tmp_path), poll_interval=0.01)
+    flight = SingleFlight(str(tmp_path), poll_interval=0.01)
+    calls = []
+
+    async def call():
+        calls.append(1)
+        return {'success': True, 'response': 'ok'}
+
+    async def hold_lock():
+        await asyncio.sleep(1.0)
+        return {'success': True, 'response': 'held'}
+
+    async def main():
+        other = asyncio.ensure_future(holder.run('key', hold_lock))
+        await asyncio.sleep(0.02)
+        short = asyncio.ensure_future(flight.run(
+            'key', lambda: asyncio.sleep(0, deadline_failure()), DeadlineBudget(0.6)))
+        await asyncio.sleep(0.01)
+        patient = await flight.run('key', call)
+        return await short, patient, await other
+
+    short, patient, other = asyncio.run(main())
+    assert short['deadline_exceeded']
+    # The unbounded caller kept waiting and received the other process's result
+    assert patient['response'] == 'held' and not calls